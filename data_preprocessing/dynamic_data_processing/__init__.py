@@ -6,5 +6,9 @@
 from .validator import DynamicDataValidator
 from .processor import DynamicDataProcessor
 from .step_executor import StepExecutor
+from .distribution_sketch import (
+    QuantileSketch, MomentAccumulator, DistributionSummary, summarize_dynamic_distributions
+)
 
-__all__ = ['DynamicDataValidator', 'DynamicDataProcessor', 'StepExecutor']
+__all__ = ['DynamicDataValidator', 'DynamicDataProcessor', 'StepExecutor',
+           'QuantileSketch', 'MomentAccumulator', 'DistributionSummary', 'summarize_dynamic_distributions']
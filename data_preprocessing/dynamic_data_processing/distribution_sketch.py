@@ -0,0 +1,714 @@
+"""
+动态数据分布摘要模块
+对processed文件夹中的逐患者CSV文件进行流式汇总，为每个变量（可选按天）构建
+可合并的分位数草图（KLL）和矩累加器，无需把全部数据读入内存
+"""
+
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 汇总表中默认输出的分位数
+DEFAULT_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+# 每个工作进程一次读取并对齐的文件数
+FILE_BLOCK_SIZE = 128
+
+SKETCH_FORMAT_VERSION = 1
+
+# 正态分布的四分位距与标准差之比
+IQR_TO_SIGMA = 1.349
+
+
+class QuantileSketch:
+    """
+    KLL分位数草图
+
+    数据按层级保存，第 h 层的每个元素代表 2^h 个原始值；某层超出容量时排序后
+    随机保留奇数或偶数位置的元素并上移一层。两个草图合并时逐层拼接后再压缩，
+    合并结果与一次性处理全部数据的精度相同。n 不超过第 0 层容量（约 k）时保存全部数据，
+    分位数与 np.quantile 完全一致；否则秩误差约为 1.65 / k。
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        """
+        初始化草图
+
+        Args:
+            k: 精度参数（最高层的容量），越大越精确、占用越多
+            seed: 压缩时随机选择保留位置的种子
+        """
+        self.k = int(k)
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._pending: List[np.ndarray] = []
+        self._n_pending = 0
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        """第 level 层的容量：自顶层 k 起每向下一层乘以 2/3"""
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: Any) -> 'QuantileSketch':
+        """
+        加入一批值（忽略NaN和无穷值）
+
+        Args:
+            values: 数值数组或标量
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values):
+            self._pending.append(values)
+            self._n_pending += len(values)
+            self.n += len(values)
+            if self._n_pending > self._capacity(0):
+                self._flush()
+        return self
+
+    def _flush(self):
+        """把缓冲区写入第 0 层并压缩"""
+        if self._pending:
+            self.levels[0] = np.concatenate([self.levels[0]] + self._pending)
+            self._pending = []
+            self._n_pending = 0
+        self._compress()
+
+    def _compress(self):
+        """逐层压缩，直到每一层都不超过容量"""
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # 奇数个元素时最小的一个留在本层，其余两两配对，每对随机保留一个上移
+            n_keep = len(items) % 2
+            offset = n_keep + int(self._rng.integers(2))
+            self.levels[level] = items[:n_keep]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[offset::2]])
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """
+        合并另一个草图（用于并行分块和增量汇总）
+
+        Args:
+            other: 另一个 QuantileSketch（k 不同时取较小的 k）
+        """
+        self._flush()
+        other._flush()
+        self.k = min(self.k, other.k)
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _sorted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """排序后的元素及其权重"""
+        self._flush()
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        估计分位数
+
+        每个元素位于其所代表秩区间的中点，按秩线性插值；所有权重为 1 时
+        等价于 np.quantile 的默认（linear）方法。
+
+        Args:
+            qs: 0-1 之间的分位点
+
+        Returns:
+            与 qs 等长的数组（空草图时为NaN）
+        """
+        qs = np.asarray(qs, dtype=float)
+        items, weights = self._sorted_items()
+        if len(items) == 0:
+            return np.full(qs.shape, np.nan)
+        cumulative = np.cumsum(weights)
+        centers = cumulative - (weights + 1) / 2
+        return np.interp(qs * (cumulative[-1] - 1), centers, items)
+
+    def cdf(self, values: Any) -> np.ndarray:
+        """
+        估计不大于每个值的数据所占比例
+
+        Args:
+            values: 数值数组或标量
+        """
+        values = np.asarray(values, dtype=float)
+        items, weights = self._sorted_items()
+        if len(items) == 0:
+            return np.full(values.shape, np.nan)
+        cumulative = np.concatenate([[0], np.cumsum(weights)])
+        return cumulative[np.searchsorted(items, values, side='right')] / cumulative[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        self._flush()
+        return {'k': self.k, 'n': self.n, 'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], seed: int = 0) -> 'QuantileSketch':
+        """从 to_dict() 的结果恢复草图"""
+        sketch = cls(k=data['k'], seed=seed + data['n'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(items, dtype=float) for items in data['levels']]
+        return sketch
+
+
+class MomentAccumulator:
+    """
+    可合并的矩累加器
+
+    以数组形式为任意形状（例如 变量 或 天 × 变量）的每个单元保存计数、均值、
+    二到四阶中心矩之和以及最小/最大值，按 Chan/Pébay 公式逐批合并，数值稳定。
+    """
+
+    FIELDS = ('count', 'mean', 'm2', 'm3', 'm4', 'min', 'max')
+
+    def __init__(self, shape: Tuple[int, ...] = (0,)):
+        """
+        初始化累加器
+
+        Args:
+            shape: 单元数组的形状
+        """
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.m3 = np.zeros(shape)
+        self.m4 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.count.shape
+
+    def grow(self, shape: Tuple[int, ...]):
+        """把单元数组扩展到 shape（新单元为空）"""
+        pad = [(0, new - old) for new, old in zip(shape, self.shape)]
+        if any(after for _, after in pad):
+            for field in self.FIELDS:
+                fill = {'min': np.inf, 'max': -np.inf}.get(field, 0)
+                setattr(self, field, np.pad(getattr(self, field), pad, constant_values=fill))
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> 'MomentAccumulator':
+        """
+        沿第 0 轴汇总一批值（忽略NaN和无穷值）
+
+        Args:
+            values: 形状为 (观测数, *单元形状) 的数组
+        """
+        observed = np.isfinite(values)
+        batch = cls(values.shape[1:])
+        batch.count = observed.sum(axis=0)
+        if not observed.any():
+            return batch
+        with np.errstate(invalid='ignore', divide='ignore'):
+            batch.mean = np.where(batch.count > 0, np.where(observed, values, 0.0).sum(axis=0) / batch.count, 0.0)
+            deviation = np.where(observed, values - batch.mean, 0.0)
+        batch.m2 = (deviation ** 2).sum(axis=0)
+        batch.m3 = (deviation ** 3).sum(axis=0)
+        batch.m4 = (deviation ** 4).sum(axis=0)
+        batch.min = np.where(observed, values, np.inf).min(axis=0)
+        batch.max = np.where(observed, values, -np.inf).max(axis=0)
+        return batch
+
+    def merge(self, other: 'MomentAccumulator', index: Any = ...) -> 'MomentAccumulator':
+        """
+        把另一个累加器合并到 self[index]
+
+        Args:
+            other: 另一个 MomentAccumulator，形状与 self[index] 相同
+            index: 目标单元的索引（默认为全部单元）
+        """
+        na, nb = self.count[index].astype(float), other.count.astype(float)
+        n = na + nb
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = np.where(n > 0, other.mean - self.mean[index], 0.0)
+            ma2, ma3 = self.m2[index], self.m3[index]
+            mean = np.where(n > 0, self.mean[index] + delta * nb / n, 0.0)
+            m2 = ma2 + other.m2 + np.where(n > 0, delta ** 2 * na * nb / n, 0.0)
+            m3 = (ma3 + other.m3
+                  + np.where(n > 0, delta ** 3 * na * nb * (na - nb) / n ** 2
+                             + 3 * delta * (na * other.m2 - nb * ma2) / n, 0.0))
+            m4 = (self.m4[index] + other.m4
+                  + np.where(n > 0, delta ** 4 * na * nb * (na ** 2 - na * nb + nb ** 2) / n ** 3
+                             + 6 * delta ** 2 * (na ** 2 * other.m2 + nb ** 2 * ma2) / n ** 2
+                             + 4 * delta * (na * other.m3 - nb * ma3) / n, 0.0))
+        self.count[index] = self.count[index] + other.count
+        self.mean[index], self.m2[index], self.m3[index], self.m4[index] = mean, m2, m3, m4
+        self.min[index] = np.minimum(self.min[index], other.min)
+        self.max[index] = np.maximum(self.max[index], other.max)
+        return self
+
+    def update(self, values: np.ndarray, index: Any = ...) -> 'MomentAccumulator':
+        """沿第 0 轴汇总一批值并合并到 self[index]"""
+        return self.merge(self.from_values(values), index)
+
+    def stats(self) -> Dict[str, np.ndarray]:
+        """
+        计算统计量
+
+        Returns:
+            字典：count, mean, std（样本标准差）, skewness, kurtosis（超额峰度）, min, max；
+            无数据的单元为NaN
+        """
+        count = self.count.astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                'count': self.count,
+                'mean': np.where(count > 0, self.mean, np.nan),
+                'std': np.where(count > 1, np.sqrt(self.m2 / (count - 1)), np.nan),
+                'skewness': np.where(self.m2 > 0, np.sqrt(count) * self.m3 / self.m2 ** 1.5, np.nan),
+                'kurtosis': np.where(self.m2 > 0, count * self.m4 / self.m2 ** 2 - 3, np.nan),
+                'min': np.where(count > 0, self.min, np.nan),
+                'max': np.where(count > 0, self.max, np.nan),
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典（空单元的最小/最大值保存为null）"""
+        data = {field: getattr(self, field).tolist() for field in ('count', 'mean', 'm2', 'm3', 'm4')}
+        for field in ('min', 'max'):
+            values = getattr(self, field)
+            data[field] = np.where(np.isfinite(values), values, np.nan).tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MomentAccumulator':
+        """从 to_dict() 的结果恢复累加器"""
+        shape = np.shape(data['count'])
+        accumulator = cls(shape)
+        accumulator.count = np.asarray(data['count'], dtype=np.int64).reshape(shape)
+        for field in ('mean', 'm2', 'm3', 'm4'):
+            setattr(accumulator, field, np.asarray(data[field], dtype=float).reshape(shape))
+        for field, empty in (('min', np.inf), ('max', -np.inf)):
+            values = np.asarray(data[field], dtype=float).reshape(shape)
+            setattr(accumulator, field, np.where(np.isnan(values), empty, values))
+        return accumulator
+
+
+def numeric_values(df: pd.DataFrame, variables: List[str], days: Optional[List[Any]] = None) -> np.ndarray:
+    """把患者数据按变量（及天）对齐为浮点数组，非数值内容视为缺失"""
+    df = df.reindex(index=days if days is not None else df.index, columns=variables)
+    non_numeric = df.columns[[not pd.api.types.is_numeric_dtype(dtype) for dtype in df.dtypes]]
+    if len(non_numeric):
+        df = df.copy()
+        df[non_numeric] = df[non_numeric].apply(pd.to_numeric, errors='coerce')
+    return df.to_numpy(dtype=float)
+
+
+def file_fingerprint(file_path: str) -> List[int]:
+    """文件指纹（大小, 修改时间），用于增量汇总时识别已合并的文件"""
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DistributionSummary:
+    """
+    动态数据的逐变量分布摘要
+
+    每个变量（per_day=True 时还有 天 × 变量 的每个单元）保存一个 QuantileSketch
+    和矩累加器。摘要可以合并（并行分块）并保存为JSON，之后只需汇总新增文件再合并。
+
+    Attributes:
+        variables: 出现过的变量（按首次出现的顺序）
+        days: 出现过的天（仅 per_day=True 时记录）
+        sources: 已汇总的文件名 → 文件指纹
+    """
+
+    def __init__(self, k: int = 200, per_day: bool = False):
+        """
+        初始化摘要
+
+        Args:
+            k: 分位数草图的精度参数
+            per_day: 是否同时按天汇总
+        """
+        self.k = k
+        self.per_day = per_day
+        self.variables: List[str] = []
+        self.days: List[Any] = []
+        self.sources: Dict[str, List[int]] = {}
+        self._var_slot: Dict[str, int] = {}
+        self._day_slot: Dict[Any, int] = {}
+        self.moments = MomentAccumulator((0,))
+        self.day_moments = MomentAccumulator((0, 0))
+        self.sketches: List[QuantileSketch] = []
+        self.day_sketches: List[List[QuantileSketch]] = []
+
+    @staticmethod
+    def _register(keys, slot, names) -> np.ndarray:
+        """返回 keys 在登记表中的位置，新键追加到末尾"""
+        positions = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            if key not in slot:
+                slot[key] = len(names)
+                names.append(key)
+            positions[i] = slot[key]
+        return positions
+
+    def _grow(self):
+        """按登记表长度扩展累加器和草图"""
+        n_vars = len(self.variables)
+        self.moments.grow((n_vars,))
+        self.sketches.extend(QuantileSketch(self.k, seed=i) for i in range(len(self.sketches), n_vars))
+        if self.per_day:
+            n_days = len(self.days)
+            self.day_moments.grow((n_days, n_vars))
+            for row in self.day_sketches:
+                row.extend(QuantileSketch(self.k, seed=i) for i in range(len(row), n_vars))
+            self.day_sketches.extend([QuantileSketch(self.k, seed=i) for i in range(n_vars)]
+                                     for _ in range(len(self.day_sketches), n_days))
+
+    def update(self, frames: List[pd.DataFrame]) -> 'DistributionSummary':
+        """
+        汇总一批患者的动态数据
+
+        各文件按登记的 天 × 变量 对齐后堆叠为 (患者, 天, 变量) 数组，矩和草图都按整块更新。
+
+        Args:
+            frames: 患者数据列表（索引为天，列为变量）
+        """
+        if not frames:
+            return self
+        for df in frames:
+            self._register(list(df.columns), self._var_slot, self.variables)
+            if self.per_day:
+                self._register(df.index.tolist(), self._day_slot, self.days)
+        self._grow()
+
+        n_vars = len(self.variables)
+        if self.per_day:
+            block = np.stack([numeric_values(df, self.variables, self.days) for df in frames])
+            rows = block.reshape(-1, n_vars)
+        else:
+            # 不按天汇总时各文件行数可以不同，直接按行拼接
+            block = None
+            rows = np.concatenate([numeric_values(df, self.variables) for df in frames])
+
+        self.moments.update(rows)
+        for v, sketch in enumerate(self.sketches):
+            sketch.update(rows[:, v])
+        if block is not None:
+            self.day_moments.update(block)
+            for d, row in enumerate(self.day_sketches):
+                for v, sketch in enumerate(row):
+                    sketch.update(block[:, d, v])
+        return self
+
+    def update_files(self, folder_path: str, csv_files: List[str],
+                     block_size: int = FILE_BLOCK_SIZE) -> 'DistributionSummary':
+        """
+        分块读取并汇总患者文件，记录文件指纹
+
+        Args:
+            folder_path: 数据文件夹
+            csv_files: 文件名列表
+            block_size: 每次对齐汇总的文件数
+        """
+        for start in range(0, len(csv_files), block_size):
+            names = csv_files[start:start + block_size]
+            paths = [os.path.join(folder_path, name) for name in names]
+            self.update([pd.read_csv(path, index_col=0) for path in paths])
+            for name, path in zip(names, paths):
+                self.sources[name] = file_fingerprint(path)
+        return self
+
+    def merge(self, other: 'DistributionSummary') -> 'DistributionSummary':
+        """
+        合并另一个摘要（用于并行分块和增量汇总）
+
+        Args:
+            other: 另一个 DistributionSummary（per_day 必须相同）
+
+        Raises:
+            ValueError: per_day 设置不同
+        """
+        if other.per_day != self.per_day:
+            raise ValueError("无法合并按天汇总与不按天汇总的分布摘要")
+        var_pos = self._register(other.variables, self._var_slot, self.variables)
+        day_pos = self._register(other.days, self._day_slot, self.days)
+        self._grow()
+
+        self.moments.merge(other.moments, var_pos)
+        for v, sketch in zip(var_pos, other.sketches):
+            self.sketches[v].merge(sketch)
+        if self.per_day:
+            self.day_moments.merge(other.day_moments, np.ix_(day_pos, var_pos))
+            for d, row in zip(day_pos, other.day_sketches):
+                for v, sketch in zip(var_pos, row):
+                    self.day_sketches[d][v].merge(sketch)
+        self.sources.update(other.sources)
+        return self
+
+    def __contains__(self, variable: str) -> bool:
+        return variable in self._var_slot
+
+    def sketch(self, variable: str, day: Any = None) -> QuantileSketch:
+        """
+        获取变量（或某一天的变量）的分位数草图
+
+        Raises:
+            KeyError: 变量或天不存在，或未按天汇总
+        """
+        if day is None:
+            return self.sketches[self._var_slot[variable]]
+        if not self.per_day:
+            raise KeyError("分布摘要未按天汇总 (per_day=False)")
+        return self.day_sketches[self._day_slot[day]][self._var_slot[variable]]
+
+    def quantiles(self, variable: str, qs: Sequence[float] = DEFAULT_QUANTILES, day: Any = None) -> pd.Series:
+        """
+        变量（或某一天的变量）的分位数估计
+
+        Returns:
+            pd.Series: 分位点 → 估计值
+        """
+        return pd.Series(self.sketch(variable, day).quantiles(qs), index=list(qs), name=variable)
+
+    def robust_stats(self) -> pd.DataFrame:
+        """
+        每个变量的稳健统计量（用于范围筛查的稳健z分数）
+
+        Returns:
+            pd.DataFrame: 索引为变量，列为 count, median, scale（IQR / 1.349，正态分布下等于标准差）
+        """
+        quartiles = np.array([sketch.quantiles((0.25, 0.5, 0.75)) for sketch in self.sketches]).reshape(-1, 3)
+        return pd.DataFrame({
+            'count': self.moments.count,
+            'median': quartiles[:, 1],
+            'scale': (quartiles[:, 2] - quartiles[:, 0]) / IQR_TO_SIGMA,
+        }, index=pd.Index(self.variables, name='variable'))
+
+    @staticmethod
+    def _quantile_columns(qs: Sequence[float]) -> List[str]:
+        return [f"p{q * 100:g}".replace('.', '_') for q in qs]
+
+    def variable_table(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> pd.DataFrame:
+        """
+        每个变量的分布统计
+
+        Returns:
+            pd.DataFrame: 索引为变量，列为 count, mean, std, skewness, kurtosis, min,
+            各分位数 (p1, p5, p25, p50, ...), max
+        """
+        stats = self.moments.stats()
+        table = pd.DataFrame({key: stats[key] for key in ('count', 'mean', 'std', 'skewness', 'kurtosis', 'min')},
+                             index=pd.Index(self.variables, name='variable'))
+        quantiles = np.array([sketch.quantiles(qs) for sketch in self.sketches]).reshape(len(self.variables), len(qs))
+        for column, values in zip(self._quantile_columns(qs), quantiles.T):
+            table[column] = values
+        table['max'] = stats['max']
+        return table
+
+    def day_table(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> pd.DataFrame:
+        """
+        每天每个变量的分布统计（长表，用于绘制随时间变化的分布图）
+
+        Returns:
+            pd.DataFrame: 列为 day, variable 及 variable_table 中的统计量，按天升序
+
+        Raises:
+            ValueError: 未按天汇总
+        """
+        if not self.per_day:
+            raise ValueError("分布摘要未按天汇总 (per_day=False)")
+        stats = self.day_moments.stats()
+        n_days, n_vars = len(self.days), len(self.variables)
+        table = pd.DataFrame({
+            'day': np.repeat(np.asarray(self.days, dtype=object), n_vars),
+            'variable': np.tile(np.asarray(self.variables, dtype=object), n_days),
+        })
+        for key in ('count', 'mean', 'std', 'skewness', 'kurtosis', 'min'):
+            table[key] = stats[key].ravel()
+        quantiles = np.array([sketch.quantiles(qs) for row in self.day_sketches for sketch in row])
+        quantiles = quantiles.reshape(n_days * n_vars, len(qs))
+        for column, values in zip(self._quantile_columns(qs), quantiles.T):
+            table[column] = values
+        table['max'] = stats['max'].ravel()
+        return table.sort_values('day', kind='stable').reset_index(drop=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        data = {
+            'version': SKETCH_FORMAT_VERSION,
+            'k': self.k,
+            'per_day': self.per_day,
+            'variables': self.variables,
+            'sources': self.sources,
+            'moments': self.moments.to_dict(),
+            'sketches': [sketch.to_dict() for sketch in self.sketches],
+        }
+        if self.per_day:
+            data['days'] = self.days
+            data['day_moments'] = self.day_moments.to_dict()
+            data['day_sketches'] = [[sketch.to_dict() for sketch in row] for row in self.day_sketches]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DistributionSummary':
+        """
+        从 to_dict() 的结果恢复摘要
+
+        Raises:
+            ValueError: 格式版本不受支持
+        """
+        if data.get('version') != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"不支持的分布摘要格式版本: {data.get('version')}")
+        summary = cls(k=data['k'], per_day=data['per_day'])
+        summary._register(data['variables'], summary._var_slot, summary.variables)
+        summary.sources = {name: list(fingerprint) for name, fingerprint in data['sources'].items()}
+        summary.moments = MomentAccumulator.from_dict(data['moments'])
+        summary.sketches = [QuantileSketch.from_dict(sketch, seed=i) for i, sketch in enumerate(data['sketches'])]
+        if summary.per_day:
+            summary._register(data['days'], summary._day_slot, summary.days)
+            summary.day_moments = MomentAccumulator.from_dict(data['day_moments'])
+            summary.day_sketches = [[QuantileSketch.from_dict(sketch, seed=v) for v, sketch in enumerate(row)]
+                                    for row in data['day_sketches']]
+        return summary
+
+    def save(self, file_path: str):
+        """
+        保存摘要为JSON文件
+
+        Args:
+            file_path: 输出路径
+        """
+        output_dir = os.path.dirname(file_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'DistributionSummary':
+        """
+        从JSON文件读取摘要
+
+        Args:
+            file_path: save() 写出的文件路径
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def _summarize_files(folder_path: str, csv_files: List[str], k: int, per_day: bool) -> DistributionSummary:
+    """汇总一组文件（进程池 worker 的任务单元）"""
+    return DistributionSummary(k=k, per_day=per_day).update_files(folder_path, csv_files)
+
+
+def summarize_files(folder_path: str, csv_files: List[str], k: int = 200, per_day: bool = False,
+                    n_jobs: Optional[int] = None) -> DistributionSummary:
+    """
+    并行汇总患者文件
+
+    文件被分为 n_jobs 块，每个进程为自己的块构建独立的草图和累加器，最后合并。
+
+    Args:
+        folder_path: 数据文件夹
+        csv_files: 文件名列表
+        k: 分位数草图的精度参数
+        per_day: 是否同时按天汇总
+        n_jobs: 进程数（None 或 -1 表示全部 CPU 核心）
+
+    Returns:
+        DistributionSummary
+    """
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, len(csv_files)))
+    if n_jobs == 1:
+        return _summarize_files(folder_path, csv_files, k, per_day)
+
+    chunks = [csv_files[i::n_jobs] for i in range(n_jobs)]
+    summary = DistributionSummary(k=k, per_day=per_day)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for partial in executor.map(_summarize_files, [folder_path] * n_jobs, chunks,
+                                    [k] * n_jobs, [per_day] * n_jobs):
+            summary.merge(partial)
+    return summary
+
+
+def summarize_dynamic_distributions(folder_path: str, sketch_path: Optional[str] = None,
+                                    k: int = 200, per_day: bool = False,
+                                    n_jobs: Optional[int] = None,
+                                    incremental: bool = True) -> Tuple[DistributionSummary, Dict[str, Any]]:
+    """
+    汇总文件夹中所有患者文件的分布，并可增量合并到已保存的摘要
+
+    incremental=True 且 sketch_path 已存在时，只汇总摘要中尚未记录的文件并合并；
+    已记录但内容发生变化的文件无法从草图中撤回，会被报告并跳过（需要关闭增量模式重建）。
+
+    Args:
+        folder_path: 数据文件夹
+        sketch_path: 摘要JSON路径（None 表示不读取也不保存）
+        k: 分位数草图的精度参数
+        per_day: 是否同时按天汇总
+        n_jobs: 进程数（None 或 -1 表示全部 CPU 核心）
+        incremental: 是否读取已保存的摘要并只合并新增文件
+
+    Returns:
+        (摘要, 运行信息字典：new_files, changed_files, skipped_files, total_files, rebuilt)
+    """
+    csv_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.csv'))
+
+    summary = None
+    rebuilt = True
+    if incremental and sketch_path and os.path.exists(sketch_path):
+        summary = DistributionSummary.load(sketch_path)
+        if summary.per_day != per_day or summary.k != k:
+            warnings.warn(f"已保存的分布摘要设置 (k={summary.k}, per_day={summary.per_day}) 与当前配置不同，将重新汇总")
+            summary = None
+        else:
+            rebuilt = False
+
+    changed_files = []
+    if summary is None:
+        summary = DistributionSummary(k=k, per_day=per_day)
+        new_files = csv_files
+    else:
+        new_files = []
+        for name in csv_files:
+            if name not in summary.sources:
+                new_files.append(name)
+            elif summary.sources[name] != file_fingerprint(os.path.join(folder_path, name)):
+                changed_files.append(name)
+        if changed_files:
+            warnings.warn(f"{len(changed_files)} 个已汇总的文件内容已变化，增量模式下不会重新汇总，请关闭增量模式重建")
+
+    if new_files:
+        summary.merge(summarize_files(folder_path, new_files, k=k, per_day=per_day, n_jobs=n_jobs))
+    if sketch_path and (new_files or rebuilt):
+        summary.save(sketch_path)
+
+    info = {
+        'total_files': len(csv_files),
+        'new_files': len(new_files),
+        'changed_files': changed_files,
+        'skipped_files': len(csv_files) - len(new_files) - len(changed_files),
+        'rebuilt': rebuilt,
+    }
+    return summary, info
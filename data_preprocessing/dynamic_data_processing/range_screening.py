@@ -0,0 +1,232 @@
+"""
+动态数据范围筛查模块
+按配置中的逐变量上下限表，对单个文件或整个队列数组的所有单元格进行一次广播比较，
+找出超出硬性上下限（生理上不可能的值）或稳健z分数界限（基于队列统计）的数值
+"""
+
+import os
+import re
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .distribution_sketch import IQR_TO_SIGMA, DistributionSummary
+
+
+# 异常代码 → 原因；代码越小优先级越高（同一单元格只记录一个原因）
+ISSUE_REASONS = {
+    1: 'below_min',
+    2: 'above_max',
+    3: 'robust_z_low',
+    4: 'robust_z_high',
+}
+
+# 界限表的列，顺序与异常代码一致
+LIMIT_COLUMNS = ['min', 'max', 'z_low', 'z_high']
+
+
+def _category_of(variable: str) -> str:
+    """变量所属类别（去掉末尾的编号），例如 'CBC012' → 'CBC'"""
+    return re.sub(r'\d+$', '', variable)
+
+
+def resolve_bounds(variables: Sequence[str], bounds_config: Optional[Dict[str, Any]],
+                   robust_z: Optional[float]) -> pd.DataFrame:
+    """
+    把配置中的上下限表展开为逐变量的表
+
+    配置的键可以是变量名或变量类别（例如 'CBC'），变量名优先。每个条目可包含
+    min、max（硬性上下限）和 robust_z（覆盖全局稳健z分数阈值，null 表示不检查）。
+
+    Args:
+        variables: 变量列表
+        bounds_config: 配置中的 range_bounds
+        robust_z: 全局稳健z分数阈值（None 表示不检查）
+
+    Returns:
+        pd.DataFrame: 索引为变量，列为 min, max, robust_z（缺省为NaN）
+    """
+    bounds_config = bounds_config or {}
+    rows = {}
+    for variable in variables:
+        entry = {}
+        entry.update(bounds_config.get(_category_of(variable)) or {})
+        entry.update(bounds_config.get(variable) or {})
+        threshold = entry.get('robust_z', robust_z)
+        rows[variable] = {
+            'min': entry.get('min', np.nan),
+            'max': entry.get('max', np.nan),
+            'robust_z': np.nan if threshold is None else threshold,
+        }
+    table = pd.DataFrame.from_dict(rows, orient='index', columns=['min', 'max', 'robust_z']).astype(float)
+    table.index.name = 'variable'
+    return table
+
+
+def robust_stats_from_values(values: np.ndarray, variables: Sequence[str]) -> pd.DataFrame:
+    """
+    由数值数组计算每个变量的稳健统计量
+
+    Args:
+        values: 形状为 (..., 变量数) 的数组
+        variables: 变量列表
+
+    Returns:
+        pd.DataFrame: 索引为变量，列为 count, median, scale（IQR / 1.349）
+    """
+    flat = values.reshape(-1, len(variables))
+    count = np.isfinite(flat).sum(axis=0)
+    quartiles = np.full((3, len(variables)), np.nan)
+    observed = count > 0
+    if observed.any():
+        quartiles[:, observed] = np.nanpercentile(flat[:, observed], [25, 50, 75], axis=0)
+    return pd.DataFrame({
+        'count': count,
+        'median': quartiles[1],
+        'scale': (quartiles[2] - quartiles[0]) / IQR_TO_SIGMA,
+    }, index=pd.Index(list(variables), name='variable'))
+
+
+class RangeScreener:
+    """
+    动态数据范围筛查器
+
+    界限表为 (4, 变量数) 的数组：硬性下限、硬性上限、稳健z下限、稳健z上限，
+    对形状为 (..., 变量数) 的任意数组（单个文件的 天 × 变量，或队列的 文件 × 天 × 变量）
+    一次广播比较得到每个单元格的异常代码（0 表示正常，NaN不检查）。
+    """
+
+    def __init__(self, variables: Sequence[str], limits: pd.DataFrame):
+        """
+        初始化筛查器
+
+        Args:
+            variables: 变量列表，顺序与被筛查数组的最后一维一致
+            limits: 索引为变量、列为 LIMIT_COLUMNS 的界限表（NaN 表示不检查）
+        """
+        self.variables = list(variables)
+        self.limits = limits.reindex(index=self.variables, columns=LIMIT_COLUMNS)
+        self._bounds = self.limits.to_numpy(dtype=float).T
+
+    @classmethod
+    def from_bounds(cls, variables: Sequence[str], bounds: pd.DataFrame,
+                    stats: Optional[pd.DataFrame] = None, min_count: int = 20) -> 'RangeScreener':
+        """
+        由上下限表和队列稳健统计量创建筛查器
+
+        稳健z界限为 中位数 ± robust_z × scale；统计量缺失、观测数少于 min_count
+        或 scale 为 0（近似常数变量）时，该变量只检查硬性上下限。
+
+        Args:
+            variables: 变量列表
+            bounds: resolve_bounds() 的结果
+            stats: 索引为变量、列为 count, median, scale 的稳健统计量
+            min_count: 计算稳健z界限所需的最少观测数
+        """
+        variables = list(variables)
+        bounds = bounds.reindex(variables)
+        limits = pd.DataFrame({'min': bounds['min'], 'max': bounds['max']})
+        if stats is None:
+            limits['z_low'] = limits['z_high'] = np.nan
+        else:
+            stats = stats.reindex(variables)
+            usable = (stats['count'].fillna(0) >= min_count) & (stats['scale'] > 0)
+            half_width = (bounds['robust_z'] * stats['scale']).where(usable)
+            limits['z_low'] = stats['median'] - half_width
+            limits['z_high'] = stats['median'] + half_width
+        return cls(variables, limits)
+
+    def screen(self, values: np.ndarray) -> np.ndarray:
+        """
+        筛查数组中的所有单元格
+
+        Args:
+            values: 形状为 (..., 变量数) 的浮点数组
+
+        Returns:
+            与 values 形状相同的 uint8 异常代码数组（见 ISSUE_REASONS）
+        """
+        lower_min, upper_max, z_low, z_high = self._bounds
+        with np.errstate(invalid='ignore'):
+            return np.select(
+                [values < lower_min, values > upper_max, values < z_low, values > z_high],
+                [1, 2, 3, 4],
+                default=0,
+            ).astype(np.uint8)
+
+    def issue_counts(self, values: np.ndarray, codes: np.ndarray) -> pd.DataFrame:
+        """
+        每个变量的筛查计数
+
+        Returns:
+            pd.DataFrame: 索引为变量，列为 checked（非缺失单元格数）、各异常原因的个数及 total
+        """
+        n_vars = len(self.variables)
+        flat_codes = codes.reshape(-1, n_vars)
+        counts = pd.DataFrame({'checked': np.isfinite(values.reshape(-1, n_vars)).sum(axis=0)},
+                              index=pd.Index(self.variables, name='variable'))
+        for code, reason in ISSUE_REASONS.items():
+            counts[reason] = (flat_codes == code).sum(axis=0)
+        counts['total'] = counts[list(ISSUE_REASONS.values())].sum(axis=1)
+        return counts
+
+    def issue_records(self, values: np.ndarray, codes: np.ndarray,
+                      files: Optional[Sequence[str]] = None,
+                      days: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        """
+        异常单元格的紧凑记录（只包含有异常的单元格）
+
+        Args:
+            values: 被筛查的数组，形状为 (文件, 天, 变量) 或 (天, 变量)
+            codes: screen() 的结果
+            files: 文件名列表（三维数组时使用）
+            days: 天的列表
+
+        Returns:
+            pd.DataFrame: 列为 [file,] day, variable, value, reason, limit
+        """
+        positions = np.nonzero(codes)
+        flagged = codes[positions]
+        var_pos = positions[-1]
+        bounds = np.vstack([np.full(len(self.variables), np.nan), self._bounds])
+        records = {}
+        if codes.ndim == 3:
+            records['file'] = np.asarray(files, dtype=object)[positions[0]] if files is not None else positions[0]
+        if codes.ndim >= 2:
+            day_pos = positions[-2]
+            records['day'] = np.asarray(days, dtype=object)[day_pos] if days is not None else day_pos
+        records['variable'] = np.asarray(self.variables, dtype=object)[var_pos]
+        records['value'] = values[positions]
+        records['reason'] = np.asarray([ISSUE_REASONS[code] for code in range(1, 5)], dtype=object)[flagged - 1] \
+            if len(flagged) else np.empty(0, dtype=object)
+        records['limit'] = bounds[flagged, var_pos]
+        return pd.DataFrame(records)
+
+
+def build_screener(config: Any, variables: Sequence[str],
+                   cohort_values: Optional[np.ndarray] = None) -> RangeScreener:
+    """
+    根据配置创建筛查器
+
+    range_cohort_stats 为 'sketch' 且 distribution_sketch_path 存在时，稳健统计量取自已保存的
+    分布摘要（覆盖整个已汇总的队列）；否则由 cohort_values（本批数据）计算。
+
+    Args:
+        config: 配置管理器实例
+        variables: 变量列表
+        cohort_values: 本批数据数组，形状为 (..., 变量数)
+
+    Returns:
+        RangeScreener
+    """
+    bounds = resolve_bounds(variables, config.get('range_bounds'), config.get('range_robust_z_threshold'))
+    stats = None
+    sketch_path = config.get('distribution_sketch_path')
+    if config.get('range_cohort_stats', 'sketch') == 'sketch' and sketch_path and os.path.exists(sketch_path):
+        stats = DistributionSummary.load(sketch_path).robust_stats()
+        print(f"稳健统计量来源: 分布摘要 {sketch_path}")
+    elif cohort_values is not None:
+        stats = robust_stats_from_values(cohort_values, variables)
+        print("稳健统计量来源: 本批数据")
+    return RangeScreener.from_bounds(variables, bounds, stats, config.get('range_robust_min_count', 20))
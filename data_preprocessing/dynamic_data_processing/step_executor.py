@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.config_manager import ConfigManager
 from .validator import DynamicDataValidator
 from .processor import DynamicDataProcessor
+from .distribution_sketch import summarize_dynamic_distributions
 
 
 class StepExecutor:
@@ -29,14 +30,16 @@ class StepExecutor:
         self.config = config
         self.validation_results = None
         self.processing_results = None
+        self.distribution_info = None
     
     def validate_step_configuration(self):
         """验证步骤配置的有效性"""
         validation_only = self.config.get('dynamic_validation_only')
         processing_only = self.config.get('dynamic_processing_only')
+        distribution_summary = self.config.get('dynamic_distribution_summary')
         
-        # 如果两者都未指定，默认行为：只进行验证
-        if not validation_only and not processing_only:
+        # 如果均未指定，默认行为：只进行验证
+        if not validation_only and not processing_only and not distribution_summary:
             self.config.set('dynamic_validation_only', True)
     
     def print_execution_plan(self):
@@ -59,6 +62,11 @@ class StepExecutor:
         else:
             print("❌ 数据处理步骤: 禁用")
         
+        if self.config.get('dynamic_distribution_summary'):
+            print("✅ 分布摘要步骤: 启用")
+        else:
+            print("❌ 分布摘要步骤: 禁用")
+        
         if skip_interactive:
             print("⚙️  交互模式: 禁用（使用配置值）")
         else:
@@ -161,6 +169,66 @@ class StepExecutor:
         
         return success
     
+    def execute_distribution_step(self) -> bool:
+        """
+        执行分布摘要步骤
+        
+        为每个变量（可选按天）构建分位数草图和矩统计，草图保存后可增量合并新增文件
+        
+        Returns:
+            bool: 摘要是否成功
+        """
+        if not self.config.get('dynamic_distribution_summary'):
+            print("⏭️  跳过分布摘要步骤（未启用）")
+            return True
+        
+        print("\n📈 执行分布摘要步骤")
+        print("=" * 60)
+        
+        source = self.config.get('distribution_source', 'output')
+        folder = self.config.get('output_dir') if source == 'output' else self.config.get('input_dir')
+        if not folder or not os.path.isdir(folder):
+            print(f"❌ 分布摘要失败：数据目录不存在: {folder}")
+            return False
+        
+        per_day = self.config.get('distribution_per_day', False)
+        print(f"数据目录: {folder}")
+        print(f"按天汇总: {'是' if per_day else '否'}")
+        
+        try:
+            summary, self.distribution_info = summarize_dynamic_distributions(
+                folder,
+                sketch_path=self.config.get('distribution_sketch_path'),
+                k=self.config.get('distribution_sketch_k', 200),
+                per_day=per_day,
+                n_jobs=self.config.get('distribution_n_jobs', -1),
+                incremental=self.config.get('distribution_incremental', True),
+            )
+        except Exception as e:
+            print(f"❌ 分布摘要失败: {e}")
+            return False
+        
+        info = self.distribution_info
+        print(f"文件总数: {info['total_files']}，新汇总: {info['new_files']}，已汇总跳过: {info['skipped_files']}")
+        if info['changed_files']:
+            print(f"⚠️  {len(info['changed_files'])} 个已汇总的文件内容已变化，未重新汇总（关闭 distribution_incremental 以重建）:")
+            for name in info['changed_files'][:10]:
+                print(f"   - {name}")
+        
+        outputs = [('distribution_summary_path', summary.variable_table)]
+        if per_day:
+            outputs.append(('distribution_day_summary_path', summary.day_table))
+        for key, build_table in outputs:
+            output_path = self.config.get(key)
+            output_dir = os.path.dirname(output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            build_table().to_csv(output_path, index=(key == 'distribution_summary_path'))
+            print(f"📄 分布摘要已保存至: {output_path}")
+        
+        print(f"✅ 分布摘要完成：{len(summary.variables)} 个变量，{len(summary.sources)} 个文件")
+        return True
+    
     def execute_all_steps(self):
         """执行所有启用的步骤"""
         self.validate_step_configuration()
@@ -172,10 +240,14 @@ class StepExecutor:
         # 执行处理步骤
         processing_success = self.execute_processing_step(validation_success)
         
+        # 执行分布摘要步骤（在处理之后，以便汇总最新的输出文件）
+        distribution_success = self.execute_distribution_step()
+        
         # 打印最终结果
-        self._print_final_results(validation_success, processing_success)
+        self._print_final_results(validation_success, processing_success, distribution_success)
     
-    def _print_final_results(self, validation_success: bool, processing_success: bool):
+    def _print_final_results(self, validation_success: bool, processing_success: bool,
+                             distribution_success: bool = True):
         """打印最终执行结果"""
         print("\n" + "=" * 80)
         print("执行结果总结")
@@ -183,6 +255,7 @@ class StepExecutor:
         
         validation_enabled = self.config.get('dynamic_validation_only')
         processing_enabled = self.config.get('dynamic_processing_only')
+        distribution_enabled = self.config.get('dynamic_distribution_summary')
         
         # 根据启用的步骤显示结果
         if validation_enabled:
@@ -203,12 +276,23 @@ class StepExecutor:
             else:
                 print("❌ 数据处理步骤: 执行失败")
         
+        if distribution_enabled:
+            if distribution_success:
+                print("✅ 分布摘要步骤: 成功完成")
+                if self.distribution_info:
+                    print(f"   - 文件总数: {self.distribution_info['total_files']}")
+                    print(f"   - 新汇总文件数: {self.distribution_info['new_files']}")
+            else:
+                print("❌ 分布摘要步骤: 执行失败")
+        
         # 计算总体成功状态
         overall_success = True
         if validation_enabled:
             overall_success = overall_success and validation_success
         if processing_enabled:
             overall_success = overall_success and processing_success
+        if distribution_enabled:
+            overall_success = overall_success and distribution_success
         
         if overall_success:
             print("\n🎉 所有步骤执行完成！")
@@ -4,6 +4,7 @@
 """
 
 import os
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -12,6 +13,8 @@ import sys
 # 添加父目录到路径以便导入utils模块
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.config_manager import ConfigManager
+from .distribution_sketch import numeric_values
+from .range_screening import build_screener
 
 
 class DynamicDataValidator:
@@ -34,6 +37,13 @@ class DynamicDataValidator:
         self.expected_columns = self._define_expected_columns()
         self.expected_column_count = len(self.expected_columns)
         self.expected_row_count = config.get('dynamic_expected_row_count')
+        self.expected_days = list(range(config.get('dynamic_expected_time_range_start'),
+                                        config.get('dynamic_expected_time_range_end') + 1))
+        
+        # 范围筛查：逐文件收集按 天 × 变量 对齐的数值，全部文件读取后一次筛查整个队列数组
+        self.enable_range_screening = config.get('enable_range_screening', False)
+        self._range_files: List[str] = []
+        self._range_blocks: List[np.ndarray] = []
         
         # 验证结果存储
         self.validation_results = {
@@ -41,7 +51,8 @@ class DynamicDataValidator:
             'warnings': [],
             'processed_files': 0,
             'valid_files': 0,
-            'invalid_files': []
+            'invalid_files': [],
+            'range_screening': None
         }
     
     def _define_expected_columns(self) -> List[str]:
@@ -156,20 +167,30 @@ class DynamicDataValidator:
                     if extra_cols:
                         result['warnings'].append(f"额外列: {list(extra_cols)}")
             
-            # 验证数据类型
-            for row_idx, row in df.iterrows():
-                for col_idx, (col_name, value) in enumerate(row.items()):
-                    is_valid, reason = self._is_valid_numeric_or_na(value)
-                    if not is_valid:
-                        issue = {
-                            'row': row_idx,
-                            'column': col_name,
-                            'value': value,
-                            'reason': reason,
-                            'position': f"行 {row_idx}, 列 {col_name}"
-                        }
-                        result['data_type_issues'].append(issue)
-                        result['is_valid'] = False
+            # 验证数据类型：数值列的所有值都有效，只需逐个检查非数值列中的非空单元格
+            object_positions = [i for i, dtype in enumerate(df.dtypes)
+                                if not pd.api.types.is_numeric_dtype(dtype)]
+            cells = sorted((row_pos, col_pos) for col_pos in object_positions
+                           for row_pos in np.flatnonzero(df.iloc[:, col_pos].notna().to_numpy()))
+            for row_pos, col_pos in cells:
+                row_idx, col_name = df.index[row_pos], df.columns[col_pos]
+                value = df.iat[row_pos, col_pos]
+                is_valid, reason = self._is_valid_numeric_or_na(value)
+                if not is_valid:
+                    issue = {
+                        'row': row_idx,
+                        'column': col_name,
+                        'value': value,
+                        'reason': reason,
+                        'position': f"行 {row_idx}, 列 {col_name}"
+                    }
+                    result['data_type_issues'].append(issue)
+                    result['is_valid'] = False
+            
+            # 收集范围筛查数据（非数值内容视为缺失，预期范围外的行和列不参与筛查）
+            if self.enable_range_screening and df.index.is_unique:
+                self._range_files.append(file_name)
+                self._range_blocks.append(numeric_values(df, self.expected_columns, self.expected_days))
             
             # 检查时间索引
             try:
@@ -254,11 +275,51 @@ class DynamicDataValidator:
         
         self.validation_results['valid_files'] = valid_count
         
+        # 范围筛查
+        if self.enable_range_screening:
+            self.screen_ranges()
+        
         # 输出总结
         self._print_summary()
         
         return self.validation_results
     
+    def screen_ranges(self) -> Dict[str, Any]:
+        """
+        对已读取的全部文件进行范围筛查
+        
+        所有文件堆叠为 (文件, 天, 变量) 数组后与逐变量界限一次广播比较；
+        筛查结果单独记录，不会使文件被判定为异常
+        
+        Returns:
+            筛查结果字典：n_files, counts（逐变量计数表）, records（异常单元格记录）
+        """
+        print("-" * 60)
+        print("开始范围筛查...")
+        if self._range_blocks:
+            cohort = np.stack(self._range_blocks)
+        else:
+            cohort = np.empty((0, len(self.expected_days), len(self.expected_columns)))
+        
+        screener = build_screener(self.config, self.expected_columns, cohort)
+        codes = screener.screen(cohort)
+        screening = {
+            'n_files': len(self._range_files),
+            'counts': screener.issue_counts(cohort, codes),
+            'records': screener.issue_records(cohort, codes, self._range_files, self.expected_days),
+        }
+        self.validation_results['range_screening'] = screening
+        self._range_files, self._range_blocks = [], []
+        
+        issues_path = self.config.get('range_issues_path')
+        if issues_path:
+            output_dir = os.path.dirname(issues_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            screening['records'].to_csv(issues_path, index=False)
+            print(f"范围异常记录已保存至: {issues_path}")
+        return screening
+    
     def _print_summary(self):
         """打印验证总结"""
         print("\n" + "=" * 60)
@@ -285,6 +346,19 @@ class DynamicDataValidator:
             if len(self.validation_results['warnings']) > 10:
                 print(f"   - ... 还有 {len(self.validation_results['warnings']) - 10} 个警告")
         
+        screening = self.validation_results['range_screening']
+        if screening is not None:
+            counts = screening['counts']
+            flagged = counts[counts['total'] > 0].sort_values('total', ascending=False, kind='stable')
+            print(f"\n范围筛查: {screening['n_files']} 个文件，{int(counts['checked'].sum())} 个数值，"
+                  f"{len(screening['records'])} 个超出范围")
+            for variable, row in flagged.head(10).iterrows():
+                print(f"   - {variable}: {int(row['total'])}/{int(row['checked'])} "
+                      f"(低于下限 {int(row['below_min'])}, 高于上限 {int(row['above_max'])}, "
+                      f"z偏低 {int(row['robust_z_low'])}, z偏高 {int(row['robust_z_high'])})")
+            if len(flagged) > 10:
+                print(f"   - ... 还有 {len(flagged) - 10} 个变量")
+        
         if len(self.validation_results['invalid_files']) == 0:
             print("\n✅ 所有文件验证通过！")
         else:
@@ -331,6 +405,28 @@ class DynamicDataValidator:
                     f.write(f"⚠️  {warning}\n")
                 f.write("\n")
             
+            screening = self.validation_results['range_screening']
+            if screening is not None:
+                counts = screening['counts']
+                flagged = counts[counts['total'] > 0].sort_values('total', ascending=False, kind='stable')
+                f.write("范围筛查结果:\n")
+                f.write("-" * 40 + "\n")
+                f.write(f"- 筛查文件数: {screening['n_files']}\n")
+                f.write(f"- 筛查数值数: {int(counts['checked'].sum())}\n")
+                f.write(f"- 超出范围数: {len(screening['records'])}\n")
+                if len(flagged):
+                    f.write("\n逐变量计数 (总数/筛查数: 低于下限, 高于上限, z偏低, z偏高):\n")
+                    for variable, row in flagged.iterrows():
+                        f.write(f"  - {variable}: {int(row['total'])}/{int(row['checked'])}: "
+                                f"{int(row['below_min'])}, {int(row['above_max'])}, "
+                                f"{int(row['robust_z_low'])}, {int(row['robust_z_high'])}\n")
+                    max_records = self.config.get('range_max_report_records', 100)
+                    f.write(f"\n异常记录 (前 {min(max_records, len(screening['records']))} 条):\n")
+                    for record in screening['records'].head(max_records).itertuples(index=False):
+                        f.write(f"  - {record.file} 第 {record.day} 天 {record.variable} = {record.value:g} "
+                                f"({record.reason}, 界限 {record.limit:g})\n")
+                f.write("\n")
+            
             if self.validation_results['invalid_files']:
                 f.write("异常文件详情:\n")
                 f.write("-" * 40 + "\n")
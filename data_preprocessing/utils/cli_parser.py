@@ -28,6 +28,9 @@ def parse_arguments():
   # 动态数据处理 - 只运行处理步骤
   python data_processed.py --mode dynamic --processing-only
   
+  # 动态数据处理 - 只生成分布摘要（分位数草图，增量合并新文件）
+  python data_processed.py --mode dynamic --distribution-summary --config config.yaml
+  
   # 静态数据处理
   python data_processed.py --mode static --config config.yaml
   
@@ -42,6 +45,9 @@ def parse_arguments():
   CART_DYNAMIC_PROCESSING_ONLY        动态数据只运行处理步骤 (true/false)
   CART_DYNAMIC_VALIDATION_REPORT      动态数据验证报告文件路径
   CART_DYNAMIC_PROCESSING_REPORT      动态数据处理报告文件路径
+  CART_DYNAMIC_DISTRIBUTION_SUMMARY   动态数据生成分布摘要 (true/false)
+  CART_DISTRIBUTION_N_JOBS            分布摘要并行进程数
+  CART_ENABLE_RANGE_SCREENING         验证时进行范围筛查 (true/false)
   
   # 静态数据配置
   CART_STATIC_VALIDATION_ONLY         静态数据只运行验证步骤 (true/false)
@@ -77,6 +83,9 @@ def parse_arguments():
     parser.add_argument('--dynamic-expected-row-count', dest='dynamic_expected_row_count', type=int,
                        help='动态数据预期行数')
     
+    parser.add_argument('--range-screening', dest='enable_range_screening', action='store_true',
+                       help='验证时按 range_bounds 进行范围和稳健z分数筛查')
+    
     # 处理配置
     parser.add_argument('--enable-column-deletion', dest='enable_column_deletion',
                        action='store_true', help='启用列删除功能')
@@ -100,6 +109,10 @@ def parse_arguments():
                        help='只运行数据验证步骤')
     parser.add_argument('--processing-only', dest='dynamic_processing_only', action='store_true',
                        help='只运行数据处理步骤')
+    parser.add_argument('--distribution-summary', dest='dynamic_distribution_summary', action='store_true',
+                       help='生成动态数据的逐变量分布摘要（分位数草图和矩统计）')
+    parser.add_argument('--distribution-n-jobs', dest='distribution_n_jobs', type=int,
+                       help='分布摘要并行进程数（-1 表示全部CPU核心）')
     parser.add_argument('--skip-interactive', dest='skip_interactive', action='store_true',
                        help='跳过交互式询问，使用配置值')
     
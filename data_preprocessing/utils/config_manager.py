@@ -40,6 +40,15 @@ class ConfigManager:
             'dynamic_expected_time_range_start': -15,
             'dynamic_expected_time_range_end': 30,
             
+            # 动态数据范围筛查配置
+            'enable_range_screening': False,
+            'range_robust_z_threshold': 6,
+            'range_robust_min_count': 20,
+            'range_cohort_stats': 'sketch',
+            'range_max_report_records': 100,
+            'range_issues_path': 'dynamic_range_issues.csv',
+            'range_bounds': {},
+            
             # 列删除配置 - 统一配置结构
             'enable_column_deletion': False,  # 默认禁用列删除
             'columns_to_delete': {
@@ -89,6 +98,17 @@ class ConfigManager:
             'dynamic_processing_only': False,
             'skip_interactive': False,
             
+            # 动态数据分布摘要配置
+            'dynamic_distribution_summary': False,
+            'distribution_source': 'output',
+            'distribution_per_day': False,
+            'distribution_sketch_k': 200,
+            'distribution_n_jobs': -1,
+            'distribution_incremental': True,
+            'distribution_sketch_path': 'dynamic_distribution_sketches.json',
+            'distribution_summary_path': 'dynamic_distribution_summary.csv',
+            'distribution_day_summary_path': 'dynamic_distribution_by_day.csv',
+            
             # 静态数据特定步骤控制配置
             'static_validation_only': True,   # 静态数据默认仅验证
             'static_processing_only': False,
@@ -123,6 +143,9 @@ class ConfigManager:
             'CART_VERBOSE': 'verbose',
             'CART_PROGRESS_INTERVAL': 'progress_interval',
             'CART_SKIP_INTERACTIVE': 'skip_interactive',
+            'CART_ENABLE_RANGE_SCREENING': 'enable_range_screening',
+            'CART_DYNAMIC_DISTRIBUTION_SUMMARY': 'dynamic_distribution_summary',
+            'CART_DISTRIBUTION_N_JOBS': 'distribution_n_jobs',
             
             # 静态数据特定环境变量
             'CART_STATIC_VALIDATION_ONLY': 'static_validation_only',
@@ -135,7 +158,7 @@ class ConfigManager:
             env_value = os.getenv(env_var)
             if env_value is not None:
                 # 类型转换
-                if config_key in ['progress_interval', 
+                if config_key in ['progress_interval', 'distribution_n_jobs',
                                 'dynamic_expected_file_count', 'dynamic_expected_row_count',
                                 'static_expected_column_count', 'static_expected_patient_count']:
                     try:
@@ -143,8 +166,8 @@ class ConfigManager:
                     except ValueError:
                         print(f"警告: 环境变量 {env_var} 的值 '{env_value}' 不是有效整数，使用默认值")
                 elif config_key in ['remove_optional_columns', 'verbose', 'skip_interactive', 'enable_column_deletion',
-                                  'dynamic_validation_only', 'dynamic_processing_only',
-                                  'static_validation_only', 'static_processing_only']:
+                                  'dynamic_validation_only', 'dynamic_processing_only', 'dynamic_distribution_summary',
+                                  'enable_range_screening', 'static_validation_only', 'static_processing_only']:
                     self.config[config_key] = env_value.lower() in ['true', '1', 'yes', 'on']
                 else:
                     self.config[config_key] = env_value
@@ -245,7 +268,9 @@ class ConfigManager:
         
         print("  验证配置:")
         dynamic_validation_keys = ['dynamic_expected_file_count', 'dynamic_expected_row_count', 
-                                 'dynamic_expected_time_range_start', 'dynamic_expected_time_range_end']
+                                 'dynamic_expected_time_range_start', 'dynamic_expected_time_range_end',
+                                 'enable_range_screening', 'range_robust_z_threshold', 'range_cohort_stats',
+                                 'range_issues_path']
         for key in dynamic_validation_keys:
             if key in self.config:
                 print(f"    {key}: {self.config[key]}")
@@ -257,7 +282,8 @@ class ConfigManager:
                 print(f"    {key}: {self.config[key]}")
         
         print("  步骤控制配置:")
-        step_keys = ['dynamic_validation_only', 'dynamic_processing_only', 'skip_interactive']
+        step_keys = ['dynamic_validation_only', 'dynamic_processing_only', 'dynamic_distribution_summary',
+                     'skip_interactive']
         for key in step_keys:
             if key in self.config:
                 print(f"    {key}: {self.config[key]}")
@@ -267,6 +293,14 @@ class ConfigManager:
         for key in output_keys:
             if key in self.config:
                 print(f"    {key}: {self.config[key]}")
+        
+        print("  分布摘要配置:")
+        distribution_keys = ['distribution_source', 'distribution_per_day', 'distribution_sketch_k',
+                             'distribution_n_jobs', 'distribution_incremental', 'distribution_sketch_path',
+                             'distribution_summary_path', 'distribution_day_summary_path']
+        for key in distribution_keys:
+            if key in self.config:
+                print(f"    {key}: {self.config[key]}")
 
 
 def create_sample_config():
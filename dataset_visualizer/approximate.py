@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Approximate Analysis Module
+近似分析模块
+
+This module supports quick-look reports on large cohorts. It draws a reproducible
+stratified sample of patients (proportional allocation, e.g. by disease) and
+estimates proportions from the sample with confidence intervals: the stratified
+mean with finite population correction, and a Wilson score interval computed on
+the design effective sample size.
+本模块用于大型队列的快速预览报告：按分层（例如疾病类型）比例抽取可复现的患者样本，
+并由样本估计比例及其置信区间（含有限总体校正的分层均值，以及基于设计有效样本量的Wilson区间）。
+
+Every output produced from a sample must carry approximate_label() so that
+approximate runs cannot be mistaken for full runs.
+所有基于样本的输出都必须带有approximate_label()标注，以免与完整运行的结果混淆。
+"""
+
+import os
+from statistics import NormalDist
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import logging
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+MISSING_STRATUM = 'Unknown'
+
+
+def stratified_sample(strata: pd.Series, fraction: Optional[float] = None, n: Optional[int] = None,
+                      min_per_stratum: int = 2, random_state: int = 42) -> pd.Index:
+    """
+    Draw a reproducible stratified sample with proportional allocation.
+    按比例分配抽取可复现的分层样本。
+
+    Args:
+        strata: Stratum label per patient, indexed by patient ID (missing labels form
+                their own stratum)
+        fraction: Sampling fraction per stratum (used when n is None)
+        n: Approximate total sample size (overrides fraction)
+        min_per_stratum: Minimum patients drawn from every stratum (capped at its size)
+        random_state: Seed; the same inputs always give the same sample
+
+    Returns:
+        Index of sampled patient IDs, in the original order of strata
+
+    Raises:
+        ValueError: If neither a valid fraction nor n is given
+    """
+    if n is not None:
+        fraction = n / max(len(strata), 1)
+    if fraction is None or not 0 < fraction <= 1:
+        raise ValueError(f"Sampling fraction must be in (0, 1], got {fraction}")
+
+    labels = strata.astype(object).where(strata.notna(), MISSING_STRATUM)
+    rng = np.random.default_rng(random_state)
+    positions = []
+    for label in sorted(labels.unique(), key=str):
+        members = np.flatnonzero((labels == label).to_numpy())
+        size = min(len(members), max(min_per_stratum, int(round(fraction * len(members)))))
+        positions.append(rng.choice(members, size=size, replace=False))
+    return strata.index[np.sort(np.concatenate(positions))]
+
+
+def stratum_sizes(strata: pd.Series) -> pd.Series:
+    """Population size of each stratum (missing labels counted as MISSING_STRATUM)."""
+    return strata.astype(object).where(strata.notna(), MISSING_STRATUM).value_counts()
+
+
+def draw_sample(strata: pd.Series, settings: Dict[str, Any]) -> Tuple[pd.Index, pd.Series]:
+    """
+    Draw the sample described by normalized settings (see sampling_settings).
+    按规范化的配置抽取样本。
+
+    Returns:
+        (sampled patient IDs, population size per stratum)
+    """
+    sample_ids = stratified_sample(
+        strata,
+        fraction=settings['sample_fraction'],
+        n=settings['sample_size'],
+        min_per_stratum=settings['min_per_stratum'],
+        random_state=settings['random_state'],
+    )
+    logger.info(f"Approximate mode: sampled {len(sample_ids)} of {len(strata)} patients")
+    return sample_ids, stratum_sizes(strata)
+
+
+def _z_value(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(p: Union[float, np.ndarray], n: Union[float, np.ndarray],
+                    confidence: float = 0.95):
+    """
+    Wilson score interval for a proportion p observed on (effective) sample size n.
+    比例p在（有效）样本量n下的Wilson置信区间。
+
+    Returns:
+        (lower, upper)
+    """
+    z = _z_value(confidence)
+    p = np.asarray(p, dtype=float)
+    n = np.maximum(np.asarray(n, dtype=float), 1e-12)
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return np.clip(center - half_width, 0, 1), np.clip(center + half_width, 0, 1)
+
+
+def estimate_proportions(values: pd.DataFrame, strata: Optional[pd.Series] = None,
+                         population_sizes: Optional[pd.Series] = None,
+                         confidence: float = 0.95) -> pd.DataFrame:
+    """
+    Estimate the population mean of each column of 0-1 valued sample data.
+    由取值0-1的样本数据估计每列的总体均值（比例）。
+
+    Args:
+        values: Sampled patients × quantities (booleans or fractions)
+        strata: Stratum label of each sampled patient (None = simple random sample)
+        population_sizes: Population size per stratum (None = sample sizes, i.e. no
+                          finite population correction)
+        confidence: Confidence level of the intervals
+
+    Within-stratum variance of 0/1 columns uses a smoothed proportion
+    (x + 0.5) / (n_h + 1), so strata that happen to be homogeneous in a small
+    sample, or are sampled only once, still contribute uncertainty. For other
+    columns a stratum with fewer than 2 sampled patients borrows the overall
+    sample variance.
+    0/1列的层内方差使用平滑比例 (x + 0.5) / (n_h + 1)，小样本中恰好同质或只抽到一人的层
+    仍然贡献不确定性；其他列中抽样人数少于2的层使用整个样本的方差。
+
+    Returns:
+        DataFrame indexed by column with estimate, ci_low, ci_high, std_error, n_sampled
+        and small_strata (number of strata with fewer than 2 sampled patients)
+    """
+    values = values.astype(float)
+    if strata is None:
+        strata = pd.Series(MISSING_STRATUM, index=values.index)
+    labels = strata.reindex(values.index).astype(object)
+    labels = labels.where(labels.notna(), MISSING_STRATUM)
+    sample_sizes = labels.value_counts()
+    if population_sizes is None:
+        population_sizes = sample_sizes
+    population_sizes = population_sizes.reindex(sample_sizes.index).fillna(sample_sizes)
+    weights = population_sizes / population_sizes.sum()
+
+    binary = values.isin([0.0, 1.0]).all()
+    overall_var = values.var(ddof=1).fillna(0.0)
+    small_strata = [label for label, n_h in sample_sizes.items() if n_h < 2]
+    if small_strata:
+        logger.warning(f"Strata with fewer than 2 sampled patients: {small_strata}; "
+                       f"their variance is approximated")
+
+    estimate = pd.Series(0.0, index=values.columns)
+    variance = pd.Series(0.0, index=values.columns)
+    for label, group in values.groupby(labels):
+        n_h, N_h, W_h = sample_sizes[label], population_sizes[label], weights[label]
+        estimate += W_h * group.mean()
+        smoothed = (group.sum() + 0.5) / (n_h + 1)
+        if n_h > 1:
+            within = group.var(ddof=1).where(~binary, smoothed * (1 - smoothed) * n_h / (n_h - 1))
+        else:
+            within = overall_var.where(~binary, smoothed * (1 - smoothed))
+        fpc = max(0.0, 1 - n_h / N_h)
+        variance += W_h ** 2 * fpc * within / n_h
+
+    n_total = len(values)
+    p = estimate.clip(0, 1).to_numpy()
+    var = variance.clip(lower=0).to_numpy()
+    # Effective sample size of the design. An estimate of 0 or 1, or a column with
+    # no variance left after the finite population correction, falls back to the
+    # nominal sample size instead of a zero-width interval.
+    fallback = (var <= 1e-15) | (p <= 0) | (p >= 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n_eff = np.where(fallback, n_total, p * (1 - p) / var)
+    ci_low, ci_high = wilson_interval(p, np.clip(n_eff, 1, None), confidence)
+
+    return pd.DataFrame({
+        'estimate': p,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'std_error': np.sqrt(var),
+        'n_sampled': n_total,
+        'small_strata': len(small_strata),
+    }, index=values.columns)
+
+
+def estimate_category_shares(sample: pd.Series, strata: Optional[pd.Series] = None,
+                             population_sizes: Optional[pd.Series] = None,
+                             confidence: float = 0.95, missing_label: str = 'Missing') -> pd.DataFrame:
+    """
+    Estimate the share of every category of a variable (missing values as their own category).
+    估计变量每个类别所占比例（缺失值单独作为一类）。
+
+    Returns:
+        DataFrame indexed by category, ordered by descending estimate
+    """
+    labels = sample.astype(object).where(sample.notna(), missing_label)
+    indicators = pd.get_dummies(labels).astype(float)
+    shares = estimate_proportions(indicators, strata, population_sizes, confidence)
+    return shares.sort_values('estimate', ascending=False, kind='stable')
+
+
+def estimate_array(values: np.ndarray, strata: Optional[pd.Series] = None,
+                   population_sizes: Optional[pd.Series] = None,
+                   confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """
+    estimate_proportions for per-patient arrays of any shape.
+    对任意形状的逐患者数组进行比例估计。
+
+    Args:
+        values: Array of shape (sampled patients, ...) with values in [0, 1]
+        strata: Stratum label of each row, in row order (None = simple random sample)
+        population_sizes: Population size per stratum
+
+    Returns:
+        Dictionary with 'estimate', 'ci_low' and 'ci_high' arrays of shape values.shape[1:]
+    """
+    index = strata.index if strata is not None else None
+    flat = pd.DataFrame(values.reshape(len(values), -1).astype(float), index=index)
+    estimates = estimate_proportions(flat, strata, population_sizes, confidence)
+    return {key: estimates[key].to_numpy().reshape(values.shape[1:])
+            for key in ('estimate', 'ci_low', 'ci_high')}
+
+
+def patient_strata(patient_ids, static_file: Optional[str] = None,
+                   stratify_by: Optional[str] = None) -> pd.Series:
+    """
+    Stratum label of each patient, read from the static table (first column = patient ID).
+    从静态数据表（第一列为患者编号）读取每位患者的分层标签。
+
+    Returns:
+        Series indexed by patient_ids and named after the stratification column; a single
+        unnamed stratum when the static file or the column is unavailable
+    """
+    strata = pd.Series('all', index=pd.Index(patient_ids), dtype=object, name=None)
+    if static_file and stratify_by and os.path.exists(static_file):
+        static = pd.read_csv(static_file, index_col=0)
+        if stratify_by in static.columns:
+            labels = static[stratify_by]
+            labels.index = labels.index.astype(str)
+            strata = labels.reindex([str(i) for i in patient_ids]).rename(stratify_by)
+            strata.index = pd.Index(patient_ids)
+        else:
+            logger.warning(f"Stratification column '{stratify_by}' not found, using a simple random sample")
+    return strata
+
+
+def sample_patients(patient_ids, settings: Optional[Dict[str, Any]]) -> Tuple[list, Dict[str, Any]]:
+    """
+    Sample patients for an approximate run of a per-patient script.
+    为逐患者脚本的近似运行抽取患者样本。
+
+    Args:
+        patient_ids: All patient IDs of the cohort
+        settings: Approximate-mode settings; 'static_file' (optional) supplies the
+                  stratification column
+
+    Returns:
+        (sampled patient IDs, estimation context with 'label', 'strata',
+        'population_sizes' and 'confidence')
+    """
+    settings = sampling_settings(settings)
+    strata = patient_strata(patient_ids, settings.get('static_file'), settings['stratify_by'])
+    sample_ids, population_sizes = draw_sample(strata, settings)
+    context = {
+        'label': approximate_label(len(sample_ids), len(strata), settings['confidence'], strata.name),
+        'strata': strata.loc[sample_ids],
+        'population_sizes': population_sizes,
+        'confidence': settings['confidence'],
+    }
+    return list(sample_ids), context
+
+
+def approximate_label(n_sampled: int, n_population: int, confidence: float = 0.95,
+                      stratify_by: Optional[str] = None) -> str:
+    """
+    Label identifying an approximate run.
+    近似运行的标注文本。
+    """
+    design = f"stratified sample (by {stratify_by})" if stratify_by else "simple random sample"
+    return (f"APPROXIMATE - {design} of {n_sampled}/{n_population} patients, "
+            f"{confidence:.0%} CI")
+
+
+def format_estimate(row: pd.Series, scale: float = 100) -> str:
+    """Format an estimate row as 'p% (CI low-high%)'."""
+    return (f"{row['estimate'] * scale:.1f}% "
+            f"(CI {row['ci_low'] * scale:.1f}-{row['ci_high'] * scale:.1f}%)")
+
+
+def sampling_settings(settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Normalize an approximate-mode settings dictionary (see analysis.approximate in config.yaml).
+    规范化近似模式的配置字典。
+    """
+    defaults = {
+        'enabled': False,
+        'sample_fraction': 0.1,
+        'sample_size': None,
+        'stratify_by': 'Disease',
+        'min_per_stratum': 2,
+        'random_state': 42,
+        'confidence': 0.95,
+    }
+    defaults.update(settings or {})
+    return defaults
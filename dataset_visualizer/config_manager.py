@@ -60,7 +60,17 @@ class ConfigManager:
                 'backup_input_file': '/home/phl/PHL/Car-T/dataset_clip/encoded_standardized.csv'
             },
             'analysis': {
-                'age_threshold': 65
+                'age_threshold': 65,
+                'dtypes': {},
+                'approximate': {
+                    'enabled': False,
+                    'sample_fraction': 0.1,
+                    'sample_size': None,
+                    'stratify_by': 'Disease',
+                    'min_per_stratum': 2,
+                    'random_state': 42,
+                    'confidence': 0.95
+                }
             },
             'visualization': {
                 'variables': [
@@ -77,6 +87,8 @@ class ConfigManager:
                 'max_categories': 10,
                 'dpi': 300,
                 'output_formats': ['png', 'pdf'],
+                'n_jobs': None,
+                'render_cache': True,
                 'colors': ['#2E86AB', '#A23B72', '#F18F01', '#C73E1D', '#6A994E',
                           '#577590', '#F8961E', '#F9844A', '#90A959', '#6494AA'],
                 'alpha': 0.8,
@@ -97,6 +109,7 @@ class ConfigManager:
             },
             'output': {
                 'report_filename': 'categorical_analysis_report.txt',
+                'approximate_report_filename': 'approximate_analysis_report.txt',
                 'visualization_filename': 'categorical_variables_visualization.png',
                 'data_filename': 'categorical_variables_data.csv',
                 'encoding': 'utf-8'
@@ -15,6 +15,11 @@ from datetime import datetime
 from typing import Dict, Any, List, Optional, Union, Tuple
 import logging
 
+from approximate import (approximate_label, draw_sample, estimate_category_shares,
+                         estimate_proportions, format_estimate, sampling_settings)
+from data_profiler import DatasetProfile
+from dataset_context import DatasetContext
+
 # Configure logging for this module  
 logger = logging.getLogger(__name__)
 
@@ -38,46 +43,31 @@ class StaticDataAnalyzer:
             config_manager: ConfigManager instance for accessing configuration
         """
         self.config = config_manager
+        self.context: Optional[DatasetContext] = None
         self.df: Optional[pd.DataFrame] = None
+        self.profile: Optional[DatasetProfile] = None
         self.total_patients: int = 0
     
-    def load_data(self) -> bool:
+    def load_data(self, context: Optional[DatasetContext] = None) -> bool:
         """
-        Load data from the configured input file.
-        从配置的输入文件加载数据。
+        Load data from a shared dataset context or from the configured input file.
+        从共享数据集上下文或配置的输入文件加载数据。
+        
+        Args:
+            context: Optional DatasetContext shared with other components; the file
+                     is parsed only if the context has not been loaded yet
         
         Returns:
             True if data loaded successfully, False otherwise
-            
-        Raises:
-            FileNotFoundError: If input file cannot be found
-            pd.errors.EmptyDataError: If input file is empty
-            pd.errors.ParserError: If input file cannot be parsed
         """
-        input_file = self.config.get_path('input_file')
-        try:
-            self.df = pd.read_csv(input_file)
-            self.total_patients = len(self.df)
-            logger.info(f"Successfully loaded data from: {input_file}")
-            logger.info(f"Total patients: {self.total_patients}")
-            print(f"Successfully loaded data from: {input_file}")
-            print(f"Total patients: {self.total_patients}")
-            return True
-        except FileNotFoundError as e:
-            error_msg = f"Input file not found: {input_file}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return False
-        except pd.errors.EmptyDataError as e:
-            error_msg = f"Input file is empty: {input_file}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return False
-        except Exception as e:
-            error_msg = f"Error reading input file {input_file}: {e}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
+        if context is None:
+            context = DatasetContext.from_config(self.config)
+        if not context.load():
             return False
+        self.context = context
+        self.df = context.frame
+        self.total_patients = context.total_patients
+        return True
     
     def analyze_categorical_variables(self) -> None:
         """
@@ -93,6 +83,10 @@ class StaticDataAnalyzer:
             print("Error: No data loaded. Call load_data() first.")
             return
         
+        # Counts, missingness, dtypes and numeric summaries for all variables in one
+        # pass; cached on the dataset context so regenerating the report is cheap
+        self.profile = self.context.profile()
+        
         # Print column information for debugging
         logger.info(f"Available data columns: {list(self.df.columns)}")
         logger.info(f"Dataset shape: {self.df.shape}")
@@ -125,6 +119,80 @@ class StaticDataAnalyzer:
         # Save complete report
         self._save_report(report_lines)
     
+    def analyze_approximate(self) -> None:
+        """
+        Generate a quick-look report from a stratified sample of patients.
+        基于分层抽样的患者样本生成快速预览报告。
+        
+        Missingness and category shares of the configured variables are reported as
+        estimates with confidence intervals. The report is labelled as approximate and
+        saved under its own file name, so it never replaces the full report.
+        """
+        if self.df is None:
+            logger.error("No data loaded. Call load_data() first.")
+            print("Error: No data loaded. Call load_data() first.")
+            return
+        
+        settings = sampling_settings(self.config.get('analysis', 'approximate', {}))
+        confidence = settings['confidence']
+        stratify_by = settings['stratify_by'] if settings['stratify_by'] in self.df.columns else None
+        strata = self.df[stratify_by] if stratify_by else pd.Series('all', index=self.df.index)
+        sample_ids, population_sizes = draw_sample(strata, settings)
+        sample = self.df.loc[sample_ids]
+        sample_strata = strata.loc[sample_ids]
+        label = approximate_label(len(sample_ids), self.total_patients, confidence, stratify_by)
+        
+        report_lines = self._generate_report_header()
+        report_lines[1:1] = [label]
+        
+        # Missingness estimates for all columns
+        report_lines.extend([
+            "\n缺失率估计 Estimated Missingness",
+            "-" * 40
+        ])
+        missing = estimate_proportions(sample.isnull(), sample_strata, population_sizes, confidence)
+        observed = missing[missing['estimate'] > 0]
+        for col, row in observed.iterrows():
+            report_lines.append(f"  {col}: {format_estimate(row)}")
+        if len(observed) < len(missing):
+            upper = missing.loc[missing['estimate'] == 0, 'ci_high'].max() * 100
+            other = "其余 " if len(observed) else ""
+            report_lines.append(f"  {other}{len(missing) - len(observed)} 个变量在样本中无缺失 "
+                                f"No missing values in sample for these variables (CI upper bound ≤ {upper:.1f}%)")
+        
+        # Category share estimates for the configured variables
+        report_lines.extend([
+            "\n分类变量比例估计 Estimated Category Shares",
+            "-" * 40
+        ])
+        max_categories = self.config.get('visualization', 'max_categories', 10)
+        for var in self.config.get('visualization', 'variables', []):
+            if var not in self.df.columns:
+                report_lines.append(f"\n{var}: 数据不可用 Data not available")
+                continue
+            values = sample[var]
+            if var == 'Age' and self.context is not None:
+                values = self.context.derived('Age_Group').loc[sample_ids]
+            if values.nunique() > max_categories:
+                report_lines.append(f"\n{var}: 类别过多，仅报告缺失率 Too many categories, see missingness")
+                continue
+            if var == stratify_by:
+                # Stratum sizes are known for the whole cohort
+                report_lines.append(f"\n{var} (分层变量，精确值 exact):")
+                for category, count in strata.value_counts().items():
+                    report_lines.append(f"  {category}: {count / self.total_patients * 100:.1f}%")
+                continue
+            report_lines.append(f"\n{var}:")
+            shares = estimate_category_shares(values, sample_strata, population_sizes, confidence)
+            for category, row in shares.iterrows():
+                report_lines.append(f"  {category}: {format_estimate(row)}")
+        
+        report_lines.append("\n" + label)
+        for line in report_lines:
+            print(line)
+        self._save_report(report_lines, self.config.get('output', 'approximate_report_filename',
+                                                        'approximate_analysis_report.txt'))
+    
     def _generate_report_header(self) -> List[str]:
         """
         Generate report header with basic information.
@@ -179,11 +247,11 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'Sex' not in self.df.columns:
+        if 'Sex' not in self.profile:
             lines.append("性别数据不可用 Sex data not available")
             return lines
             
-        sex_counts = self.df['Sex'].value_counts()
+        sex_counts = self.profile['Sex'].value_counts()
         for sex, count in sex_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"{sex}: {count} 名患者 ({percentage:.1f}%)")
@@ -212,17 +280,16 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'Age' not in self.df.columns:
+        if 'Age' not in self.profile:
             lines.append("年龄数据不可用 Age data not available")
             return lines
         
         # Basic age statistics
-        age_data = self.df['Age'].dropna()
-        if len(age_data) == 0:
+        age_stats = self.profile['Age'].stats
+        if self.profile['Age'].n_valid == 0 or age_stats is None:
             lines.append("无有效年龄数据 No valid age data")
             return lines
-            
-        age_stats = age_data.describe()
+        
         lines.extend([
             f"年龄统计摘要 Age Statistics:",
             f"  平均年龄 Mean: {age_stats['mean']:.1f} 岁",
@@ -232,11 +299,8 @@ class StaticDataAnalyzer:
             f"  最大年龄 Max: {age_stats['max']:.0f} 岁"
         ])
         
-        # Age grouping analysis
-        self.df['Age_Group'] = self.df['Age'].apply(
-            lambda x: f'< {age_threshold}岁' if x < age_threshold else f'≥ {age_threshold}岁'
-        )
-        age_group_counts = self.df['Age_Group'].value_counts()
+        # Age grouping analysis (derived once by the shared dataset context)
+        age_group_counts = self.profile['Age_Group'].value_counts()
         lines.append(f"\n年龄分组分布 Age Group Distribution:")
         for group, count in age_group_counts.items():
             percentage = (count / self.total_patients) * 100
@@ -278,11 +342,11 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'Disease' not in self.df.columns:
+        if 'Disease' not in self.profile:
             lines.append("疾病类型数据不可用 Disease type data not available")
             return lines
             
-        disease_counts = self.df['Disease'].value_counts()
+        disease_counts = self.profile['Disease'].value_counts()
         lines.append(f"疾病类型数量 Number of Disease Types: {len(disease_counts)}")
         for disease, count in disease_counts.items():
             percentage = (count / self.total_patients) * 100
@@ -297,18 +361,18 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'BM disease burden' not in self.df.columns:
+        if 'BM disease burden' not in self.profile:
             lines.append("骨髓疾病负荷数据不可用 BM disease burden data not available")
             return lines
             
-        bm_burden = self.df['BM disease burden'].dropna()
-        if len(bm_burden) == 0:
+        bm_burden = self.profile['BM disease burden']
+        if bm_burden.n_valid == 0:
             lines.append("无有效骨髓疾病负荷数据 No valid BM disease burden data")
             return lines
         
         # Handle numeric data
-        if pd.api.types.is_numeric_dtype(bm_burden):
-            bm_stats = bm_burden.describe()
+        if bm_burden.is_numeric:
+            bm_stats = bm_burden.stats
             lines.extend([
                 f"骨髓疾病负荷统计 BM Disease Burden Statistics:",
                 f"  平均值 Mean: {bm_stats['mean']:.2f}%",
@@ -318,21 +382,8 @@ class StaticDataAnalyzer:
                 f"  最大值 Max: {bm_stats['max']:.2f}%"
             ])
             
-            # Categorize burden levels
-            def categorize_bm_burden(value: float) -> str:
-                if value == 0:
-                    return "无负荷 (0%)"
-                elif value <= 25:
-                    return "低负荷 (1-25%)"
-                elif value <= 50:
-                    return "中负荷 (26-50%)"
-                elif value <= 75:
-                    return "高负荷 (51-75%)"
-                else:
-                    return "极高负荷 (>75%)"
-            
-            self.df['BM_Burden_Category'] = bm_burden.apply(categorize_bm_burden)
-            burden_counts = self.df['BM_Burden_Category'].value_counts()
+            # Categorize burden levels (derived once by the shared dataset context)
+            burden_counts = self.profile['BM_Burden_Category'].value_counts()
             lines.append(f"\n骨髓疾病负荷分组 BM Disease Burden Categories:")
             for category, count in burden_counts.items():
                 percentage = (count / self.total_patients) * 100
@@ -347,11 +398,11 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'Bone marrow cellularity' not in self.df.columns:
+        if 'Bone marrow cellularity' not in self.profile:
             lines.append("骨髓细胞活性数据不可用 Bone marrow cellularity data not available")
             return lines
             
-        cellularity_counts = self.df['Bone marrow cellularity'].value_counts()
+        cellularity_counts = self.profile['Bone marrow cellularity'].value_counts()
         for cellularity, count in cellularity_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"  {cellularity}: {count} 名患者 ({percentage:.1f}%)")
@@ -367,9 +418,9 @@ class StaticDataAnalyzer:
         
         extramedullary_vars = ['extramedullary mass', 'extranodal involvement', 'B symptoms']
         for var in extramedullary_vars:
-            if var in self.df.columns:
+            if var in self.profile:
                 lines.append(f"\n{var}:")
-                var_counts = self.df[var].value_counts()
+                var_counts = self.profile[var].value_counts()
                 for value, count in var_counts.items():
                     percentage = (count / self.total_patients) * 100
                     lines.append(f"  {value}: {count} 名患者 ({percentage:.1f}%)")
@@ -385,11 +436,11 @@ class StaticDataAnalyzer:
             "-" * 40
         ]
         
-        if 'Ann Arbor stage' not in self.df.columns:
+        if 'Ann Arbor stage' not in self.profile:
             lines.append("Ann Arbor分期数据不可用 Ann Arbor staging data not available")
             return lines
             
-        stage_counts = self.df['Ann Arbor stage'].value_counts()
+        stage_counts = self.profile['Ann Arbor stage'].value_counts()
         for stage, count in stage_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"  Stage {stage}: {count} 名患者 ({percentage:.1f}%)")
@@ -430,16 +481,16 @@ class StaticDataAnalyzer:
         ]
         
         col_name = 'Number of prior therapy lines'
-        if col_name not in self.df.columns:
+        if col_name not in self.profile:
             lines.append("既往治疗线数数据不可用 Prior therapy lines data not available")
             return lines
             
-        therapy_lines = self.df[col_name].dropna()
-        if len(therapy_lines) == 0:
+        therapy_lines = self.profile[col_name]
+        therapy_stats = therapy_lines.stats
+        if therapy_lines.n_valid == 0 or therapy_stats is None:
             lines.append("无有效既往治疗线数数据 No valid prior therapy lines data")
             return lines
-            
-        therapy_stats = therapy_lines.describe()
+        
         lines.extend([
             f"既往治疗线数统计 Prior Therapy Lines Statistics:",
             f"  平均线数 Mean: {therapy_stats['mean']:.1f}",
@@ -449,7 +500,7 @@ class StaticDataAnalyzer:
             f"  最多线数 Max: {therapy_stats['max']:.0f}"
         ])
         
-        therapy_line_counts = therapy_lines.value_counts().sort_index()
+        therapy_line_counts = therapy_lines.value_counts(sort_index=True)
         lines.append(f"\n治疗线数分布 Distribution by Number of Lines:")
         for lines_count, patient_count in therapy_line_counts.items():
             percentage = (patient_count / self.total_patients) * 100
@@ -465,11 +516,11 @@ class StaticDataAnalyzer:
         ]
         
         col_name = 'Prior hematopoietic stem cell'
-        if col_name not in self.df.columns:
+        if col_name not in self.profile:
             lines.append("既往干细胞移植数据不可用 Prior HSCT data not available")
             return lines
             
-        hsct_counts = self.df[col_name].value_counts()
+        hsct_counts = self.profile[col_name].value_counts()
         for hsct_type, count in hsct_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"  {hsct_type}: {count} 名患者 ({percentage:.1f}%)")
@@ -484,11 +535,11 @@ class StaticDataAnalyzer:
         ]
         
         col_name = 'Prior CAR-T therapy'
-        if col_name not in self.df.columns:
+        if col_name not in self.profile:
             lines.append("既往CAR-T治疗数据不可用 Prior CAR-T therapy data not available")
             return lines
             
-        prior_cart_counts = self.df[col_name].value_counts()
+        prior_cart_counts = self.profile[col_name].value_counts()
         for status, count in prior_cart_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"  {status}: {count} 名患者 ({percentage:.1f}%)")
@@ -503,11 +554,11 @@ class StaticDataAnalyzer:
         ]
         
         col_name = 'Bridging therapy'
-        if col_name not in self.df.columns:
+        if col_name not in self.profile:
             lines.append("桥接治疗数据不可用 Bridging therapy data not available")
             return lines
             
-        bridging_counts = self.df[col_name].value_counts()
+        bridging_counts = self.profile[col_name].value_counts()
         for status, count in bridging_counts.items():
             percentage = (count / self.total_patients) * 100
             lines.append(f"  {status}: {count} 名患者 ({percentage:.1f}%)")
@@ -537,8 +588,8 @@ class StaticDataAnalyzer:
             section.append(f"\n{title}")
             section.append("-" * 40)
             
-            if var in self.df.columns:
-                var_counts = self.df[var].value_counts()
+            if var in self.profile:
+                var_counts = self.profile[var].value_counts()
                 for value, count in var_counts.items():
                     percentage = (count / self.total_patients) * 100
                     section.append(f"  {value}: {count} 名患者 ({percentage:.1f}%)")
@@ -566,37 +617,37 @@ class StaticDataAnalyzer:
             section.append(f"\n5.{i} {var}")
             section.append("-" * 40)
             
-            if var not in self.df.columns:
+            if var not in self.profile:
                 section.append(f"{var}数据不可用 {var} data not available")
                 continue
                 
             # Handle missing values
-            var_data = self.df[var].dropna()
-            if len(var_data) == 0:
+            n_valid = self.profile[var].n_valid
+            if n_valid == 0:
                 section.append("无有效数据 No valid data available")
                 continue
                 
             # Statistics for each grade
-            grade_counts = var_data.value_counts().sort_index()
+            grade_counts = self.profile[var].value_counts(sort_index=True)
             section.extend([
-                f"有效数据 Valid Data: {len(var_data)} 名患者",
-                f"缺失数据 Missing Data: {self.total_patients - len(var_data)} 名患者",
+                f"有效数据 Valid Data: {n_valid} 名患者",
+                f"缺失数据 Missing Data: {self.total_patients - n_valid} 名患者",
                 f"\n等级分布 Grade Distribution:"
             ])
             
             for grade, count in grade_counts.items():
-                percentage = (count / len(var_data)) * 100
+                percentage = (count / n_valid) * 100
                 section.append(f"  等级 {grade}: {count} 名患者 ({percentage:.1f}%)")
             
-            # Calculate event rates
-            any_grade_count = (var_data > 0).sum()
-            any_grade_percentage = (any_grade_count / len(var_data)) * 100
-            section.append(f"\n任何等级事件发生率 Any Grade Event Rate: {any_grade_count}/{len(var_data)} ({any_grade_percentage:.1f}%)")
+            # Calculate event rates from the grade distribution
+            any_grade_count = grade_counts[grade_counts.index > 0].sum()
+            any_grade_percentage = (any_grade_count / n_valid) * 100
+            section.append(f"\n任何等级事件发生率 Any Grade Event Rate: {any_grade_count}/{n_valid} ({any_grade_percentage:.1f}%)")
             
             # High grade events (≥3)
-            high_grade_count = (var_data >= 3).sum()
-            high_grade_percentage = (high_grade_count / len(var_data)) * 100
-            section.append(f"高等级事件发生率 (≥3级) High Grade Event Rate: {high_grade_count}/{len(var_data)} ({high_grade_percentage:.1f}%)")
+            high_grade_count = grade_counts[grade_counts.index >= 3].sum()
+            high_grade_percentage = (high_grade_count / n_valid) * 100
+            section.append(f"高等级事件发生率 (≥3级) High Grade Event Rate: {high_grade_count}/{n_valid} ({high_grade_percentage:.1f}%)")
         
         return section
     
@@ -616,11 +667,11 @@ class StaticDataAnalyzer:
         section.append("\n6.1 数据完整性 (Data Completeness)")
         section.append("-" * 40)
         
-        total_cells = self.df.shape[0] * self.df.shape[1]
-        missing_counts = self.df.isnull().sum()
+        total_cells = self.profile.total_cells
+        missing_counts = self.profile.missing_counts()
         total_missing = missing_counts.sum()
         
-        section.append(f"数据集维度 Dataset Dimensions: {self.df.shape[0]} 行 × {self.df.shape[1]} 列")
+        section.append(f"数据集维度 Dataset Dimensions: {self.profile.n_rows} 行 × {self.profile.n_columns} 列")
         section.append(f"总单元格数 Total Cells: {total_cells}")
         section.append(f"缺失值总数 Total Missing Values: {total_missing}")
         section.append(f"数据完整率 Data Completeness: {((total_cells - total_missing) / total_cells * 100):.1f}%")
@@ -635,7 +686,7 @@ class StaticDataAnalyzer:
         section.append(f"\n6.2 数据类型分析 (Data Types Analysis)")
         section.append("-" * 40)
         
-        dtype_counts = self.df.dtypes.value_counts()
+        dtype_counts = self.profile.dtype_counts()
         section.append(f"数据类型分布 Data Type Distribution:")
         for dtype, count in dtype_counts.items():
             section.append(f"  {dtype}: {count} 个变量")
@@ -644,26 +695,27 @@ class StaticDataAnalyzer:
         section.append(f"\n6.3 变量唯一值分析 (Unique Values Analysis)")
         section.append("-" * 40)
         
-        for col in self.df.columns:
-            unique_count = self.df[col].nunique()
+        for col, unique_count in self.profile.unique_counts().items():
             unique_percentage = (unique_count / self.total_patients) * 100
             section.append(f"  {col}: {unique_count} 个唯一值 ({unique_percentage:.1f}%)")
         
         return section
     
-    def _save_report(self, report_lines: List[str]) -> None:
+    def _save_report(self, report_lines: List[str], report_filename: Optional[str] = None) -> None:
         """
         Save comprehensive report to file.
         将综合报告保存到文件。
         
         Args:
             report_lines: List of report content lines
+            report_filename: File name in the output directory (None = output.report_filename)
             
         Raises:
             OSError: If file cannot be written due to permissions or disk space
         """
         output_dir = self.config.get_path('output_dir')
-        report_filename = self.config.get('output', 'report_filename', 'analysis_report.txt')
+        if report_filename is None:
+            report_filename = self.config.get('output', 'report_filename', 'analysis_report.txt')
         encoding = self.config.get('output', 'encoding', 'utf-8')
         
         report_path = os.path.join(output_dir, report_filename)
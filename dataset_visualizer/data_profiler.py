@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Data Profiler Module
+数据概况模块
+
+This module contains the DatasetProfile class, which summarizes every column of
+the static clinical data in a single pass. Each column is factorized once into
+integer category codes; value counts, missing counts, unique counts and numeric
+summary statistics (mean, median, standard deviation, min, max) are all derived
+from the compact (unique value, count) table instead of rescanning the column.
+本模块包含DatasetProfile类，对静态临床数据的每一列只扫描一次。每列先编码为整数类别码，
+频数、缺失数、唯一值数以及数值统计量（均值、中位数、标准差、最小值、最大值）
+均由紧凑的（唯一值, 频数）表导出，无需重复扫描原始列。
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import logging
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class VariableProfile:
+    """
+    Profile of a single variable.
+    单个变量的概况。
+
+    Attributes:
+        name: Variable name
+        dtype: Data type name of the source column
+        n_missing: Number of missing values
+        values: Unique non-missing values in order of first appearance
+        counts: Number of occurrences of each value in values
+        stats: Numeric summary (mean, 50%, std, min, max) for numeric variables, else None
+    """
+    name: str
+    dtype: str
+    n_missing: int
+    values: np.ndarray
+    counts: np.ndarray
+    stats: Optional[Dict[str, float]] = None
+
+    @property
+    def n_valid(self) -> int:
+        """Number of non-missing values."""
+        return int(self.counts.sum())
+
+    @property
+    def n_unique(self) -> int:
+        """Number of distinct non-missing values."""
+        return len(self.values)
+
+    @property
+    def is_numeric(self) -> bool:
+        """Whether numeric summary statistics are available."""
+        return self.stats is not None
+
+    def value_counts(self, sort_index: bool = False) -> pd.Series:
+        """
+        Value counts equivalent to Series.value_counts() on the source column.
+        与源列上Series.value_counts()等价的频数统计。
+
+        Args:
+            sort_index: Sort by value instead of by descending count
+
+        Returns:
+            Series of counts indexed by value
+        """
+        counts = pd.Series(self.counts, index=pd.Index(self.values, name=self.name), name='count')
+        return counts.sort_index() if sort_index else counts.sort_values(ascending=False, kind='stable')
+
+
+def _numeric_stats(values: np.ndarray, counts: np.ndarray) -> Optional[Dict[str, float]]:
+    """Summary statistics computed from the (unique value, count) table."""
+    n = counts.sum()
+    if n == 0:
+        return None
+    order = np.argsort(values, kind='stable')
+    values = values[order].astype(float)
+    counts = counts[order]
+
+    mean = float(np.dot(values, counts) / n)
+    std = float(np.sqrt(np.dot(counts, (values - mean) ** 2) / (n - 1))) if n > 1 else float('nan')
+
+    # Linear interpolation at position (n - 1) / 2 of the sorted data, as in describe()
+    cumulative = np.cumsum(counts)
+    position = (n - 1) * 0.5
+    lower = values[np.searchsorted(cumulative, int(np.floor(position)), side='right')]
+    upper = values[np.searchsorted(cumulative, int(np.ceil(position)), side='right')]
+    median = float(lower + (upper - lower) * (position - np.floor(position)))
+
+    return {'mean': mean, '50%': median, 'std': std, 'min': float(values[0]), 'max': float(values[-1])}
+
+
+def profile_variable(series: pd.Series, name: Optional[str] = None) -> VariableProfile:
+    """
+    Profile one column with a single factorization pass.
+    对单列进行一次编码扫描并生成概况。
+
+    Args:
+        series: Column to profile
+        name: Variable name (defaults to series.name)
+
+    Returns:
+        VariableProfile of the column
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    valid = codes >= 0
+    counts = np.bincount(codes[valid], minlength=len(uniques))
+    values = np.asarray(uniques)
+
+    stats = None
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        stats = _numeric_stats(values, counts)
+
+    return VariableProfile(
+        name=name if name is not None else series.name,
+        dtype=str(series.dtype),
+        n_missing=int(len(codes) - valid.sum()),
+        values=values,
+        counts=counts,
+        stats=stats,
+    )
+
+
+class DatasetProfile:
+    """
+    Cached single-pass profile of a static dataset and its derived columns.
+    静态数据集及其派生列的单次扫描概况（可缓存）。
+    """
+
+    def __init__(self, n_rows: int, variables: Dict[str, VariableProfile],
+                 derived: Optional[Dict[str, VariableProfile]] = None) -> None:
+        """
+        Initialize the profile; use DatasetProfile.build() to compute it from data.
+        初始化概况；使用DatasetProfile.build()从数据计算。
+
+        Args:
+            n_rows: Number of rows (patients)
+            variables: Profiles of the dataset columns, in column order
+            derived: Profiles of derived columns (not counted as dataset columns)
+        """
+        self.n_rows = n_rows
+        self.variables = variables
+        self.derived = derived or {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame,
+              derived: Optional[Dict[str, Optional[pd.Series]]] = None) -> 'DatasetProfile':
+        """
+        Profile every column of df and every derived series.
+        对df的每一列及每个派生序列生成概况。
+
+        Args:
+            df: Dataset to profile
+            derived: Optional derived column name → Series (None entries are skipped)
+
+        Returns:
+            DatasetProfile
+        """
+        variables = {col: profile_variable(df[col], col) for col in df.columns}
+        derived_profiles = {
+            name: profile_variable(series, name)
+            for name, series in (derived or {}).items() if series is not None
+        }
+        logger.info(f"Profiled {len(variables)} variables and {len(derived_profiles)} derived columns")
+        return cls(len(df), variables, derived_profiles)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.variables or name in self.derived
+
+    def __getitem__(self, name: str) -> VariableProfile:
+        if name in self.variables:
+            return self.variables[name]
+        return self.derived[name]
+
+    @property
+    def columns(self) -> List[str]:
+        """Dataset column names (derived columns excluded)."""
+        return list(self.variables)
+
+    @property
+    def n_columns(self) -> int:
+        """Number of dataset columns."""
+        return len(self.variables)
+
+    @property
+    def total_cells(self) -> int:
+        """Number of cells in the dataset."""
+        return self.n_rows * self.n_columns
+
+    def missing_counts(self) -> pd.Series:
+        """Missing value count per dataset column."""
+        return pd.Series({name: var.n_missing for name, var in self.variables.items()}, dtype='int64')
+
+    def unique_counts(self) -> pd.Series:
+        """Distinct non-missing value count per dataset column."""
+        return pd.Series({name: var.n_unique for name, var in self.variables.items()}, dtype='int64')
+
+    def dtype_counts(self) -> pd.Series:
+        """Number of dataset columns per data type, most frequent first."""
+        return pd.Series([var.dtype for var in self.variables.values()]).value_counts()
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Tabular summary with one row per dataset and derived column.
+        以表格形式汇总每个数据列和派生列。
+        """
+        rows: List[Dict[str, Any]] = []
+        for kind, profiles in (('variable', self.variables), ('derived', self.derived)):
+            for name, var in profiles.items():
+                row = {'variable': name, 'kind': kind, 'dtype': var.dtype,
+                       'n_valid': var.n_valid, 'n_missing': var.n_missing, 'n_unique': var.n_unique}
+                row.update(var.stats or {})
+                rows.append(row)
+        return pd.DataFrame(rows)
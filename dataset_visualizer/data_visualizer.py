@@ -20,6 +20,9 @@ import pandas as pd
 import seaborn as sns
 import logging
 
+from dataset_context import DatasetContext
+from render_scheduler import FigureSpec, render_figures
+
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
@@ -45,6 +48,7 @@ class StaticDataVisualizer:
             config_manager: ConfigManager instance for accessing configuration
         """
         self.config = config_manager
+        self.context: Optional[DatasetContext] = None
         self.df: Optional[pd.DataFrame] = None
         self.total_patients: int = 0
         
@@ -59,85 +63,140 @@ class StaticDataVisualizer:
         subplot_params = self.config.get('visualization', 'subplot_params', {})
         font_sizes = self.config.get('display', 'font_sizes', {})
         
+        # Kept on the instance so that render workers apply the same parameters
+        self.rc_params: Dict[str, Any] = {
+            'font.family': subplot_params.get('font_family', ['DejaVu Sans']),
+            'font.size': subplot_params.get('tick_labelsize', 8),
+            'axes.titlesize': subplot_params.get('title_fontsize', 12),
+            'axes.labelsize': subplot_params.get('xlabel_fontsize', 10),
+            'xtick.labelsize': subplot_params.get('tick_labelsize', 8),
+            'ytick.labelsize': subplot_params.get('tick_labelsize', 8),
+            'legend.fontsize': font_sizes.get('small', 9),
+            'figure.titlesize': font_sizes.get('title', 18),
+        }
+        
         # Set global matplotlib parameters
-        plt.rcParams['font.family'] = subplot_params.get('font_family', ['DejaVu Sans'])
-        plt.rcParams['font.size'] = subplot_params.get('tick_labelsize', 8)
-        plt.rcParams['axes.titlesize'] = subplot_params.get('title_fontsize', 12)
-        plt.rcParams['axes.labelsize'] = subplot_params.get('xlabel_fontsize', 10)
-        plt.rcParams['xtick.labelsize'] = subplot_params.get('tick_labelsize', 8)
-        plt.rcParams['ytick.labelsize'] = subplot_params.get('tick_labelsize', 8)
-        plt.rcParams['legend.fontsize'] = font_sizes.get('small', 9)
-        plt.rcParams['figure.titlesize'] = font_sizes.get('title', 18)
+        plt.rcParams.update(self.rc_params)
     
-    def load_data(self, df: Optional[pd.DataFrame] = None) -> bool:
+    def load_data(self, df: Optional[pd.DataFrame] = None,
+                  context: Optional[DatasetContext] = None) -> bool:
         """
-        Load data from DataFrame or from configured input file.
-        从DataFrame或配置的输入文件加载数据。
+        Load data from DataFrame, from a shared dataset context or from configured input file.
+        从DataFrame、共享数据集上下文或配置的输入文件加载数据。
         
         Args:
             df: Optional DataFrame to use instead of loading from file
+            context: Optional DatasetContext shared with other components; the file
+                     is parsed only if the context has not been loaded yet
             
         Returns:
             True if data loaded successfully, False otherwise
-            
-        Raises:
-            FileNotFoundError: If input file cannot be found
-            pd.errors.EmptyDataError: If input file is empty
         """
         if df is not None:
+            self.context = None
             self.df = df
             self.total_patients = len(self.df)
             logger.info(f"Data loaded from provided DataFrame. Total patients: {self.total_patients}")
             print(f"Data loaded from provided DataFrame. Total patients: {self.total_patients}")
             return True
         
-        input_file = self.config.get_path('input_file')
-        try:
-            self.df = pd.read_csv(input_file)
-            self.total_patients = len(self.df)
-            logger.info(f"Successfully loaded data from: {input_file}")
-            logger.info(f"Total patients: {self.total_patients}")
-            print(f"Successfully loaded data from: {input_file}")
-            print(f"Total patients: {self.total_patients}")
-            return True
-        except FileNotFoundError:
-            error_msg = f"Input file not found: {input_file}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return False
-        except pd.errors.EmptyDataError:
-            error_msg = f"Input file is empty: {input_file}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
-            return False
-        except Exception as e:
-            error_msg = f"Error reading input file {input_file}: {e}"
-            logger.error(error_msg)
-            print(f"Error: {error_msg}")
+        if context is None:
+            context = DatasetContext.from_config(self.config)
+        if not context.load():
             return False
+        self.context = context
+        self.df = context.frame
+        self.total_patients = context.total_patients
+        return True
     
-    def create_comprehensive_visualization(self) -> None:
+    def create_comprehensive_visualization(self, n_jobs: Optional[int] = None) -> None:
         """
         Create comprehensive visualization of all categorical variables.
         创建所有分类变量的综合可视化。
+        
+        Args:
+            n_jobs: Number of render processes (default: visualization.n_jobs, None = all cores)
         """
         if self.df is None:
             print("Error: No data loaded. Call load_data() first.")
             return
         
         print("Creating comprehensive visualization...")
+        self._render(self._group_specs(), n_jobs)
+        print("Comprehensive visualization completed!")
+    
+    def create_all_visualizations(self, n_jobs: Optional[int] = None) -> None:
+        """
+        Render the group charts and the summary dashboard in one process pool.
+        在同一个进程池中渲染所有分组图表和总结仪表板。
         
+        Args:
+            n_jobs: Number of render processes (default: visualization.n_jobs, None = all cores)
+        """
+        if self.df is None:
+            print("Error: No data loaded. Call load_data() first.")
+            return
+        
+        print("Creating comprehensive visualization and summary dashboard...")
+        specs = self._group_specs() + [self._dashboard_spec()]
+        self._render(specs, n_jobs)
+        print("All visualizations completed!")
+    
+    def _group_specs(self) -> List[FigureSpec]:
+        """
+        Build the figure specifications for all variable groups.
+        为所有变量分组构建图表规格。
+        
+        Returns:
+            One FigureSpec per group of (up to) 5 variables
+        """
         # Get all variables to visualize
         visualization_vars = self.config.get('visualization', 'variables')
         
         # Group variables into sets of 5
         var_groups = [visualization_vars[i:i+5] for i in range(0, len(visualization_vars), 5)]
         
-        # Create visualization for each group
-        for group_idx, var_group in enumerate(var_groups, 1):
-            self._create_group_visualization(var_group, group_idx)
-        
-        print("Comprehensive visualization completed!")
+        # A group figure depends only on its own columns and the plotting configuration
+        return [
+            self._figure_spec(f"comprehensive_analysis_group_{group_idx}",
+                              self._build_group_figure, var_group, group_idx,
+                              cache_inputs=(self.df.reindex(columns=var_group), group_idx,
+                                            self._plot_config()))
+            for group_idx, var_group in enumerate(var_groups, 1)
+        ]
+    
+    def _dashboard_spec(self) -> FigureSpec:
+        """Build the figure specification for the summary dashboard."""
+        return self._figure_spec("summary_dashboard", self._build_summary_dashboard,
+                                 cache_inputs=(self.df, self.total_patients))
+    
+    def _plot_config(self) -> Dict[str, Any]:
+        """Configuration sections that affect the rendered charts (scheduling options excluded)."""
+        plot_config = {section: dict(self.config.config.get(section, {}))
+                       for section in ('analysis', 'visualization', 'display')}
+        for key in ('n_jobs', 'render_cache'):
+            plot_config['visualization'].pop(key, None)
+        return plot_config
+    
+    def _figure_spec(self, filename: str, build, *args, cache_inputs: Any = None) -> FigureSpec:
+        """Create a FigureSpec using the configured output formats and save options."""
+        return FigureSpec(
+            name=filename,
+            build=build,
+            args=args,
+            formats=list(self.config.get('visualization', 'output_formats')),
+            save_kwargs=dict(dpi=self.config.get('visualization', 'dpi'), bbox_inches='tight',
+                             facecolor='white', edgecolor='none'),
+            cache_inputs=cache_inputs
+        )
+    
+    def _render(self, specs: List[FigureSpec], n_jobs: Optional[int] = None) -> None:
+        """Render figure specifications into the output directory (unchanged figures are skipped)."""
+        if n_jobs is None:
+            n_jobs = self.config.get('visualization', 'n_jobs', None)
+        render_figures(specs, self.config.get_path('output_dir'), n_jobs=n_jobs,
+                       rc_params=self.rc_params,
+                       use_cache=self.config.get('visualization', 'render_cache', True))
     
     def _create_group_visualization(self, variables: List[str], group_number: int) -> None:
         """
@@ -147,6 +206,21 @@ class StaticDataVisualizer:
             variables: List of variable names to visualize
             group_number: Group number for filename
         """
+        fig = self._build_group_figure(variables, group_number)
+        self._save_figure(fig, f"comprehensive_analysis_group_{group_number}")
+        plt.close(fig)
+    
+    def _build_group_figure(self, variables: List[str], group_number: int):
+        """
+        Build the figure for a group of variables (max 5).
+        
+        Args:
+            variables: List of variable names to visualize
+            group_number: Group number for the title
+            
+        Returns:
+            Matplotlib figure
+        """
         # Calculate layout
         num_vars = len(variables)
         
@@ -201,9 +275,7 @@ class StaticDataVisualizer:
             hspace=hspace
         )
         
-        # Save figure
-        self._save_figure(fig, f"comprehensive_analysis_group_{group_number}")
-        plt.close(fig)
+        return fig
     
     def _create_single_variable_plot(self, ax, variable: str) -> None:
         """
@@ -257,6 +329,10 @@ class StaticDataVisualizer:
         Returns:
             Categorical age groups
         """
+        if self.context is not None:
+            # Reuse the Age_Group column derived once by the shared dataset context
+            return self.context.derived('Age_Group').loc[data.index]
+        
         age_threshold = self.config.get('analysis', 'age_threshold', 65)
         
         def categorize_age(age):
@@ -575,7 +651,16 @@ class StaticDataVisualizer:
             return
         
         print("Creating summary dashboard...")
+        self._render([self._dashboard_spec()], n_jobs=1)
+        print("Summary dashboard created!")
+    
+    def _build_summary_dashboard(self):
+        """
+        Build the summary dashboard figure.
         
+        Returns:
+            Matplotlib figure
+        """
         # Create figure
         fig = plt.figure(figsize=(16, 12))
         fig.suptitle('Clinical Data Summary Dashboard', fontsize=20, fontweight='bold', y=0.98)
@@ -606,11 +691,7 @@ class StaticDataVisualizer:
         
         plt.tight_layout(rect=[0, 0, 1, 0.95], pad=3.0)
         
-        # Save dashboard
-        self._save_figure(fig, "summary_dashboard")
-        plt.close(fig)
-        
-        print("Summary dashboard created!")
+        return fig
     
     def _create_demographics_summary(self, ax) -> None:
         """Create demographics summary plot."""
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Dataset Context Module
+数据集上下文模块
+
+This module contains the DatasetContext class, a shared read-only view of the
+static clinical dataset. The input file is parsed once (with optional explicit
+dtypes); derived categorical columns such as Age_Group and BM_Burden_Category
+and the single-pass DatasetProfile are computed lazily on first use and cached,
+so the analyzer and the visualizer consume the same parsed data instead of each
+reading the file.
+本模块包含DatasetContext类，为静态临床数据集提供共享的只读视图。输入文件只解析一次
+（可指定数据类型），Age_Group、BM_Burden_Category等派生分类列及单次扫描的数据概况在首次使用时计算并缓存，
+分析器与可视化器共用同一份解析结果，而不再各自读取文件。
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import logging
+
+from data_profiler import DatasetProfile
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+
+def categorize_bm_burden(value: float) -> str:
+    """
+    Map a bone marrow disease burden percentage to its burden level.
+    将骨髓疾病负荷百分比映射为负荷等级。
+    """
+    if value == 0:
+        return "无负荷 (0%)"
+    elif value <= 25:
+        return "低负荷 (1-25%)"
+    elif value <= 50:
+        return "中负荷 (26-50%)"
+    elif value <= 75:
+        return "高负荷 (51-75%)"
+    else:
+        return "极高负荷 (>75%)"
+
+
+class DatasetContext:
+    """
+    Shared read-only dataset context for static clinical data.
+    静态临床数据的共享只读数据集上下文。
+
+    The parsed DataFrame is never modified: `frame` hands out shallow copies
+    (copy-on-write), and derived columns are returned as separate Series that
+    are cached on the context rather than added to the data.
+    """
+
+    # Derived column name → builder method name
+    DERIVED_COLUMNS: Dict[str, str] = {
+        'Age_Group': '_build_age_group',
+        'BM_Burden_Category': '_build_bm_burden_category',
+    }
+
+    def __init__(self, input_file: str, dtypes: Optional[Dict[str, Any]] = None,
+                 age_threshold: float = 65) -> None:
+        """
+        Initialize the context; the file is read by load().
+        初始化上下文；文件由load()读取。
+
+        Args:
+            input_file: Path to the static data CSV file
+            dtypes: Optional column → dtype mapping passed to pd.read_csv
+            age_threshold: Age boundary used for the Age_Group derived column
+        """
+        self.input_file = input_file
+        self.dtypes = dict(dtypes or {})
+        self.age_threshold = age_threshold
+        self._df: Optional[pd.DataFrame] = None
+        self._derived: Dict[str, Optional[pd.Series]] = {}
+        self._profile: Optional[DatasetProfile] = None
+
+    @classmethod
+    def from_config(cls, config_manager: Any) -> 'DatasetContext':
+        """
+        Create a context from the configured input file and analysis parameters.
+        根据配置的输入文件和分析参数创建上下文。
+
+        Args:
+            config_manager: ConfigManager instance for accessing configuration
+
+        Returns:
+            Unloaded DatasetContext
+        """
+        return cls(
+            config_manager.get_path('input_file'),
+            dtypes=config_manager.get('analysis', 'dtypes', None),
+            age_threshold=config_manager.get('analysis', 'age_threshold', 65),
+        )
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the input file has been parsed."""
+        return self._df is not None
+
+    def load(self) -> bool:
+        """
+        Parse the input file once; later calls are no-ops.
+        只解析一次输入文件；之后的调用不会重复读取。
+
+        Returns:
+            True if data loaded successfully, False otherwise
+        """
+        if self._df is not None:
+            return True
+        try:
+            self._df = pd.read_csv(self.input_file, dtype=self.dtypes or None)
+            logger.info(f"Successfully loaded data from: {self.input_file}")
+            logger.info(f"Total patients: {len(self._df)}")
+            print(f"Successfully loaded data from: {self.input_file}")
+            print(f"Total patients: {len(self._df)}")
+            return True
+        except FileNotFoundError:
+            error_msg = f"Input file not found: {self.input_file}"
+            logger.error(error_msg)
+            print(f"Error: {error_msg}")
+            return False
+        except pd.errors.EmptyDataError:
+            error_msg = f"Input file is empty: {self.input_file}"
+            logger.error(error_msg)
+            print(f"Error: {error_msg}")
+            return False
+        except Exception as e:
+            error_msg = f"Error reading input file {self.input_file}: {e}"
+            logger.error(error_msg)
+            print(f"Error: {error_msg}")
+            return False
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """
+        Shallow copy of the parsed data; changes to it do not reach the context.
+        解析后数据的浅拷贝；对其修改不会影响上下文。
+
+        Raises:
+            RuntimeError: If load() has not succeeded
+        """
+        if self._df is None:
+            raise RuntimeError("Dataset not loaded. Call load() first.")
+        return self._df.copy(deep=False)
+
+    @property
+    def total_patients(self) -> int:
+        """Number of rows (patients) in the dataset."""
+        return 0 if self._df is None else len(self._df)
+
+    @property
+    def columns(self) -> List[str]:
+        """Column names of the parsed data."""
+        return [] if self._df is None else list(self._df.columns)
+
+    def derived(self, name: str) -> Optional[pd.Series]:
+        """
+        Derived categorical column, computed on first request and cached.
+        获取派生分类列，首次请求时计算并缓存。
+
+        Args:
+            name: Derived column name ('Age_Group' or 'BM_Burden_Category')
+
+        Returns:
+            Series aligned with the data index (NaN where the source value is missing),
+            or None if the source column is unavailable
+
+        Raises:
+            KeyError: If name is not a known derived column
+        """
+        if name not in self.DERIVED_COLUMNS:
+            raise KeyError(f"Unknown derived column: {name}. Available: {sorted(self.DERIVED_COLUMNS)}")
+        if name not in self._derived:
+            self._derived[name] = getattr(self, self.DERIVED_COLUMNS[name])()
+        series = self._derived[name]
+        return None if series is None else series.copy(deep=False)
+
+    def profile(self) -> DatasetProfile:
+        """
+        Single-pass profile of all columns and derived columns, computed once and cached.
+        所有数据列及派生列的单次扫描概况，只计算一次并缓存。
+
+        Raises:
+            RuntimeError: If load() has not succeeded
+        """
+        if self._df is None:
+            raise RuntimeError("Dataset not loaded. Call load() first.")
+        if self._profile is None:
+            derived = {name: self.derived(name) for name in self.DERIVED_COLUMNS}
+            self._profile = DatasetProfile.build(self._df, derived)
+        return self._profile
+
+    def _build_age_group(self) -> Optional[pd.Series]:
+        """Split Age at age_threshold into '< N岁' / '≥ N岁'."""
+        if self._df is None or 'Age' not in self._df.columns:
+            return None
+        age = self._df['Age']
+        threshold = self.age_threshold
+        groups = np.where(age < threshold, f'< {threshold}岁', f'≥ {threshold}岁').astype(object)
+        groups[age.isna().to_numpy()] = np.nan
+        return pd.Series(groups, index=self._df.index, name='Age_Group')
+
+    def _build_bm_burden_category(self) -> Optional[pd.Series]:
+        """Bin numeric BM disease burden into burden levels."""
+        if self._df is None or 'BM disease burden' not in self._df.columns:
+            return None
+        burden = self._df['BM disease burden']
+        if not pd.api.types.is_numeric_dtype(burden):
+            return None
+        categories = burden.dropna().apply(categorize_bm_burden)
+        return categories.reindex(self._df.index).rename('BM_Burden_Category')
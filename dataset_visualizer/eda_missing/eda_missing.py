@@ -17,6 +17,14 @@ import matplotlib.ticker as mticker
 import seaborn as sns
 import os
 import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# 使用上级目录中的图表渲染调度器与近似分析工具
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render_scheduler import FigureSpec, render_figures
+from approximate import (approximate_label, draw_sample, estimate_proportions, format_estimate,
+                         sampling_settings, stratum_sizes)
 
 # Configure logging
 logging.basicConfig(
@@ -26,15 +34,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# --- 1. 静态数据分析 (此部分代码不变) ---
+# --- 1. 静态数据分析 ---
 
-def analyze_static_data(file_path, output_folder):
+def analyze_static_data(file_path, output_folder, use_cache=True):
     """
     分析静态数据中的缺失值并保存图表。
     
     Args:
         file_path: 静态数据文件路径
         output_folder: 输出文件夹路径
+        use_cache: 缺失值统计未变化且图表已存在时跳过渲染
     """
     print("--- 正在分析静态数据 ---")
     logger.info(f"Analyzing static data from: {file_path}")
@@ -66,7 +75,29 @@ def analyze_static_data(file_path, output_folder):
     print("静态数据缺失值信息:")
     print(missing_info_static)
 
-    plt.figure(figsize=(20, 8))
+    rendered = render_figures(
+        [FigureSpec(name='static_data_missing_analysis', build=_build_static_chart,
+                    args=(missing_info_static,), formats=['png'],
+                    save_kwargs={'bbox_inches': 'tight', 'dpi': 300})],
+        output_folder, n_jobs=1, verbose=False, use_cache=use_cache
+    )
+    for save_path in rendered.get('static_data_missing_analysis', []):
+        print(f"静态数据分析图表已保存至: {save_path}")
+        logger.info(f"Static data analysis chart saved to: {save_path}")
+    print("\n")
+
+
+def _build_static_chart(missing_info_static):
+    """
+    构建静态数据缺失值图表（条形图+数据表）。
+    
+    Args:
+        missing_info_static: 按缺失百分比降序排序的缺失值信息表
+    
+    Returns:
+        matplotlib Figure
+    """
+    fig = plt.figure(figsize=(20, 8))
     plt.subplot(1, 2, 1)
     sns.barplot(x=missing_info_static.index, y='Missing Percentage', data=missing_info_static, palette='viridis')
     plt.title('Static Data: Missing Value Percentage by Variable Category', fontsize=16)
@@ -93,24 +124,290 @@ def analyze_static_data(file_path, output_folder):
 
     plt.suptitle('Static Data Missing Value Analysis', fontsize=20, y=1.02)
     plt.tight_layout(rect=[0, 0, 1, 0.96])
-    
-    save_path = os.path.join(output_folder, 'static_data_missing_analysis.png')
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
-    print(f"静态数据分析图表已保存至: {save_path}")
-    logger.info(f"Static data analysis chart saved to: {save_path}")
-    plt.close()
-    print("\n")
+    return fig
 
 
 # --- 2. 动态数据分析 (修改后的部分) ---
 
-def analyze_dynamic_data_by_category_dual_pane(folder_path, output_folder):
+DYNAMIC_VARIABLE_GROUPS = {
+    "CBC": [f"CBC{i:03d}" for i in range(1, 25)],
+    "Inflammatory Biomarker": [f"Inflammatory Biomarker{i:03d}" for i in range(1, 10)],
+    "VCN": ["VCN001"],
+    "Lymphocyte Subsets": [f"Lymphocyte Subsets{i:03d}" for i in range(1, 12)],
+    "Coagulation": [f"Coagulation{i:03d}" for i in range(1, 9)],
+    "Electrolytes": [f"Electrolytes{i:03d}" for i in range(1, 7)],
+    "Biochemistry": [f"Biochemistry{i:03d}" for i in range(1, 29)],
+    "Vital Signs": [f"Vital Signs{i:03d}" for i in range(1, 7)],
+}
+
+
+class MissingnessAccumulator:
+    """
+    动态数据缺失值的流式累加器。
+    
+    逐个患者文件累加计数器，只保留每个变量 / 每天的非空与总数，
+    不再把所有患者的数据合并成一个大表，峰值内存与患者数量无关。
+    
+    计数口径与 pd.concat 合并后调用 isnull() 完全一致：某个患者文件缺少的列，
+    该文件的所有行都计为缺失。
+    
+    Attributes:
+        n_rows: 已累加的总行数
+        n_files: 已累加的患者文件数
+        variables: 出现过的变量（按首次出现的顺序）
+        days: 出现过的天（索引值，按首次出现的顺序）
+    """
+    
+    def __init__(self):
+        self.n_rows = 0
+        self.n_files = 0
+        self.variables = []
+        self.days = []
+        self._var_slot = {}
+        self._day_slot = {}
+        # 每个变量：在其出现的文件中的空值数 / 所在文件的行数之和
+        self._null_count = np.zeros(0, dtype=np.int64)
+        self._present_rows = np.zeros(0, dtype=np.int64)
+        # 每天的行数；天 × 变量 的非空值个数
+        self._day_rows = np.zeros(0, dtype=np.int64)
+        self._day_observed = np.zeros((0, 0), dtype=np.int64)
+    
+    @staticmethod
+    def _register(keys, slot, names):
+        """返回 keys 在登记表中的位置，新键追加到末尾"""
+        positions = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            if key not in slot:
+                slot[key] = len(names)
+                names.append(key)
+            positions[i] = slot[key]
+        return positions
+    
+    def _grow(self):
+        """按登记表长度扩展计数数组"""
+        n_vars, n_days = len(self.variables), len(self.days)
+        old_days, old_vars = self._day_observed.shape
+        if n_vars > len(self._null_count):
+            self._null_count = np.pad(self._null_count, (0, n_vars - len(self._null_count)))
+            self._present_rows = np.pad(self._present_rows, (0, n_vars - len(self._present_rows)))
+        if n_days > len(self._day_rows):
+            self._day_rows = np.pad(self._day_rows, (0, n_days - len(self._day_rows)))
+        if n_days > old_days or n_vars > old_vars:
+            self._day_observed = np.pad(self._day_observed, ((0, n_days - old_days), (0, n_vars - old_vars)))
+    
+    def update(self, df):
+        """
+        累加一个患者的动态数据。
+        
+        Args:
+            df: 单个患者的动态数据（索引为天）
+        """
+        var_pos = self._register(list(df.columns), self._var_slot, self.variables)
+        day_pos = self._register(df.index.tolist(), self._day_slot, self.days)
+        self._grow()
+        
+        observed = df.notna().to_numpy()
+        n_rows = len(df)
+        self.n_rows += n_rows
+        self.n_files += 1
+        self._null_count[var_pos] += n_rows - observed.sum(axis=0)
+        self._present_rows[var_pos] += n_rows
+        np.add.at(self._day_rows, day_pos, 1)
+        np.add.at(self._day_observed, (day_pos[:, None], var_pos[None, :]), observed)
+        return self
+    
+    def merge(self, other):
+        """
+        合并另一个累加器（用于并行分块的结果汇总）。
+        
+        Args:
+            other: 另一个 MissingnessAccumulator
+        """
+        var_pos = self._register(other.variables, self._var_slot, self.variables)
+        day_pos = self._register(other.days, self._day_slot, self.days)
+        self._grow()
+        
+        self.n_rows += other.n_rows
+        self.n_files += other.n_files
+        self._null_count[var_pos] += other._null_count
+        self._present_rows[var_pos] += other._present_rows
+        self._day_rows[day_pos] += other._day_rows
+        self._day_observed[np.ix_(day_pos, var_pos)] += other._day_observed
+        return self
+    
+    def __contains__(self, variable):
+        return variable in self._var_slot
+    
+    def missing_count(self, variables=None):
+        """
+        每个变量的缺失值个数（总数均为 n_rows）。
+        
+        Args:
+            variables: 变量列表，默认为所有出现过的变量
+        
+        Returns:
+            pd.Series: 变量 → 缺失值个数
+        """
+        if variables is None:
+            variables = self.variables
+        positions = [self._var_slot[var] for var in variables]
+        absent_rows = self.n_rows - self._present_rows[positions]
+        return pd.Series(self._null_count[positions] + absent_rows, index=list(variables), dtype='int64')
+    
+    def variable_table(self, variables=None):
+        """
+        每个变量的缺失统计。
+        
+        Returns:
+            pd.DataFrame: 索引为变量，列为 [Missing, Total, Missing Percentage]
+        """
+        missing_count = self.missing_count(variables)
+        return pd.DataFrame({
+            'Missing': missing_count,
+            'Total': self.n_rows,
+            'Missing Percentage': (missing_count / self.n_rows) * 100,
+        })
+    
+    def day_table(self, variables=None):
+        """
+        每天每个变量的缺失百分比。
+        
+        Returns:
+            pd.DataFrame: 索引为天（升序），列为变量
+        """
+        if variables is None:
+            variables = self.variables
+        order = np.argsort(np.asarray(self.days), kind='stable')
+        positions = [self._var_slot[var] for var in variables]
+        day_rows = self._day_rows[order]
+        observed = self._day_observed[np.ix_(order, positions)]
+        return pd.DataFrame((day_rows[:, None] - observed) / day_rows[:, None] * 100,
+                            index=[self.days[i] for i in order], columns=list(variables))
+    
+    def category_table(self, variable_groups=None):
+        """
+        每个变量类别的缺失统计（只计数据中存在的变量）。
+        
+        Args:
+            variable_groups: 类别 → 变量列表，默认为 DYNAMIC_VARIABLE_GROUPS
+        
+        Returns:
+            pd.DataFrame: 索引为类别，列为 [Variables, Missing, Total, Missing Percentage]
+        """
+        if variable_groups is None:
+            variable_groups = DYNAMIC_VARIABLE_GROUPS
+        rows = {}
+        for category_name, var_list in variable_groups.items():
+            existing_vars = [var for var in var_list if var in self]
+            missing = int(self.missing_count(existing_vars).sum())
+            total = self.n_rows * len(existing_vars)
+            rows[category_name] = {
+                'Variables': len(existing_vars),
+                'Missing': missing,
+                'Total': total,
+                'Missing Percentage': (missing / total) * 100 if total else np.nan,
+            }
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def _accumulate_files(folder_path, csv_files):
+    """逐个读取患者文件并累加（进程池 worker 的任务单元）"""
+    accumulator = MissingnessAccumulator()
+    for f in csv_files:
+        accumulator.update(pd.read_csv(os.path.join(folder_path, f), index_col=0))
+    return accumulator
+
+
+def accumulate_dynamic_missingness(folder_path, csv_files=None, n_jobs=None):
+    """
+    流式统计动态数据的缺失值。
+    
+    Args:
+        folder_path: 动态数据文件夹路径
+        csv_files: 要统计的文件名列表，默认为文件夹中所有 .csv
+        n_jobs: 进程数（None 表示全部 CPU 核心）；大于 1 时文件被分为 n_jobs 块并行累加，再合并
+    
+    Returns:
+        MissingnessAccumulator
+    """
+    if csv_files is None:
+        csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(csv_files)))
+    if n_jobs == 1:
+        return _accumulate_files(folder_path, csv_files)
+    
+    chunks = [csv_files[i::n_jobs] for i in range(n_jobs)]
+    accumulator = MissingnessAccumulator()
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for partial in executor.map(_accumulate_files, [folder_path] * n_jobs, chunks):
+            accumulator.merge(partial)
+    return accumulator
+
+
+def _build_category_chart(category_name, chart_data, table_info, n_vars):
+    """
+    构建单个变量类别的双面板缺失值图表（条形图+数据表）。
+    
+    Args:
+        category_name: 变量类别名
+        chart_data: 条形图数据（按变量名排序的缺失百分比）
+        table_info: 数据表（按缺失百分比降序排序）
+        n_vars: 该类别中存在的变量个数
+    
+    Returns:
+        matplotlib Figure
+    """
+    # --- 创建双面板可视化 ---
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(22, 8))
+    fig.suptitle(f'Dynamic Data Missing Value Analysis: {category_name}', fontsize=20)
+
+    # --- 左图：条形图 ---
+    sns.barplot(x=chart_data.index, y=chart_data.values, ax=ax1, palette='plasma')
+    ax1.set_title(f'Missing Value Percentage by Variable', fontsize=16)
+    ax1.set_xlabel("Variable Name", fontsize=12)
+    ax1.set_ylabel("Missing Percentage (%)", fontsize=12)
+    ax1.grid(axis='y', linestyle='--', alpha=0.7)
+
+    # 调整X轴标签以提高可读性
+    tick_spacing = 4 if n_vars > 10 else 1 # 如果变量少，则显示所有标签
+    ax1.xaxis.set_major_locator(mticker.MultipleLocator(tick_spacing))
+    ax1.tick_params(axis='x', rotation=45, labelsize=10)
+
+    # --- 右图：数据表 ---
+    # 格式化百分比列用于显示
+    table_info = table_info.copy()
+    table_info['Missing Percentage'] = table_info['Missing Percentage'].apply(lambda x: f"{x:.2f}%")
+    
+    ax2.axis('off')
+    ax2.set_title('Missing Value Details (Sorted by %)', fontsize=16, pad=20)
+    table = ax2.table(cellText=table_info.values,
+                      colLabels=table_info.columns,
+                      loc='center',
+                      cellLoc='center',
+                      bbox=[0, 0, 1, 1])
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.scale(1.2, 1.2)
+    
+    fig.tight_layout(rect=[0, 0, 1, 0.95]) # 调整布局以适应总标题
+    return fig
+
+
+def analyze_dynamic_data_by_category_dual_pane(folder_path, output_folder, n_jobs=None, use_cache=True):
     """
     为每个动态变量类别创建独立的双面板缺失值分析图表（条形图+数据表）。
     
+    先统计缺失值并为每个类别生成图表规格，再交给 render_figures 用进程池并行渲染；
+    缺失值统计未变化且图表已存在的类别会被跳过（见输出文件夹中的 render_manifest.json）。
+    
     Args:
         folder_path: 动态数据文件夹路径
         output_folder: 输出文件夹路径
+        n_jobs: 统计缺失值和渲染图表时使用的进程数（None 表示全部 CPU 核心）
+        use_cache: 是否启用渲染缓存
+    
+    Returns:
+        MissingnessAccumulator，未找到数据文件时为 None
     """
     print("--- 正在分析动态数据 ---")
     logger.info(f"Analyzing dynamic data from: {folder_path}")
@@ -120,44 +417,31 @@ def analyze_dynamic_data_by_category_dual_pane(folder_path, output_folder):
         error_msg = "错误：在指定文件夹中未找到动态数据CSV文件。"
         print(error_msg)
         logger.error(error_msg)
-        return
+        return None
 
-    print(f"正在从 {len(csv_files)} 位患者的数据中加载动态数据...")
-    logger.info(f"Loading dynamic data from {len(csv_files)} patient files...")
-    
-    all_patient_dfs = [pd.read_csv(os.path.join(folder_path, f), index_col=0) for f in csv_files]
-    df_aggregated = pd.concat(all_patient_dfs, ignore_index=True)
-    print("所有患者的动态数据已成功合并。")
-    logger.info("All patient dynamic data successfully merged.")
-
-    variable_groups = {
-        "CBC": [f"CBC{i:03d}" for i in range(1, 25)],
-        "Inflammatory Biomarker": [f"Inflammatory Biomarker{i:03d}" for i in range(1, 10)],
-        "VCN": ["VCN001"],
-        "Lymphocyte Subsets": [f"Lymphocyte Subsets{i:03d}" for i in range(1, 12)],
-        "Coagulation": [f"Coagulation{i:03d}" for i in range(1, 9)],
-        "Electrolytes": [f"Electrolytes{i:03d}" for i in range(1, 7)],
-        "Biochemistry": [f"Biochemistry{i:03d}" for i in range(1, 29)],
-        "Vital Signs": [f"Vital Signs{i:03d}" for i in range(1, 7)],
-    }
-
-    for category_name, var_list in variable_groups.items():
+    print(f"正在从 {len(csv_files)} 位患者的数据中统计动态数据缺失值...")
+    logger.info(f"Streaming dynamic data from {len(csv_files)} patient files...")
+    
+    accumulator = accumulate_dynamic_missingness(folder_path, csv_files, n_jobs=n_jobs)
+    print("所有患者的动态数据缺失值已统计完成。")
+    logger.info("Missing value counters accumulated for all patient files.")
+
+    specs = []
+    for category_name, var_list in DYNAMIC_VARIABLE_GROUPS.items():
         print(f"\n--- 正在为类别 '{category_name}' 生成图表 ---")
         logger.info(f"Generating chart for category: {category_name}")
         
-        existing_vars = [var for var in var_list if var in df_aggregated.columns]
+        existing_vars = [var for var in var_list if var in accumulator]
         if not existing_vars:
             warning_msg = f"警告：在数据中未找到类别 '{category_name}' 的任何变量。跳过此类别。"
             print(warning_msg)
             logger.warning(warning_msg)
             continue
-        
-        df_category = df_aggregated[existing_vars]
 
         # --- 准备数据 ---
         # 计算缺失值统计数据
-        missing_count = df_category.isnull().sum()
-        total_count = len(df_category)
+        missing_count = accumulator.missing_count(existing_vars)
+        total_count = accumulator.n_rows
         missing_percentage = (missing_count / total_count) * 100
 
         # 1. 为条形图准备数据（按变量名排序）
@@ -169,47 +453,126 @@ def analyze_dynamic_data_by_category_dual_pane(folder_path, output_folder):
             'Missing Percentage': missing_percentage.values,
             'Missing Ratio': [f"{int(missing_count[var])}/{total_count}" for var in missing_percentage.index]
         }).sort_values(by='Missing Percentage', ascending=False)
-        
-        # --- 创建双面板可视化 ---
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(22, 8))
-        fig.suptitle(f'Dynamic Data Missing Value Analysis: {category_name}', fontsize=20)
-
-        # --- 左图：条形图 ---
-        sns.barplot(x=chart_data.index, y=chart_data.values, ax=ax1, palette='plasma')
-        ax1.set_title(f'Missing Value Percentage by Variable', fontsize=16)
-        ax1.set_xlabel("Variable Name", fontsize=12)
-        ax1.set_ylabel("Missing Percentage (%)", fontsize=12)
-        ax1.grid(axis='y', linestyle='--', alpha=0.7)
-
-        # 调整X轴标签以提高可读性
-        tick_spacing = 4 if len(existing_vars) > 10 else 1 # 如果变量少，则显示所有标签
-        ax1.xaxis.set_major_locator(mticker.MultipleLocator(tick_spacing))
-        ax1.tick_params(axis='x', rotation=45, labelsize=10)
-
-        # --- 右图：数据表 ---
-        # 格式化百分比列用于显示
-        table_info['Missing Percentage'] = table_info['Missing Percentage'].apply(lambda x: f"{x:.2f}%")
-        
-        ax2.axis('off')
-        ax2.set_title('Missing Value Details (Sorted by %)', fontsize=16, pad=20)
-        table = ax2.table(cellText=table_info.values,
-                          colLabels=table_info.columns,
-                          loc='center',
-                          cellLoc='center',
-                          bbox=[0, 0, 1, 1])
-        table.auto_set_font_size(False)
-        table.set_fontsize(10)
-        table.scale(1.2, 1.2)
-        
-        plt.tight_layout(rect=[0, 0, 1, 0.95]) # 调整布局以适应总标题
 
-        # --- 保存图表 ---
         safe_category_name = category_name.replace(" ", "_")
-        save_path = os.path.join(output_folder, f"dynamic_data_missing_{safe_category_name}.png")
-        plt.savefig(save_path, dpi=300)
-        print(f"图表已保存至: {save_path}")
-        logger.info(f"Chart saved to: {save_path}")
-        plt.close(fig)
+        specs.append(FigureSpec(
+            name=f"dynamic_data_missing_{safe_category_name}",
+            build=_build_category_chart,
+            args=(category_name, chart_data, table_info, len(existing_vars)),
+            formats=['png'],
+            save_kwargs={'dpi': 300}
+        ))
+
+    # --- 并行渲染并保存图表 ---
+    rendered = render_figures(specs, output_folder, n_jobs=n_jobs, verbose=False, use_cache=use_cache)
+    for paths in rendered.values():
+        for save_path in paths:
+            print(f"图表已保存至: {save_path}")
+            logger.info(f"Chart saved to: {save_path}")
+
+    return accumulator
+
+
+# --- 3. 近似模式（分层抽样快速预览） ---
+
+def _patient_missing_fractions(folder_path, csv_files, variables):
+    """每位患者每个变量的缺失比例（文件中缺少的列视为全部缺失，与 MissingnessAccumulator 口径一致）"""
+    rows = {}
+    for f in csv_files:
+        df = pd.read_csv(os.path.join(folder_path, f), index_col=0)
+        rows[os.path.splitext(f)[0]] = df.reindex(columns=variables).isna().mean()
+    return pd.DataFrame.from_dict(rows, orient='index', columns=variables)
+
+
+def analyze_approximate(static_input, dynamic_input, output_dir, settings=None):
+    """
+    基于分层抽样估计静态与动态数据的缺失率（含置信区间），用于新交付队列的快速预览。
+    
+    从静态数据中按 stratify_by（默认疾病类型）分层抽取可复现的患者样本，只读取样本患者的动态文件。
+    动态数据的缺失率按患者等权估计（每位患者的缺失比例的总体均值）。
+    结果保存为 approximate_*.csv 与 approximate_summary.txt，均带有 APPROXIMATE 标注，不生成图表。
+    
+    Args:
+        static_input: 静态数据文件路径（第一列为患者编号，与动态文件名 {编号}.csv 对应）
+        dynamic_input: 动态数据文件夹路径
+        output_dir: 输出文件夹路径
+        settings: 近似模式设置（见 approximate.sampling_settings）
+    
+    Returns:
+        (静态缺失率估计, 动态变量缺失率估计, 动态类别缺失率估计)，静态数据无法读取时为 None
+    """
+    settings = sampling_settings(settings)
+    confidence = settings['confidence']
+    print("--- 近似模式：分层抽样估计缺失率 ---")
+    
+    try:
+        df_static = pd.read_csv(static_input, index_col=0)
+    except Exception as e:
+        error_msg = f"读取静态数据时出错: {e}"
+        print(error_msg)
+        logger.error(error_msg)
+        return None
+    
+    stratify_by = settings['stratify_by'] if settings['stratify_by'] in df_static.columns else None
+    strata = df_static[stratify_by] if stratify_by else pd.Series('all', index=df_static.index)
+    sample_ids, population_sizes = draw_sample(strata, settings)
+    static_label = approximate_label(len(sample_ids), len(df_static), confidence, stratify_by)
+    
+    static_estimates = estimate_proportions(df_static.loc[sample_ids].isnull(), strata.loc[sample_ids],
+                                            population_sizes, confidence)
+    static_estimates['n_population'] = len(df_static)
+    
+    # 动态数据：总体为有动态文件的患者，样本为其中被抽中的患者
+    available = {os.path.splitext(f)[0] for f in os.listdir(dynamic_input) if f.endswith('.csv')}
+    has_file = pd.Index([str(i) in available for i in strata.index])
+    dynamic_strata = strata[has_file.to_numpy(dtype=bool)]
+    dynamic_ids = [i for i in sample_ids if str(i) in available]
+    variables = [var for var_list in DYNAMIC_VARIABLE_GROUPS.values() for var in var_list]
+    fractions = _patient_missing_fractions(dynamic_input, [f"{i}.csv" for i in dynamic_ids], variables)
+    fractions.index = dynamic_ids
+    sample_strata = dynamic_strata.loc[dynamic_ids]
+    dynamic_sizes = stratum_sizes(dynamic_strata)
+    dynamic_label = approximate_label(len(dynamic_ids), len(dynamic_strata), confidence, stratify_by)
+    
+    variable_estimates = estimate_proportions(fractions, sample_strata, dynamic_sizes, confidence)
+    variable_estimates.insert(0, 'category', [category for category, var_list in DYNAMIC_VARIABLE_GROUPS.items()
+                                              for _ in var_list])
+    variable_estimates['n_population'] = len(dynamic_strata)
+    category_fractions = pd.DataFrame({
+        category: fractions[var_list].mean(axis=1) for category, var_list in DYNAMIC_VARIABLE_GROUPS.items()
+    })
+    category_estimates = estimate_proportions(category_fractions, sample_strata, dynamic_sizes, confidence)
+    category_estimates['n_population'] = len(dynamic_strata)
+    
+    # --- 保存结果 ---
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    static_estimates.index.name = 'Variable'
+    variable_estimates.index.name = 'Variable'
+    category_estimates.index.name = 'Category'
+    static_estimates.to_csv(os.path.join(output_dir, 'approximate_static_missingness.csv'))
+    variable_estimates.to_csv(os.path.join(output_dir, 'approximate_dynamic_missingness.csv'))
+    category_estimates.to_csv(os.path.join(output_dir, 'approximate_dynamic_category_missingness.csv'))
+    
+    summary = [
+        "=" * 80,
+        "Static data: " + static_label,
+        "Dynamic data: " + dynamic_label,
+        "=" * 80,
+        "\n静态数据缺失率估计 Static Missingness (estimate, CI):",
+    ]
+    summary += [f"  {var}: {format_estimate(row)}" for var, row in static_estimates.iterrows()]
+    summary.append("\n动态数据各类别缺失率估计 Dynamic Missingness by Category (patient-weighted):")
+    summary += [f"  {category}: {format_estimate(row)}" for category, row in category_estimates.iterrows()]
+    summary.append("\n" + dynamic_label)
+    summary_path = os.path.join(output_dir, 'approximate_summary.txt')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(summary))
+    print('\n'.join(summary))
+    print(f"\n近似估计结果已保存至: {output_dir} (approximate_*.csv, approximate_summary.txt)")
+    logger.info(f"Approximate missingness estimates saved to: {output_dir}")
+    
+    return static_estimates, variable_estimates, category_estimates
 
 
 # --- 核心函数：封装完整的缺失值计算逻辑 ---
@@ -222,7 +585,11 @@ def compute_missing(static_input, dynamic_input, output_dir, **kwargs):
         static_input: 静态数据文件路径
         dynamic_input: 动态数据文件夹路径
         output_dir: 输出文件夹路径
-        **kwargs: 其他可选参数（用于未来扩展）
+        **kwargs: 其他可选参数
+            n_jobs: 统计动态数据缺失值和渲染图表时使用的进程数（默认全部 CPU 核心）
+            use_cache: 是否跳过未变化的图表（默认 True）
+            approximate: 近似模式设置字典（见 approximate.sampling_settings），
+                         enabled 为 True 时只做分层抽样估计，不做完整统计和绘图
     
     Returns:
         True if successful, False otherwise
@@ -236,11 +603,17 @@ def compute_missing(static_input, dynamic_input, output_dir, **kwargs):
         os.makedirs(output_dir)
         logger.info(f"Created output directory: {output_dir}")
     
+    # 近似模式：只处理抽样患者
+    approximate = sampling_settings(kwargs.get('approximate'))
+    if approximate['enabled']:
+        return analyze_approximate(static_input, dynamic_input, output_dir, approximate) is not None
+    
     # 执行静态数据分析
-    analyze_static_data(static_input, output_dir)
+    analyze_static_data(static_input, output_dir, use_cache=kwargs.get('use_cache', True))
     
     # 执行动态数据分析
-    analyze_dynamic_data_by_category_dual_pane(dynamic_input, output_dir)
+    analyze_dynamic_data_by_category_dual_pane(dynamic_input, output_dir, n_jobs=kwargs.get('n_jobs'),
+                                               use_cache=kwargs.get('use_cache', True))
     
     logger.info("=" * 80)
     logger.info("EDA Missing Value Analysis Completed Successfully")
@@ -1,9 +1,15 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# 使用上级目录中的图表渲染调度器（含渲染缓存）与近似分析工具
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render_scheduler import FigureSpec, render_figures
+from approximate import estimate_array, sample_patients
+
 def process_patient_data(file_path):
     """
     读取单个患者的CSV文件并返回一个DataFrame，其中包含处理后的数据。
@@ -13,55 +19,42 @@ def process_patient_data(file_path):
     df.index.name = 'day'
     return df
 
-def analyze_and_visualize_availability(data_frames, num_patients, output_csv_path, output_heatmap_path):
+def compute_availability_bitmap(data_frames, variable_groups, time_points):
     """
-    分析数据可用性，导出CSV文件，并创建连续百分比热图。
+    计算每位患者、每个时间点、每个变量组是否至少有一个变量有数据。
+
+    所有患者按 (时间点 × 变量) 对齐后堆叠为 (患者 × 时间点 × 变量) 数组，只调用一次 notna；
+    每个变量组内用 any 归约。缺少的时间点或变量视为无数据。
+
+    Returns:
+        bool 数组 (患者, 时间点, 变量组)
     """
-    # 定义变量分组
-    variable_groups = {
-        'CBC': [f'CBC{i:03d}' for i in range(1, 25)],
-        'Inflammatory Biomarker': [f'Inflammatory Biomarker{i:03d}' for i in range(1, 10)],
-        'VCN': ['VCN001'],
-        'Lymphocyte Subsets': [f'Lymphocyte Subsets{i:03d}' for i in range(1, 12)],
-        'Coagulation': [f'Coagulation{i:03d}' for i in range(1, 9)],
-        'Electrolytes': [f'Electrolytes{i:03d}' for i in range(1, 7)],
-        'Biochemistry': [f'Biochemistry{i:03d}' for i in range(1, 29)],
-        'Vital Signs': [f'Vital Signs{i:03d}' for i in range(1, 7)]
-    }
+    all_vars = [var for variables in variable_groups.values() for var in variables]
+    stacked = np.stack([
+        df.reindex(index=time_points, columns=all_vars).to_numpy() for df in data_frames
+    ])
+    observed = pd.notna(stacked)
 
-    # 初始化一个DataFrame来存储每个变量组和每个时间点的数据可用性计数
-    # 行是时间点，列是变量组
-    time_points = range(-15, 31)
-    availability_counts_matrix = pd.DataFrame(0, index=time_points, columns=variable_groups.keys())
-
-    # 遍历每个患者的数据
-    for df in data_frames:
-        # 遍历每个时间点
-        for day in time_points:
-            if day in df.index:
-                # 遍历每个变量组
-                for group_name, variables in variable_groups.items():
-                    # 检查该时间点和该组中是否有任何可用数据
-                    # 如果该组中的任何变量在指定日期有数据，则认为该组在该日期有数据
-                    available_in_group = False
-                    for var in variables:
-                        if var in df.columns and pd.notna(df.loc[day, var]):
-                            available_in_group = True
-                            break
-                    if available_in_group:
-                        availability_counts_matrix.loc[day, group_name] += 1
-
-    # 计算可用性覆盖率（分数从 0 到 1）
-    # availability_counts_matrix 记录了在该时间点和变量组拥有数据的患者数量
-    # num_patients 是总患者数
-    data_availability_fraction = (availability_counts_matrix / num_patients).T # 转置以便行是类别，列是日期
+    bitmap = np.zeros((len(data_frames), len(time_points), len(variable_groups)), dtype=bool)
+    start = 0
+    for g, variables in enumerate(variable_groups.values()):
+        stop = start + len(variables)
+        bitmap[:, :, g] = observed[:, :, start:stop].any(axis=2)
+        start = stop
+    return bitmap
 
-    # 1. 导出 CSV 文件
-    data_availability_fraction.to_csv(output_csv_path)
-    print(f"Data availability fraction exported to '{output_csv_path}'")
+def compute_availability_counts(data_frames, variable_groups, time_points):
+    """
+    统计每个时间点、每个变量组中至少有一个变量有数据的患者数。
+    """
+    counts = compute_availability_bitmap(data_frames, variable_groups, time_points).sum(axis=0)
+    return pd.DataFrame(counts, index=time_points, columns=variable_groups.keys())
 
-    # 2. 更新热图可视化为连续百分比色标
-    plt.figure(figsize=(9, 10))
+def build_availability_heatmap(data_availability_fraction, time_points, approximate_label=None):
+    """
+    构建连续百分比的数据可用性热图。近似运行时在标题下方标注 approximate_label。
+    """
+    fig = plt.figure(figsize=(9, 10))
     sns.heatmap(
         data_availability_fraction * 100, # 将分数转换为百分比
         cmap='viridis',                  # 使用连续色标，例如 'viridis', 'plasma', 'magma', 'cividis'
@@ -83,10 +76,72 @@ def analyze_and_visualize_availability(data_frames, num_patients, output_csv_pat
     plt.xlabel('Days (from -15 to 30)')
     plt.yticks(rotation=0)
     plt.ylabel('Variable Categories')
-    plt.title('Data Availability Heatmap Across Patients (Percentage)')
+    title = 'Data Availability Heatmap Across Patients (Percentage)'
+    if approximate_label:
+        title += f'\n{approximate_label}'
+    plt.title(title, color='darkred' if approximate_label else 'black')
     plt.tight_layout()
-    plt.savefig(output_heatmap_path, dpi=300)
-    plt.show()
+    return fig
+
+def analyze_and_visualize_availability(data_frames, num_patients, output_csv_path, output_heatmap_path,
+                                       use_cache=True, approximate=None):
+    """
+    分析数据可用性，导出CSV文件，并创建连续百分比热图。
+    可用性矩阵与上次相同且热图已存在时跳过渲染（use_cache）。
+
+    approximate 为 approximate.sample_patients 返回的估计上下文时，data_frames 为抽样患者的数据：
+    覆盖率为分层估计值，另导出置信区间上下限（*_ci_low.csv / *_ci_high.csv），热图标题带近似标注。
+    """
+    # 定义变量分组
+    variable_groups = {
+        'CBC': [f'CBC{i:03d}' for i in range(1, 25)],
+        'Inflammatory Biomarker': [f'Inflammatory Biomarker{i:03d}' for i in range(1, 10)],
+        'VCN': ['VCN001'],
+        'Lymphocyte Subsets': [f'Lymphocyte Subsets{i:03d}' for i in range(1, 12)],
+        'Coagulation': [f'Coagulation{i:03d}' for i in range(1, 9)],
+        'Electrolytes': [f'Electrolytes{i:03d}' for i in range(1, 7)],
+        'Biochemistry': [f'Biochemistry{i:03d}' for i in range(1, 29)],
+        'Vital Signs': [f'Vital Signs{i:03d}' for i in range(1, 7)]
+    }
+
+    # 初始化一个DataFrame来存储每个变量组和每个时间点的数据可用性计数
+    # 行是时间点，列是变量组
+    time_points = range(-15, 31)
+    # 如果该组中的任何变量在指定日期有数据，则认为该组在该日期有数据
+    if approximate is None:
+        availability_counts_matrix = compute_availability_counts(data_frames, variable_groups, time_points)
+
+        # 计算可用性覆盖率（分数从 0 到 1）
+        # availability_counts_matrix 记录了在该时间点和变量组拥有数据的患者数量
+        # num_patients 是总患者数
+        data_availability_fraction = (availability_counts_matrix / num_patients).T # 转置以便行是类别，列是日期
+    else:
+        # 由抽样患者估计覆盖率及置信区间
+        bitmap = compute_availability_bitmap(data_frames, variable_groups, time_points)
+        estimates = estimate_array(bitmap, approximate['strata'], approximate['population_sizes'],
+                                   approximate['confidence'])
+        frames = {key: pd.DataFrame(values, index=time_points, columns=variable_groups.keys()).T
+                  for key, values in estimates.items()}
+        data_availability_fraction = frames['estimate']
+        csv_root, csv_ext = os.path.splitext(output_csv_path)
+        for key in ('ci_low', 'ci_high'):
+            frames[key].to_csv(f"{csv_root}_{key}{csv_ext}")
+        print(approximate['label'])
+
+    # 1. 导出 CSV 文件
+    data_availability_fraction.to_csv(output_csv_path)
+    print(f"Data availability fraction exported to '{output_csv_path}'")
+
+    # 2. 更新热图可视化为连续百分比色标
+    heatmap_dir, heatmap_file = os.path.split(output_heatmap_path)
+    heatmap_name, heatmap_ext = os.path.splitext(heatmap_file)
+    render_figures(
+        [FigureSpec(name=heatmap_name, build=build_availability_heatmap,
+                    args=(data_availability_fraction, time_points,
+                          approximate['label'] if approximate else None),
+                    formats=[heatmap_ext.lstrip('.')], save_kwargs={'dpi': 300})],
+        heatmap_dir or '.', n_jobs=1, use_cache=use_cache
+    )
 
 if __name__ == "__main__":
     processed_folder = "/home/phl/PHL/pytorch-forecasting/datasetcart/processed"
@@ -94,22 +149,43 @@ if __name__ == "__main__":
     num_patients = 2
     all_patient_data = []
 
+    # 近似模式：只读取分层抽样的患者（static_file 提供分层变量，未提供时为简单随机抽样）
+    approximate_settings = {
+        'enabled': False,
+        'sample_fraction': 0.1,
+        'stratify_by': 'Disease',
+        'static_file': '/home/phl/PHL/Car-T/data_preprocessing/output/dataset/encoded_standardized.csv',
+        'random_state': 42,
+        'confidence': 0.95,
+    }
+
     # 确保'processed'文件夹存在
     if not os.path.exists(processed_folder):
         print(f"Error: The folder '{processed_folder}' does not exist.")
         print("Please create the folder and place the patient CSV files inside.")
         exit()
 
+    patient_numbers = list(range(1, num_patients + 1))
+    approximate = None
+    if approximate_settings['enabled']:
+        patient_numbers, approximate = sample_patients(patient_numbers, approximate_settings)
+        print(approximate['label'])
+
     # 读取所有患者的数据
-    print(f"Reading data for {num_patients} patients from '{processed_folder}'...")
-    for i in range(1, num_patients + 1):
+    print(f"Reading data for {len(patient_numbers)} patients from '{processed_folder}'...")
+    loaded_patients = []
+    for i in patient_numbers:
         file_name = f"{i}.csv"
         file_path = os.path.join(processed_folder, file_name)
         if os.path.exists(file_path):
             df = process_patient_data(file_path)
             all_patient_data.append(df)
+            loaded_patients.append(i)
         else:
             print(f"Warning: File '{file_path}' not found. Skipping patient {i}.")
+    if approximate is not None:
+        approximate['strata'] = approximate['strata'].loc[loaded_patients]
+    prefix = 'approximate_' if approximate is not None else ''
 
     if not all_patient_data:
         print("No patient data found. Exiting.")
@@ -119,7 +195,8 @@ if __name__ == "__main__":
         analyze_and_visualize_availability(
             all_patient_data, 
             num_patients,
-            output_csv_path=os.path.join(output_folder, "data_availability_fraction.csv"),
-            output_heatmap_path=os.path.join(output_folder, "data_availability_heatmap_percentage.png")
+            output_csv_path=os.path.join(output_folder, f"{prefix}data_availability_fraction.csv"),
+            output_heatmap_path=os.path.join(output_folder, f"{prefix}data_availability_heatmap_percentage.png"),
+            approximate=approximate
         )
         print("Analysis complete. Check 'data_availability_fraction.csv' and 'data_availability_heatmap_percentage.png'.")
\ No newline at end of file
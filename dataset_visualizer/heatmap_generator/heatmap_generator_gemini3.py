@@ -1,9 +1,15 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# 使用上级目录中的图表渲染调度器（含渲染缓存）与近似分析工具
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render_scheduler import FigureSpec, render_figures
+from approximate import estimate_array, sample_patients
+
 def process_patient_data(file_path):
     """
     读取单个患者的CSV文件并返回一个DataFrame，其中包含处理后的数据。
@@ -13,6 +19,42 @@ def process_patient_data(file_path):
     df.index.name = 'day'
     return df
 
+def compute_availability_bitmap(data_frames, variable_groups, time_points):
+    """
+    计算每位患者、每个时间点、每个变量组是否至少有一个变量有数据。
+
+    所有患者按 (时间点 × 变量) 对齐后堆叠为 (患者 × 时间点 × 变量) 数组，只调用一次 notna；
+    每个变量组内用 any 归约。缺少的时间点或变量视为无数据。
+
+    Returns:
+        bool 数组 (患者, 时间点, 变量组)
+    """
+    all_vars = [var for variables in variable_groups.values() for var in variables]
+    stacked = np.stack([
+        df.reindex(index=time_points, columns=all_vars).to_numpy() for df in data_frames
+    ])
+    observed = pd.notna(stacked)
+
+    bitmap = np.zeros((len(data_frames), len(time_points), len(variable_groups)), dtype=bool)
+    start = 0
+    for g, variables in enumerate(variable_groups.values()):
+        stop = start + len(variables)
+        bitmap[:, :, g] = observed[:, :, start:stop].any(axis=2)
+        start = stop
+    return bitmap
+
+def compute_availability_counts(data_frames, variable_groups, time_points):
+    """
+    统计每个时间点、每个变量组中至少有一个变量有数据的患者数。
+    """
+    counts = compute_availability_bitmap(data_frames, variable_groups, time_points).sum(axis=0)
+    return pd.DataFrame(counts, index=time_points, columns=variable_groups.keys())
+
+def _add_approximate_label(fig, approximate_label):
+    """在近似运行的图表底部标注抽样信息。"""
+    if approximate_label:
+        fig.text(0.5, 0.005, approximate_label, ha='center', va='bottom', fontsize=24, color='darkred')
+
 def generate_heatmap(data, title, cbar_label, cmap, vmin, vmax, ax, time_points=None):
     """
     生成单个热图的通用函数。
@@ -41,9 +83,56 @@ def generate_heatmap(data, title, cbar_label, cmap, vmin, vmax, ax, time_points=
         ax.set_xticklabels(x_tick_labels, rotation=45, ha='right', fontsize=25)
     ax.tick_params(axis='y', rotation=0, labelsize=25)
 
-def analyze_and_visualize_data(data_frames, num_patients, config):
+def build_side_by_side_heatmaps(data_availability_fraction, data_missing_percentage, time_points,
+                                cmap_availability, cmap_missing, figsize, dpi, approximate_label=None):
+    """
+    并排构建覆盖率热图与缺失热图。
+    """
+    plt.style.use('seaborn-v0_8-whitegrid') # 尝试使用更专业的matplotlib样式
+    fig, axes = plt.subplots(1, 2, figsize=figsize, dpi=dpi)
+
+    # 覆盖率热图
+    generate_heatmap(
+        data_availability_fraction * 100,
+        'Data Coverage (%)',
+        'Coverage (%)',
+        cmap_availability,
+        0, 100,
+        ax=axes[0],
+        time_points=time_points
+    )
+
+    # 缺失/缺口热图
+    generate_heatmap(
+        data_missing_percentage,
+        'Missing Data (%)',
+        'Missing (%)',
+        cmap_missing,
+        0, 100,
+        ax=axes[1],
+        time_points=time_points
+    )
+    plt.tight_layout(rect=[0, 0.04, 1, 1] if approximate_label else None)
+    _add_approximate_label(fig, approximate_label)
+    return fig
+
+def build_single_heatmap(data, title, cbar_label, cmap, time_points, figsize, dpi, approximate_label=None):
+    """
+    构建单个热图。
+    """
+    plt.style.use('seaborn-v0_8-whitegrid') # 尝试使用更专业的matplotlib样式
+    fig, ax = plt.subplots(1, 1, figsize=figsize, dpi=dpi)
+    generate_heatmap(data, title, cbar_label, cmap, 0, 100, ax=ax, time_points=time_points)
+    plt.tight_layout(rect=[0, 0.04, 1, 1] if approximate_label else None)
+    _add_approximate_label(fig, approximate_label)
+    return fig
+
+def analyze_and_visualize_data(data_frames, num_patients, config, approximate=None):
     """
     分析数据可用性，导出CSV文件，并根据配置生成热图。
+
+    approximate 为 approximate.sample_patients 返回的估计上下文时，data_frames 为抽样患者的数据：
+    覆盖率为分层估计值，另导出置信区间上下限，所有输出文件名带 approximate_ 前缀，热图底部带近似标注。
     """
     # 确保输出文件夹存在
     if not os.path.exists(config['output_folder']):
@@ -63,108 +152,87 @@ def analyze_and_visualize_data(data_frames, num_patients, config):
     }
 
     time_points = range(-15, 31)
-    availability_counts_matrix = pd.DataFrame(0, index=time_points, columns=variable_groups.keys())
-
-    for df in data_frames:
-        for day in time_points:
-            if day in df.index:
-                for group_name, variables in variable_groups.items():
-                    available_in_group = False
-                    for var in variables:
-                        if var in df.columns and pd.notna(df.loc[day, var]):
-                            available_in_group = True
-                            break
-                    if available_in_group:
-                        availability_counts_matrix.loc[day, group_name] += 1
-
-    # 计算可用性覆盖率（分数从 0 到 1）
-    data_availability_fraction = (availability_counts_matrix / num_patients).T 
+    prefix = 'approximate_' if approximate is not None else ''
+    label = approximate['label'] if approximate is not None else None
+    if approximate is None:
+        availability_counts_matrix = compute_availability_counts(data_frames, variable_groups, time_points)
+
+        # 计算可用性覆盖率（分数从 0 到 1）
+        data_availability_fraction = (availability_counts_matrix / num_patients).T 
+    else:
+        # 由抽样患者估计覆盖率（分数从 0 到 1）及置信区间
+        bitmap = compute_availability_bitmap(data_frames, variable_groups, time_points)
+        estimates = estimate_array(bitmap, approximate['strata'], approximate['population_sizes'],
+                                   approximate['confidence'])
+        frames = {key: pd.DataFrame(values, index=time_points, columns=variable_groups.keys()).T
+                  for key, values in estimates.items()}
+        data_availability_fraction = frames['estimate']
+        print(label)
+        for key in ('ci_low', 'ci_high'):
+            ci_path = os.path.join(config['output_folder'], f"{prefix}data_availability_fraction_{key}.{config['csv_export_format']}")
+            frames[key].to_csv(ci_path)
+            print(f"Data availability {key} exported to '{ci_path}'")
 
     # 计算缺失值百分比（0-100 整数）
     data_missing_percentage = ((1 - data_availability_fraction) * 100).astype(int)
 
     # 导出 CSV 文件
     if config['export_csv_availability']:
-        output_availability_fraction_csv_path = os.path.join(config['output_folder'], f"data_availability_fraction.{config['csv_export_format']}")
+        output_availability_fraction_csv_path = os.path.join(config['output_folder'], f"{prefix}data_availability_fraction.{config['csv_export_format']}")
         data_availability_fraction.to_csv(output_availability_fraction_csv_path)
         print(f"Data availability fraction exported to '{output_availability_fraction_csv_path}'")
 
     if config['export_csv_missing']:
-        output_missing_percentage_csv_path = os.path.join(config['output_folder'], f"data_missing_percentage.{config['csv_export_format']}")
+        output_missing_percentage_csv_path = os.path.join(config['output_folder'], f"{prefix}data_missing_percentage.{config['csv_export_format']}")
         data_missing_percentage.to_csv(output_missing_percentage_csv_path)
         print(f"Data missing percentage (0-100) exported to '{output_missing_percentage_csv_path}'")
 
 
-    # 热图生成
+    # 热图生成：先生成图表规格，再交给 render_figures（输入未变化且图片已存在时跳过）
+    heatmap_specs, messages = [], {}
+    output_format = config['output_format']
+
     if config['generate_heatmap_availability'] or config['generate_heatmap_missing']:
-        
-        plt.style.use('seaborn-v0_8-whitegrid') # 尝试使用更专业的matplotlib样式
-        
         if config['heatmap_layout'] == 'side_by_side' and config['generate_heatmap_availability'] and config['generate_heatmap_missing']:
             # 并排显示双热图
-            fig, axes = plt.subplots(1, 2, figsize=config['figsize_double'], dpi=config['dpi'])
-            
-            # 覆盖率热图
-            generate_heatmap(
-                data_availability_fraction * 100,
-                'Data Coverage (%)',
-                'Coverage (%)',
-                config['cmap_availability'],
-                0, 100,
-                ax=axes[0],
-                time_points=time_points
-            )
-            
-            # 缺失/缺口热图
-            generate_heatmap(
-                data_missing_percentage,
-                'Missing Data (%)',
-                'Missing (%)',
-                config['cmap_missing'],
-                0, 100,
-                ax=axes[1],
-                time_points=time_points
-            )
-            plt.tight_layout()
-            output_file_path = os.path.join(config['output_folder'], f"heatmap_coverage_and_missing_side_by_side.{config['output_format']}")
-            plt.savefig(output_file_path, format=config['output_format'])
-            print(f"Side-by-side heatmaps saved to '{output_file_path}'")
-            plt.show()
+            heatmap_specs.append(FigureSpec(
+                name=f'{prefix}heatmap_coverage_and_missing_side_by_side',
+                build=build_side_by_side_heatmaps,
+                args=(data_availability_fraction, data_missing_percentage, time_points,
+                      config['cmap_availability'], config['cmap_missing'],
+                      config['figsize_double'], config['dpi'], label),
+                formats=[output_format], save_kwargs={'format': output_format}
+            ))
+            messages[f'{prefix}heatmap_coverage_and_missing_side_by_side'] = "Side-by-side heatmaps saved to"
 
         else: # 单独显示或仅生成一个
             if config['generate_heatmap_availability']:
-                fig, ax = plt.subplots(1, 1, figsize=config['figsize_single'], dpi=config['dpi'])
-                generate_heatmap(
-                    data_availability_fraction * 100,
-                    'Data Coverage (%)',
-                    'Coverage (%)',
-                    config['cmap_availability'],
-                    0, 100,
-                    ax=ax,
-                    time_points=time_points
-                )
-                plt.tight_layout()
-                output_file_path = os.path.join(config['output_folder'], f"heatmap_coverage.{config['output_format']}")
-                plt.savefig(output_file_path, format=config['output_format'])
-                print(f"Coverage heatmap saved to '{output_file_path}'")
-                plt.show()
+                heatmap_specs.append(FigureSpec(
+                    name=f'{prefix}heatmap_coverage',
+                    build=build_single_heatmap,
+                    args=(data_availability_fraction * 100, 'Data Coverage (%)', 'Coverage (%)',
+                          config['cmap_availability'], time_points, config['figsize_single'], config['dpi'],
+                          label),
+                    formats=[output_format], save_kwargs={'format': output_format}
+                ))
+                messages[f'{prefix}heatmap_coverage'] = "Coverage heatmap saved to"
 
             if config['generate_heatmap_missing']:
-                fig, ax = plt.subplots(1, 1, figsize=config['figsize_single'], dpi=config['dpi'])
-                generate_heatmap(
-                    data_missing_percentage,
-                    'Missing Data (%)',
-                    'Missing (%)',
-                    config['cmap_missing'],
-                    0, 100,
-                    ax=ax,
-                    time_points=time_points
-                )
-                plt.tight_layout()
-                output_file_path = os.path.join(config['output_folder'], f"heatmap_missing.{config['output_format']}")
-                plt.savefig(output_file_path, format=config['output_format'])
-                print(f"Missing data heatmap saved to '{output_file_path}'")
-                plt.show()
+                heatmap_specs.append(FigureSpec(
+                    name=f'{prefix}heatmap_missing',
+                    build=build_single_heatmap,
+                    args=(data_missing_percentage, 'Missing Data (%)', 'Missing (%)',
+                          config['cmap_missing'], time_points, config['figsize_single'], config['dpi'],
+                          label),
+                    formats=[output_format], save_kwargs={'format': output_format}
+                ))
+                messages[f'{prefix}heatmap_missing'] = "Missing data heatmap saved to"
+
+    rendered = render_figures(heatmap_specs, config['output_folder'], n_jobs=config.get('n_jobs', 1),
+                              verbose=False, use_cache=config.get('use_render_cache', True))
+    for name, paths in rendered.items():
+        for output_file_path in paths:
+            print(f"{messages[name]} '{output_file_path}'")
 
 if __name__ == "__main__":
     processed_folder = "/home/phl/PHL/pytorch-forecasting/datasetcart/processed"
@@ -200,6 +268,20 @@ if __name__ == "__main__":
         'figsize_single': (42, 24),         # 单个热图的图形大小 (宽, 高 英寸)
         'figsize_double': (24, 8),         # 并排热图的图形大小 (宽, 高 英寸)
         'dpi': 300,                        # 图像分辨率 (每英寸点数)
+
+        # 渲染选项
+        'n_jobs': 1,                       # 并行渲染的进程数 (None 表示使用全部 CPU 核心)
+        'use_render_cache': True,          # 可用性矩阵与绘图参数未变化且图片已存在时跳过渲染 (记录于 render_manifest.json)
+
+        # 近似模式：只读取分层抽样的患者，输出估计值与置信区间 (文件名带 approximate_ 前缀，图表带标注)
+        'approximate': {
+            'enabled': False,
+            'sample_fraction': 0.1,        # 每层的抽样比例
+            'stratify_by': 'Disease',      # 分层变量 (取自 static_file，未提供时为简单随机抽样)
+            'static_file': '/home/phl/PHL/Car-T/data_preprocessing/output/dataset/encoded_standardized.csv',
+            'random_state': 42,            # 随机种子，保证抽样可复现
+            'confidence': 0.95,            # 置信水平
+        },
     }
     # ------------------
 
@@ -209,20 +291,30 @@ if __name__ == "__main__":
         print("Please create the folder and place the patient CSV files inside.")
         exit()
 
+    patient_numbers = list(range(1, num_patients + 1))
+    approximate = None
+    if config['approximate']['enabled']:
+        patient_numbers, approximate = sample_patients(patient_numbers, config['approximate'])
+        print(approximate['label'])
+
     # 读取所有患者的数据
-    print(f"Reading data for {num_patients} patients from '{processed_folder}'...")
-    for i in range(1, num_patients + 1):
+    print(f"Reading data for {len(patient_numbers)} patients from '{processed_folder}'...")
+    loaded_patients = []
+    for i in patient_numbers:
         file_name = f"{i}.csv"
         file_path = os.path.join(processed_folder, file_name)
         if os.path.exists(file_path):
             df = process_patient_data(file_path)
             all_patient_data.append(df)
+            loaded_patients.append(i)
         else:
             print(f"Warning: File '{file_path}' not found. Skipping patient {i}.")
+    if approximate is not None:
+        approximate['strata'] = approximate['strata'].loc[loaded_patients]
 
     if not all_patient_data:
         print("No patient data found. Exiting.")
     else:
         print("All patient data loaded. Analyzing availability and generating output...")
-        analyze_and_visualize_data(all_patient_data, num_patients, config)
+        analyze_and_visualize_data(all_patient_data, num_patients, config, approximate)
         print("Analysis complete based on configuration.")
\ No newline at end of file
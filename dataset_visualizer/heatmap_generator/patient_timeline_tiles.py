@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.image as mpimg
+
+# 使用上级目录中的图表渲染调度器（含渲染缓存）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render_scheduler import FigureSpec, render_figures
+
+# 变量分组（与 heatmap_generator_gemini3 一致）
+VARIABLE_GROUPS = {
+    'CBC': [f'CBC{i:03d}' for i in range(1, 25)],
+    'Inflammatory Biomarker': [f'Inflammatory Biomarker{i:03d}' for i in range(1, 10)],
+    'VCN': ['VCN001'],
+    'Lymphocyte Subsets': [f'Lymphocyte Subsets{i:03d}' for i in range(1, 12)],
+    'Coagulation': [f'Coagulation{i:03d}' for i in range(1, 9)],
+    'Electrolytes': [f'Electrolytes{i:03d}' for i in range(1, 7)],
+    'Biochemistry': [f'Biochemistry{i:03d}' for i in range(1, 29)],
+    'Vital Signs': [f'Vital Signs{i:03d}' for i in range(1, 7)]
+}
+
+TIME_POINTS = range(-15, 31)
+
+ROW_METHODS = ('mean', 'max', 'stride')
+
+
+def patient_availability(df, variable_groups, time_points):
+    """
+    计算单个患者 (时间点 × 变量组) 的可用性位图：该组至少有一个变量有数据即为 True。
+    缺少的时间点或变量视为无数据。
+    """
+    all_vars = [var for variables in variable_groups.values() for var in variables]
+    observed = pd.notna(df.reindex(index=time_points, columns=all_vars).to_numpy())
+
+    bitmap = np.zeros((len(time_points), len(variable_groups)), dtype=bool)
+    start = 0
+    for g, variables in enumerate(variable_groups.values()):
+        stop = start + len(variables)
+        bitmap[:, g] = observed[:, start:stop].any(axis=1)
+        start = stop
+    return bitmap
+
+
+def _bitmap_for_files(folder_path, csv_files, variable_groups, time_points):
+    """逐个读取患者文件并计算可用性位图（进程池 worker 的任务单元）"""
+    bitmap = np.zeros((len(csv_files), len(time_points), len(variable_groups)), dtype=bool)
+    for i, f in enumerate(csv_files):
+        df = pd.read_csv(os.path.join(folder_path, f), index_col=0)
+        bitmap[i] = patient_availability(df, variable_groups, time_points)
+    return bitmap
+
+
+def _patient_sort_key(file_name):
+    """按患者编号排序（数字文件名按数值，其余按字符串）"""
+    stem = os.path.splitext(file_name)[0]
+    return (0, int(stem), '') if stem.isdigit() else (1, 0, stem)
+
+
+def build_availability_bitmap(folder_path, csv_files=None, variable_groups=None, time_points=None, n_jobs=None):
+    """
+    构建整个队列的 (患者 × 时间点 × 变量组) 可用性位图。
+
+    Args:
+        folder_path: 动态数据文件夹路径（每个患者一个 CSV，第一列为天）
+        csv_files: 要读取的文件名列表，默认为文件夹中所有 .csv（按患者编号排序）
+        variable_groups: 变量分组，默认为 VARIABLE_GROUPS
+        time_points: 时间点，默认为 TIME_POINTS
+        n_jobs: 进程数（None 表示全部 CPU 核心）；文件按顺序分块并行读取
+
+    Returns:
+        (bitmap, patient_ids)：bool 数组 (患者, 时间点, 变量组) 与对应的患者编号列表
+    """
+    variable_groups = variable_groups or VARIABLE_GROUPS
+    time_points = list(time_points if time_points is not None else TIME_POINTS)
+    if csv_files is None:
+        csv_files = sorted((f for f in os.listdir(folder_path) if f.endswith('.csv')), key=_patient_sort_key)
+    patient_ids = [os.path.splitext(f)[0] for f in csv_files]
+    if not csv_files:
+        return np.zeros((0, len(time_points), len(variable_groups)), dtype=bool), patient_ids
+
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(csv_files)))
+    if n_jobs == 1:
+        return _bitmap_for_files(folder_path, csv_files, variable_groups, time_points), patient_ids
+
+    # 连续分块，保证拼接后的行顺序与 csv_files 一致
+    bounds = np.linspace(0, len(csv_files), n_jobs + 1).astype(int)
+    chunks = [csv_files[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        parts = list(executor.map(_bitmap_for_files, [folder_path] * n_jobs, chunks,
+                                  [variable_groups] * n_jobs, [time_points] * n_jobs))
+    return np.concatenate(parts, axis=0), patient_ids
+
+
+def aggregate_rows(bitmap, factor, method='mean'):
+    """
+    将每 factor 个相邻患者合并为一行。
+
+    Args:
+        bitmap: (患者, 时间点, 变量组) 位图或分数数组
+        factor: 每行合并的患者数（1 表示不合并）
+        method: 'mean' 为组内有数据患者的比例，'max' 为组内任一患者有数据，'stride' 为每组取第一个患者（降采样）
+
+    Returns:
+        float32 数组 (ceil(患者 / factor), 时间点, 变量组)，取值 0-1
+    """
+    if method not in ROW_METHODS:
+        raise ValueError(f"Unknown row method: {method}. Available: {ROW_METHODS}")
+    if factor <= 1:
+        return bitmap.astype(np.float32)
+    starts = np.arange(0, bitmap.shape[0], factor)
+    if method == 'stride':
+        return bitmap[starts].astype(np.float32)
+    if method == 'max':
+        return np.maximum.reduceat(bitmap, starts, axis=0).astype(np.float32)
+    sizes = np.diff(np.append(starts, bitmap.shape[0])).astype(np.float32)
+    sums = np.add.reduceat(bitmap.astype(np.float32), starts, axis=0)
+    return sums / sizes[:, None, None]
+
+
+def column_layout(n_days, n_groups, day_px, gap_px):
+    """每个变量组在栅格中的列范围 [(x_start, x_end), ...]，组间留 gap_px 像素空白"""
+    block = n_days * day_px
+    return [(g * (block + gap_px), g * (block + gap_px) + block) for g in range(n_groups)]
+
+
+def rasterize(values, day_px=4, gap_px=2):
+    """
+    将 (行, 时间点, 变量组) 数组展开为二维栅格：每个变量组一个列块，每天占 day_px 列，
+    组间以 NaN 列分隔（着色时显示为空白）。
+    """
+    n_rows, n_days, n_groups = values.shape
+    layout = column_layout(n_days, n_groups, day_px, gap_px)
+    raster = np.full((n_rows, layout[-1][1]), np.nan, dtype=np.float32)
+    for g, (x0, x1) in enumerate(layout):
+        raster[:, x0:x1] = np.repeat(values[:, :, g], day_px, axis=1)
+    return raster
+
+
+def write_tile_pyramid(bitmap, output_folder, tile_size=256, day_px=4, gap_px=2,
+                       row_method='mean', cmap='viridis', max_levels=None):
+    """
+    将可用性位图写为多分辨率 PNG 瓦片。
+
+    第 z 层将每 2**z 个患者合并为一行（见 aggregate_rows），直到整层高度不超过一个瓦片；
+    列方向（时间点 × 变量组）在各层保持不变。RGBA 图像按瓦片行带生成与着色，不会为整层分配完整图像。
+    瓦片路径为 {output_folder}/{z}/{行}_{列}.png，层信息写入 tiles.json。
+
+    Args:
+        bitmap: (患者, 时间点, 变量组) bool 位图
+        output_folder: 瓦片输出目录
+        tile_size: 瓦片边长（像素）
+        day_px: 每个时间点的列宽（像素）
+        gap_px: 变量组之间的空白列宽（像素）
+        row_method: 行合并方式 'mean' / 'max' / 'stride'
+        cmap: matplotlib 颜色映射名
+        max_levels: 最多生成的层数（None 表示直到单瓦片高度）
+
+    Returns:
+        层信息列表
+    """
+    colormap = matplotlib.colormaps[cmap].with_extremes(bad='white')
+    n_patients, n_days, n_groups = bitmap.shape
+    width = column_layout(n_days, n_groups, day_px, gap_px)[-1][1]
+    n_tile_cols = -(-width // tile_size)
+
+    levels = []
+    z = 0
+    while True:
+        factor = 2 ** z
+        values = aggregate_rows(bitmap, factor, row_method)
+        n_rows = values.shape[0]
+        level_folder = os.path.join(output_folder, str(z))
+        os.makedirs(level_folder, exist_ok=True)
+
+        n_tile_rows = max(1, -(-n_rows // tile_size))
+        for r in range(n_tile_rows):
+            raster = rasterize(values[r * tile_size:(r + 1) * tile_size], day_px, gap_px)
+            band = colormap(np.ma.masked_invalid(raster), bytes=True)  # RGBA uint8，NaN 为白色
+            for c in range(n_tile_cols):
+                tile = band[:, c * tile_size:(c + 1) * tile_size]
+                if tile.size:
+                    mpimg.imsave(os.path.join(level_folder, f"{r}_{c}.png"), tile)
+
+        levels.append({'level': z, 'row_factor': factor, 'height': n_rows, 'width': width,
+                       'tile_rows': n_tile_rows, 'tile_cols': n_tile_cols})
+        z += 1
+        if n_rows <= tile_size or (max_levels is not None and z >= max_levels):
+            break
+    return levels
+
+
+def build_timeline_overview(values, categories, time_points, row_factor, row_method, cmap, day_px, gap_px,
+                            figsize, dpi):
+    """
+    构建带坐标轴标注的概览图（imshow 栅格，而非逐格绘制）。
+    """
+    raster = rasterize(values, day_px, gap_px)
+    layout = column_layout(len(time_points), len(categories), day_px, gap_px)
+    colormap = matplotlib.colormaps[cmap].with_extremes(bad='white')
+
+    fig, ax = plt.subplots(1, 1, figsize=figsize, dpi=dpi)
+    image = ax.imshow(raster, aspect='auto', interpolation='nearest', cmap=colormap, vmin=0, vmax=1)
+    ax.set_xticks([(x0 + x1) / 2 for x0, x1 in layout])
+    ax.set_xticklabels(categories, rotation=30, ha='right', fontsize=10)
+    if 0 in time_points:
+        # 标出每个变量组中的第 0 天
+        for x0, _ in layout:
+            ax.axvline(x0 + time_points.index(0) * day_px - 0.5, color='red', linewidth=0.5, alpha=0.6)
+    ylabel = 'Patients' if row_factor == 1 else f'Patients ({row_method} of {row_factor} per row)'
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.set_title(f'Per-patient Data Availability (Days {time_points[0]} to {time_points[-1]})',
+                 fontsize=14, fontweight='bold')
+    cbar = fig.colorbar(image, ax=ax, pad=0.02)
+    cbar.set_label('Fraction of patients with data' if row_method == 'mean' else 'Data available')
+    plt.tight_layout()
+    return fig
+
+
+def render_patient_timeline(bitmap, patient_ids, config, variable_groups=None, time_points=None):
+    """
+    输出患者时间线可用性：多分辨率瓦片、tiles.json 元数据以及带标注的概览图。
+    """
+    variable_groups = variable_groups or VARIABLE_GROUPS
+    time_points = list(time_points if time_points is not None else TIME_POINTS)
+    categories = list(variable_groups.keys())
+    output_folder = config['output_folder']
+    tiles_folder = os.path.join(output_folder, 'tiles')
+    os.makedirs(tiles_folder, exist_ok=True)
+
+    levels = write_tile_pyramid(
+        bitmap, tiles_folder,
+        tile_size=config['tile_size'], day_px=config['day_px'], gap_px=config['gap_px'],
+        row_method=config['row_method'], cmap=config['cmap'], max_levels=config.get('max_levels')
+    )
+    metadata = {
+        'patients': patient_ids,
+        'time_points': time_points,
+        'categories': categories,
+        'columns': [{'category': name, 'x_start': x0, 'x_end': x1} for name, (x0, x1) in
+                    zip(categories, column_layout(len(time_points), len(categories),
+                                                  config['day_px'], config['gap_px']))],
+        'tile_size': config['tile_size'],
+        'day_px': config['day_px'],
+        'row_method': config['row_method'],
+        'cmap': config['cmap'],
+        'levels': levels,
+    }
+    with open(os.path.join(tiles_folder, 'tiles.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    print(f"{len(levels)} tile level(s) for {len(patient_ids)} patients saved to '{tiles_folder}'")
+
+    # 概览图使用最粗一层（高度不超过 overview_rows）
+    factor = 1
+    while -(-bitmap.shape[0] // factor) > config['overview_rows']:
+        factor *= 2
+    overview = aggregate_rows(bitmap, factor, config['row_method'])
+    spec = FigureSpec(
+        name='patient_timeline_overview',
+        build=build_timeline_overview,
+        args=(overview, categories, time_points, factor, config['row_method'], config['cmap'],
+              config['day_px'], config['gap_px'], config['figsize'], config['dpi']),
+        formats=[config['output_format']], save_kwargs={'format': config['output_format']}
+    )
+    rendered = render_figures([spec], output_folder, n_jobs=1, verbose=False,
+                              use_cache=config.get('use_render_cache', True))
+    for paths in rendered.values():
+        for output_file_path in paths:
+            print(f"Timeline overview saved to '{output_file_path}'")
+
+
+if __name__ == "__main__":
+    processed_folder = "/home/phl/PHL/pytorch-forecasting/datasetcart/processed"
+
+    # --- 配置选项 ---
+    config = {
+        # 输出文件夹
+        'output_folder': '/home/phl/PHL/Car-T/dataset_visualizer/output/patient_timeline', # 瓦片、tiles.json 与概览图保存到此文件夹
+
+        # 瓦片选项
+        'tile_size': 256,                  # 瓦片边长 (像素)
+        'day_px': 4,                       # 每个时间点的列宽 (像素)
+        'gap_px': 2,                       # 变量组之间的空白列宽 (像素)
+        'row_method': 'mean',              # 行合并方式：'mean' (有数据患者比例), 'max' (任一患者有数据), 'stride' (降采样)
+        'max_levels': None,                # 最多生成的层数 (None 表示直到整层高度不超过一个瓦片)
+        'cmap': 'viridis',                 # 颜色映射 (0 无数据 -> 紫色, 1 有数据 -> 黄色)
+
+        # 概览图选项
+        'overview_rows': 512,              # 概览图最多显示的行数，患者更多时按 row_method 合并
+        'output_format': 'png',            # 输出格式：'png', 'pdf', 'svg'
+        'figsize': (16, 10),               # 概览图大小 (宽, 高 英寸)
+        'dpi': 150,                        # 概览图分辨率
+
+        # 读取与渲染选项
+        'n_jobs': None,                    # 并行读取患者文件的进程数 (None 表示使用全部 CPU 核心)
+        'use_render_cache': True,          # 概览数据与绘图参数未变化且图片已存在时跳过渲染
+    }
+    # ------------------
+
+    if not os.path.exists(processed_folder):
+        print(f"Error: The folder '{processed_folder}' does not exist.")
+        exit()
+
+    print(f"Reading patient data from '{processed_folder}'...")
+    bitmap, patient_ids = build_availability_bitmap(processed_folder, n_jobs=config['n_jobs'])
+    if not patient_ids:
+        print("No patient data found. Exiting.")
+    else:
+        print(f"Availability bitmap: {bitmap.shape[0]} patients × {bitmap.shape[1]} days × {bitmap.shape[2]} categories")
+        render_patient_timeline(bitmap, patient_ids, config)
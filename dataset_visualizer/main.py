@@ -15,6 +15,7 @@ import logging
 from typing import Optional
 
 from config_manager import ConfigManager
+from dataset_context import DatasetContext
 from data_analyzer import StaticDataAnalyzer
 from data_visualizer import StaticDataVisualizer
 
@@ -64,12 +65,19 @@ def main() -> bool:
         logger.info(f"Output directory: {output_dir}")
         print(f"Output directory: {output_dir}")
         
+        # Shared dataset context: the input file is parsed once for both phases
+        dataset = DatasetContext.from_config(config_manager)
+        
+        # Approximate mode: quick-look report from a stratified sample, no figures
+        if config_manager.get('analysis', 'approximate', {}).get('enabled', False):
+            return _run_approximate_analysis(config_manager, dataset)
+        
         # Initialize and run data analyzer
-        if not _run_data_analysis(config_manager):
+        if not _run_data_analysis(config_manager, dataset):
             return False
         
         # Initialize and run data visualizer
-        if not _run_data_visualization(config_manager):
+        if not _run_data_visualization(config_manager, dataset):
             return False
         
         print("\n" + "=" * 80)
@@ -94,13 +102,15 @@ def main() -> bool:
         return False
 
 
-def _run_data_analysis(config_manager: ConfigManager) -> bool:
+def _run_data_analysis(config_manager: ConfigManager,
+                       dataset: Optional[DatasetContext] = None) -> bool:
     """
     Run the data analysis phase.
     运行数据分析阶段。
     
     Args:
         config_manager: Configuration manager instance
+        dataset: Shared dataset context (None = load the configured input file)
         
     Returns:
         True if analysis completed successfully, False otherwise
@@ -112,7 +122,7 @@ def _run_data_analysis(config_manager: ConfigManager) -> bool:
     # Load and analyze data
     print("\n3. Loading and analyzing data...")
     logger.info("Loading data for analysis")
-    if not analyzer.load_data():
+    if not analyzer.load_data(context=dataset):
         logger.error("Failed to load data for analysis")
         print("Error: Failed to load data. Exiting.")
         return False
@@ -126,13 +136,43 @@ def _run_data_analysis(config_manager: ConfigManager) -> bool:
     return True
 
 
-def _run_data_visualization(config_manager: ConfigManager) -> bool:
+def _run_approximate_analysis(config_manager: ConfigManager,
+                              dataset: Optional[DatasetContext] = None) -> bool:
+    """
+    Run the approximate (sampling-based) analysis instead of the full pipeline.
+    运行基于抽样的近似分析，代替完整流程。
+    
+    Args:
+        config_manager: Configuration manager instance
+        dataset: Shared dataset context (None = load the configured input file)
+        
+    Returns:
+        True if the approximate report was generated, False otherwise
+    """
+    print("\n2. Approximate mode: estimating from a stratified patient sample...")
+    logger.info("Running approximate analysis (analysis.approximate.enabled)")
+    analyzer = StaticDataAnalyzer(config_manager)
+    if not analyzer.load_data(context=dataset):
+        logger.error("Failed to load data for approximate analysis")
+        print("Error: Failed to load data. Exiting.")
+        return False
+    
+    analyzer.analyze_approximate()
+    print("\nApproximate report generated; visualizations are skipped in approximate mode.")
+    print("近似报告已生成；近似模式下不生成可视化图表。")
+    logger.info("Approximate analysis completed")
+    return True
+
+
+def _run_data_visualization(config_manager: ConfigManager,
+                            dataset: Optional[DatasetContext] = None) -> bool:
     """
     Run the data visualization phase.
     运行数据可视化阶段。
     
     Args:
         config_manager: Configuration manager instance
+        dataset: Shared dataset context (None = load the configured input file)
         
     Returns:
         True if visualization completed successfully, False otherwise
@@ -143,20 +183,15 @@ def _run_data_visualization(config_manager: ConfigManager) -> bool:
     
     # Load data into visualizer
     logger.info("Loading data for visualization")
-    if not visualizer.load_data():
+    if not visualizer.load_data(context=dataset):
         logger.error("Failed to load data for visualization")
         print("Error: Failed to load data for visualization. Exiting.")
         return False
     
-    # Create comprehensive visualizations
-    print("\n6. Creating comprehensive visualizations...")
-    logger.info("Creating comprehensive visualizations")
-    visualizer.create_comprehensive_visualization()
-    
-    # Create summary dashboard
-    print("\n7. Creating summary dashboard...")
-    logger.info("Creating summary dashboard")
-    visualizer.create_summary_dashboard()
+    # Create comprehensive visualizations and summary dashboard (rendered in one process pool)
+    print("\n6. Creating comprehensive visualizations and summary dashboard...")
+    logger.info("Creating comprehensive visualizations and summary dashboard")
+    visualizer.create_all_visualizations()
     logger.info("Visualization phase completed")
     
     return True
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Render Scheduler Module
+图表渲染调度模块
+
+This module renders matplotlib figures across a process pool. Every figure is
+described up front by a FigureSpec (a picklable build function, its arguments
+and the output file name); workers switch to the non-interactive Agg backend,
+build the figure and save it in each requested format.
+本模块使用进程池并行渲染 matplotlib 图表。每个图表先描述为 FigureSpec
+（可序列化的构建函数、参数与输出文件名），worker 切换到非交互式 Agg 后端，
+构建图表并按每种格式保存。
+
+Output file names are {output_dir}/{spec.name}.{fmt}, independent of the
+scheduling order, and results are reported in the order of the specs.
+输出文件名为 {output_dir}/{spec.name}.{fmt}，与调度顺序无关；结果按 spec 的顺序返回。
+
+Render cache 渲染缓存:
+    Each spec is fingerprinted from its input data slice and plotting parameters
+    (cache_inputs, or args/kwargs), the output formats and save options, the
+    rcParams and the source of the module defining the build function. A figure is
+    skipped when render_manifest.json in the output directory records the same
+    fingerprint and all of its output files exist; the manifest also records which
+    figures the last run regenerated.
+    每个图表的指纹由输入数据切片与绘图参数、输出格式与保存参数、rcParams
+    以及构建函数所在模块的源码共同决定。输出目录中的 render_manifest.json
+    记录了相同指纹且所有输出文件都存在时跳过渲染；清单同时记录上次运行重新生成了哪些图表。
+"""
+
+import os
+import json
+import hashlib
+import inspect
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+# Configure logging for this module
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'render_manifest.json'
+
+
+@dataclass
+class FigureSpec:
+    """
+    Specification of a single figure to render.
+    单个图表的渲染规格。
+
+    Attributes:
+        name: Base file name without extension
+        build: Picklable callable returning a matplotlib Figure
+        args: Positional arguments for build
+        kwargs: Keyword arguments for build
+        formats: Output formats, e.g. ['png', 'pdf']
+        save_kwargs: Extra keyword arguments for Figure.savefig (dpi, bbox_inches, ...)
+        cache_inputs: Data slice and parameters that determine the figure, used for the
+                      render cache fingerprint (None = args and kwargs)
+    """
+    name: str
+    build: Callable[..., Any]
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    formats: Sequence[str] = ('png',)
+    save_kwargs: Dict[str, Any] = field(default_factory=dict)
+    cache_inputs: Any = None
+
+
+# =============================================================================
+# FINGERPRINTS 指纹
+# =============================================================================
+
+_SOURCE_HASHES: Dict[str, str] = {}
+
+
+def _source_hash(func: Callable) -> str:
+    """Hash of the source file defining func (so code changes invalidate its figures)."""
+    func = getattr(func, '__func__', func)
+    try:
+        path = inspect.getsourcefile(func)
+    except TypeError:
+        path = None
+    if not path or not os.path.exists(path):
+        return ''
+    if path not in _SOURCE_HASHES:
+        with open(path, 'rb') as f:
+            _SOURCE_HASHES[path] = hashlib.sha1(f.read()).hexdigest()
+    return _SOURCE_HASHES[path]
+
+
+def _update_hash(hasher, obj: Any) -> None:
+    """Feed a deterministic serialization of obj into hasher."""
+    if isinstance(obj, pd.DataFrame):
+        hasher.update(b'DataFrame')
+        hasher.update(repr((list(obj.columns), [str(t) for t in obj.dtypes])).encode('utf-8'))
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        hasher.update(b'Series')
+        hasher.update(repr((obj.name, str(obj.dtype))).encode('utf-8'))
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        hasher.update(repr((obj.dtype.str, obj.shape)).encode('utf-8'))
+        hasher.update(obj.tobytes() if obj.dtype != object else repr(obj.tolist()).encode('utf-8'))
+    elif isinstance(obj, dict):
+        hasher.update(b'dict')
+        for key in sorted(obj, key=repr):
+            hasher.update(repr(key).encode('utf-8'))
+            _update_hash(hasher, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f'{type(obj).__name__}{len(obj)}'.encode('utf-8'))
+        for item in obj:
+            _update_hash(hasher, item)
+    elif callable(obj) and hasattr(obj, '__qualname__'):
+        # Functions and bound methods are identified by name and source, not by instance
+        hasher.update(f'{getattr(obj, "__module__", "")}.{obj.__qualname__}'.encode('utf-8'))
+        hasher.update(_source_hash(obj).encode('utf-8'))
+    else:
+        hasher.update(repr(obj).encode('utf-8'))
+
+
+def figure_fingerprint(spec: FigureSpec, rc_params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Fingerprint of everything that determines a figure's output files.
+    计算决定图表输出文件的全部输入的指纹。
+
+    Args:
+        spec: Figure specification
+        rc_params: rcParams applied while rendering
+
+    Returns:
+        16-character hexadecimal fingerprint
+    """
+    hasher = hashlib.sha1()
+    inputs = spec.cache_inputs if spec.cache_inputs is not None else (spec.args, spec.kwargs)
+    for part in (spec.build, inputs, list(spec.formats), spec.save_kwargs, rc_params or {}):
+        _update_hash(hasher, part)
+    return hasher.hexdigest()[:16]
+
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    """
+    Load the render manifest of an output directory.
+    读取输出目录中的渲染清单。
+
+    Returns:
+        Manifest dictionary ({'figures': {...}, 'last_run': {...}}), empty if missing
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {'figures': {}}
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable render manifest {manifest_path}: {e}")
+        return {'figures': {}}
+    manifest.setdefault('figures', {})
+    return manifest
+
+
+def _save_manifest(output_dir: str, manifest: Dict[str, Any]) -> None:
+    """Write the manifest atomically (temporary file + os.replace)."""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _init_worker(rc_params: Optional[Dict[str, Any]]) -> None:
+    """Switch the worker to the Agg backend and apply the caller's rcParams."""
+    matplotlib.use('Agg', force=True)
+    if rc_params:
+        matplotlib.rcParams.update(rc_params)
+
+
+def _render(spec: FigureSpec, output_dir: str) -> Tuple[List[str], List[str]]:
+    """
+    Build one figure and save it in every format.
+    构建单个图表并按每种格式保存。
+
+    Returns:
+        (saved file paths, error messages)
+    """
+    import matplotlib.pyplot as plt
+
+    fig = spec.build(*spec.args, **spec.kwargs)
+    saved, errors = [], []
+    try:
+        for fmt in spec.formats:
+            filepath = os.path.join(output_dir, f"{spec.name}.{fmt}")
+            try:
+                fig.savefig(filepath, **spec.save_kwargs)
+                saved.append(filepath)
+            except Exception as e:
+                errors.append(f"Error saving {filepath}: {e}")
+    finally:
+        plt.close(fig)
+    return saved, errors
+
+
+def render_figures(specs: Sequence[FigureSpec], output_dir: str,
+                   n_jobs: Optional[int] = None,
+                   rc_params: Optional[Dict[str, Any]] = None,
+                   verbose: bool = True,
+                   use_cache: bool = True) -> Dict[str, List[str]]:
+    """
+    Render figure specifications, in parallel when n_jobs > 1.
+    渲染所有图表规格（n_jobs > 1 时并行），跳过指纹未变化的图表。
+
+    Args:
+        specs: Figure specifications; names must be unique
+        output_dir: Output directory for all files
+        n_jobs: Number of worker processes (None = all cores, 1 = render in the current process)
+        rc_params: matplotlib rcParams applied while rendering
+        verbose: Whether to print each saved file path
+        use_cache: Whether to skip figures whose fingerprint matches the manifest
+
+    Returns:
+        Dictionary mapping the name of each rendered spec to its saved file paths
+        (figures skipped by the cache are not included)
+
+    Raises:
+        ValueError: If two specs share the same name
+    """
+    names = [spec.name for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Figure names must be unique, duplicated: {duplicates}")
+    if not specs:
+        return {}
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    fingerprints = {spec.name: figure_fingerprint(spec, rc_params) for spec in specs}
+
+    to_render, cached = [], []
+    for spec in specs:
+        entry = manifest['figures'].get(spec.name, {})
+        outputs_exist = all(os.path.exists(os.path.join(output_dir, f"{spec.name}.{fmt}"))
+                            for fmt in spec.formats)
+        if use_cache and entry.get('fingerprint') == fingerprints[spec.name] and outputs_exist:
+            cached.append(spec)
+        else:
+            to_render.append(spec)
+    if cached:
+        print(f"Render cache: {len(cached)} unchanged figure(s) skipped, {len(to_render)} to render")
+
+    results = []
+    if to_render:
+        n_workers = max(1, min(n_jobs or os.cpu_count() or 1, len(to_render)))
+        logger.info(f"Rendering {len(to_render)} figures with {n_workers} process(es)")
+        if n_workers == 1:
+            with matplotlib.rc_context(rc_params or {}):
+                results = [_render(spec, output_dir) for spec in to_render]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(rc_params,)) as executor:
+                results = list(executor.map(_render, to_render, [output_dir] * len(to_render)))
+
+    rendered = {}
+    now = datetime.now().isoformat(timespec='seconds')
+    for spec, (saved, errors) in zip(to_render, results):
+        if verbose:
+            for filepath in saved:
+                print(f"Saved: {filepath}")
+        for error in errors:
+            logger.error(error)
+            print(error)
+        rendered[spec.name] = saved
+        manifest['figures'][spec.name] = {
+            'fingerprint': fingerprints[spec.name],
+            'files': [os.path.basename(path) for path in saved],
+            'rendered_at': now,
+        }
+
+    manifest['last_run'] = {
+        'time': now,
+        'rendered': [spec.name for spec in to_render],
+        'cached': [spec.name for spec in cached],
+    }
+    _save_manifest(output_dir, manifest)
+    return rendered
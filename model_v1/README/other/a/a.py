@@ -263,12 +263,14 @@ def run_group_cv(df_all: pd.DataFrame,
     ])
     categorical_pipeline = Pipeline([
         ('imputer', SimpleImputer(strategy='most_frequent')),
-        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse=False))
+        ('onehot', OneHotEncoder(handle_unknown='ignore'))  # keep one-hot block sparse
     ])
+    # sparse_threshold=1.0: output stays CSR whenever the one-hot block is sparse;
+    # LightGBM trains on CSR directly, so the one-hot columns are never densified
     preprocessor = ColumnTransformer([
         ('num', numeric_pipeline, numeric_cols),
         ('cat', categorical_pipeline, categorical_cols)
-    ], remainder='drop')
+    ], remainder='drop', sparse_threshold=1.0)
 
     # Model (LightGBM)
     lgb = LGBMClassifier(
@@ -310,8 +312,8 @@ def run_group_cv(df_all: pd.DataFrame,
 
         # fit preprocessor on train
         preprocessor.fit(X_train)
-        X_train_trans = preprocessor.transform(X_train)
-        X_test_trans = preprocessor.transform(X_test)
+        X_train_trans = preprocessor.transform(X_train).astype(np.float32)
+        X_test_trans = preprocessor.transform(X_test).astype(np.float32)
 
         # feature names for LightGBM (optional)
         # train model with early_stopping on a small validation split (internal)
@@ -416,7 +418,7 @@ def main():
     preproc = results['preprocessor']
     # Fit preprocessor on full
     preproc.fit(X_full)
-    X_full_trans = preproc.transform(X_full)
+    X_full_trans = preproc.transform(X_full).astype(np.float32)
     # train final model with balanced weight
     pos = y_full.sum(); neg = len(y_full) - pos
     final_model = LGBMClassifier(n_estimators=1000, random_state=RANDOM_STATE, n_jobs=4,
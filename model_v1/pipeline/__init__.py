@@ -8,6 +8,19 @@ Pipeline 模块
 -----------
 1. perfect_pipeline - 数据预处理和特征工程
 2. data_splitters - 患者级别分层数据分割
+3. feature_table - 患者级特征表构建（静态 + 动态聚合）
+4. multi_endpoint_trainer - 多终点共享特征与折叠的交叉验证训练
+5. disease_training - 按 disease_partition 分区并行训练
+6. fold_ensemble - 折模型集成的批量推理
+7. scoring_service - 本地低延迟打分服务（常驻模型 + 微批处理）
+8. tree_export - LightGBM 模型导出为扁平数组 + 向量化求值
+9. fused_transform - 已拟合 ColumnTransformer 编译为融合变换
+10. fold_statistics - 所有 CV 折的插补 / 标准化统计量一次性计算
+11. oof_store - 按实验哈希持久化 OOF 预测
+12. calibration - OOF 概率校准（Platt / 保序回归）与 O(n log n) 阈值扫描
+13. bootstrap_ci - 按患者分层的向量化 bootstrap 置信区间
+14. shap_runner - 分块 / 并行 / 缓存的 SHAP 计算与折模型聚合
+15. permutation_importance - 按变量 / 类别分组的并行置换重要性
 
 使用示例：
 ---------
@@ -57,11 +70,96 @@ from .data_splitters import (
     # 分割器类
     PatientLevelStratifiedSplitter,
     PatientLevelStratifiedSplitterWithCV,
+    RepeatedNestedPatientCV,
+    CVFold,
+    MultiLabelPatientStratifiedSplitterWithCV,
     
     # 兼容函数
     patient_level_train_test_split,
 )
 
+# ============================================================
+# 从 feature_table / multi_endpoint_trainer 模块导入
+# ============================================================
+
+from .feature_table import (
+    aggregate_time_series,
+    aggregate_time_series_batch,
+    read_dynamic_batch,
+    build_feature_table,
+    load_or_build_feature_table,
+    split_feature_columns,
+    build_tabular_preprocessor,
+)
+
+from .multi_endpoint_trainer import (
+    MultiEndpointTrainer,
+    compute_binary_metrics,
+)
+
+from .disease_training import (
+    DiseasePartitionTrainer,
+    discover_partitions,
+)
+
+from .fold_ensemble import (
+    FoldEnsemblePredictor,
+)
+
+from .scoring_service import (
+    ScoringService,
+    WarmPipelineScorer,
+    MicroBatcher,
+    LatencyTracker,
+    compile_pipeline,
+)
+
+from .tree_export import (
+    FlatTreeEnsemble,
+    export_lgbm_model,
+    check_parity,
+)
+
+from .fused_transform import (
+    FusedStaticTransform,
+)
+
+from .fold_statistics import (
+    FoldStatistics,
+    PrefittedTransformer,
+    compute_fold_statistics,
+)
+
+from .oof_store import (
+    OOFStore,
+    experiment_hash,
+)
+
+from .calibration import (
+    PlattCalibrator,
+    IsotonicCalibrator,
+    make_calibrator,
+    calibrate_oof,
+    threshold_sweep,
+    select_threshold,
+)
+
+from .bootstrap_ci import (
+    bootstrap_ci,
+    format_ci,
+)
+
+from .shap_runner import (
+    ShapRunner,
+    fold_shap_importance,
+)
+
+from .permutation_importance import (
+    feature_groups,
+    grouped_permutation_importance,
+    fold_permutation_importance,
+)
+
 
 # ============================================================
 # 定义公开的 API
@@ -78,7 +176,75 @@ __all__ = [
     # data_splitters 导出
     'PatientLevelStratifiedSplitter',
     'PatientLevelStratifiedSplitterWithCV',
+    'RepeatedNestedPatientCV',
+    'CVFold',
+    'MultiLabelPatientStratifiedSplitterWithCV',
     'patient_level_train_test_split',
+    
+    # feature_table 导出
+    'aggregate_time_series',
+    'aggregate_time_series_batch',
+    'read_dynamic_batch',
+    'build_feature_table',
+    'load_or_build_feature_table',
+    'split_feature_columns',
+    'build_tabular_preprocessor',
+    
+    # multi_endpoint_trainer 导出
+    'MultiEndpointTrainer',
+    'compute_binary_metrics',
+    
+    # disease_training 导出
+    'DiseasePartitionTrainer',
+    'discover_partitions',
+    
+    # fold_ensemble 导出
+    'FoldEnsemblePredictor',
+    
+    # scoring_service 导出
+    'ScoringService',
+    'WarmPipelineScorer',
+    'MicroBatcher',
+    'LatencyTracker',
+    'compile_pipeline',
+    
+    # tree_export 导出
+    'FlatTreeEnsemble',
+    'export_lgbm_model',
+    'check_parity',
+    
+    # fused_transform 导出
+    'FusedStaticTransform',
+
+    # fold_statistics 导出
+    'FoldStatistics',
+    'PrefittedTransformer',
+    'compute_fold_statistics',
+
+    # oof_store 导出
+    'OOFStore',
+    'experiment_hash',
+
+    # calibration 导出
+    'PlattCalibrator',
+    'IsotonicCalibrator',
+    'make_calibrator',
+    'calibrate_oof',
+    'threshold_sweep',
+    'select_threshold',
+
+    # bootstrap_ci 导出
+    'bootstrap_ci',
+    'format_ci',
+
+    # shap_runner 导出
+    'ShapRunner',
+    'fold_shap_importance',
+
+    # permutation_importance 导出
+    'feature_groups',
+    'grouped_permutation_importance',
+    'fold_permutation_importance',
 ]
 
 # 模块级文档
@@ -100,8 +266,81 @@ data_splitters 模块：
 --------------------
 - PatientLevelStratifiedSplitter: 患者级别分层数据分割（70/30）
 - PatientLevelStratifiedSplitterWithCV: 带交叉验证的患者级分割
+- RepeatedNestedPatientCV: 重复 + 嵌套交叉验证的惰性折叠生成器（记忆化）
+- MultiLabelPatientStratifiedSplitterWithCV: 多毒性终点联合分层的患者级分割
 - patient_level_train_test_split: sklearn 兼容的分割函数
 
+feature_table 模块：
+------------------
+- build_feature_table: 静态 + 动态聚合特征表（支持多个标签列）
+- aggregate_time_series_batch: 一批患者的向量化动态特征聚合
+- load_or_build_feature_table: 带磁盘缓存的特征表构建
+- build_tabular_preprocessor: 特征表的数值/类别预处理器
+
+multi_endpoint_trainer 模块：
+---------------------------
+- MultiEndpointTrainer: 共享一份特征表与折叠，为每个终点训练 LightGBM
+
+disease_training 模块：
+---------------------
+- DiseasePartitionTrainer: 发现所有疾病分区，复用队列特征缓存并发训练，输出汇总指标表
+
+fold_ensemble 模块：
+------------------
+- FoldEnsemblePredictor: 加载全部 fold 模型，分批向量化构建特征并输出折集成概率（均值/离散度）
+
+scoring_service 模块：
+--------------------
+- ScoringService: 本地 HTTP / Unix socket 打分服务，常驻 pipeline，合并并发请求，提供延迟分位数
+- compile_pipeline: 导出为不依赖 LightGBM 的部署格式
+
+tree_export 模块：
+----------------
+- export_lgbm_model: LGBMClassifier → FlatTreeEnsemble（扁平 NumPy 数组）
+- FlatTreeEnsemble: 批量向量化遍历所有树，save / load 为 .npz
+- check_parity: 与 predict_proba 的一致性校验
+
+fused_transform 模块：
+--------------------
+- FusedStaticTransform: 插补值 / 标准化向量 / 类别查找表直接写入预分配的 float32 矩阵
+  （FullPreprocessor.compile() 启用，MultiEndpointTrainer 与 FoldEnsemblePredictor 默认使用）
+
+fold_statistics 模块：
+--------------------
+- compute_fold_statistics: 每列排序一次 + 折成员矩阵乘法，得到所有折的中位数 / 均值 / 方差
+- FoldStatistics: 按折产出已拟合的 SimpleImputer / StandardScaler / Pipeline
+- PrefittedTransformer: 在 ColumnTransformer 中保留已拟合的数值分支（fit 不重新拟合）
+
+oof_store 模块：
+--------------
+- experiment_hash: 配置 + 特征表 + 折叠 → 实验键
+- OOFStore: 每个 (实验键, 终点) 一个 .npz（MultiEndpointTrainer(oof_store=...) 自动写入）
+
+calibration 模块：
+----------------
+- PlattCalibrator / IsotonicCalibrator / calibrate_oof: 在 OOF 上拟合校准器（按折交叉拟合评估）
+- threshold_sweep: 单次排序得到所有唯一阈值下的 precision / recall / F1 / specificity
+- select_threshold: 按 F1 / Youden 等选阈值，可加最低召回约束
+
+bootstrap_ci 模块：
+-----------------
+- bootstrap_ci: 一次生成 B × n 重抽样下标，所有重抽样的 AUC / AUPRC / F1 / Precision /
+  Recall / Brier 向量化计算（共享一次排序）
+- format_ci: 格式化为 "估计值 (下限-上限)"
+
+shap_runner 模块：
+----------------
+- ShapRunner: 行分块 + 进程池，SHAP 矩阵直接写入 .npy memmap，按 (模型哈希, 数据哈希) 缓存
+  （LightGBM 模型使用内置 TreeSHAP，不依赖 shap 包）
+- fold_shap_importance: 所有折模型的 mean |SHAP| 及跨折均值 / 标准差
+
+permutation_importance 模块：
+---------------------------
+- feature_groups: 变换后的列按原始变量 / 变量类别 / 静态-动态块分组
+- grouped_permutation_importance: 在已变换矩阵上按组置换，基线只算一次，
+  进程池 worker 共享 memmap 数据，一次 predict_proba 完成全部重复
+- fold_permutation_importance: 每个折模型在其验证折上计算并跨折汇总
+
 快速开始：
 ---------
 ```python
@@ -0,0 +1,197 @@
+"""
+bootstrap_ci.py
+---------------
+评估指标的向量化 bootstrap 置信区间
+
+背景：
+    evaluate_BNHL_CRS_model.py 与 run_cv_training 只报告 AUC / AUPRC / F1 / Brier 的点估计。
+    逐次重抽样再调用 sklearn 的写法，B=2000 次在大测试集上需要数分钟。
+
+做法：
+    1. 按患者分层重抽样：每个类别层内对患者有放回抽样，所有重抽样的下标一次生成
+       为 (B × n_patients) 数组，再用一次 bincount 转为每个患者的抽中次数（权重矩阵）
+    2. 概率只排序一次并归为并列组；用稀疏的“患者 → 并列组”计数矩阵，
+       一次矩阵乘法得到所有重抽样在每个并列组内的正 / 负类权重（B × G），
+       指标全部由这些组权重向量化得到：
+       - AUC：按并列组累计负类权重（Mann-Whitney 秩统计量，并列计 0.5）
+       - AUPRC：降序累计 TP / FP 权重，Σ ΔRecall · Precision（与 average_precision_score 一致）
+       - F1 / Precision / Recall：固定阈值下的加权混淆矩阵（矩阵乘法）
+       - Brier：加权平方误差
+    3. 按 B 分块计算，内存占用为 chunk_size × (n_patients + G)
+
+示例：
+    >>> ci = bootstrap_ci(y_test, probs, groups=patient_ids, n_bootstrap=2000)
+    >>> print(ci)          # index: AUC, AUPRC, F1, Precision, Recall, Brier
+    ...                    # columns: estimate, ci_lower, ci_upper, std
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+METRICS = ("AUC", "AUPRC", "F1", "Precision", "Recall", "Brier")
+
+
+def _group_metrics(
+    pos_g: np.ndarray,
+    neg_g: np.ndarray,
+    tp_t: np.ndarray,
+    fp_t: np.ndarray,
+    sq_err: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    由每个重抽样的并列组权重计算所有指标
+
+    参数:
+        pos_g, neg_g (np.ndarray, B × G): 每个并列概率组（按概率升序）内的正 / 负类权重
+        tp_t, fp_t (np.ndarray, B): 固定阈值下的加权 TP / FP
+        sq_err (np.ndarray, B): 加权平方误差之和
+
+    返回:
+        dict: {指标名: 长度 B 的数组}
+    """
+    n_pos = pos_g.sum(axis=1)
+    n_neg = neg_g.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # AUC：正类样本得分高于负类的加权比例，并列计 0.5
+        neg_before = np.cumsum(neg_g, axis=1) - neg_g
+        auc = (pos_g * (neg_before + 0.5 * neg_g)).sum(axis=1) / (n_pos * n_neg)
+
+        # AUPRC：阈值从高到低，Σ ΔRecall · Precision
+        tp = np.cumsum(pos_g[:, ::-1], axis=1)
+        fp = np.cumsum(neg_g[:, ::-1], axis=1)
+        precision_curve = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        auprc = (pos_g[:, ::-1] * precision_curve).sum(axis=1) / n_pos
+
+        fn_t = n_pos - tp_t
+        precision = np.where(tp_t + fp_t > 0, tp_t / (tp_t + fp_t), 0.0)
+        recall = np.where(n_pos > 0, tp_t / n_pos, 0.0)
+        f1 = np.where(2 * tp_t + fp_t + fn_t > 0, 2 * tp_t / (2 * tp_t + fp_t + fn_t), 0.0)
+        brier = sq_err / (n_pos + n_neg)
+
+    # 只有一个类别的重抽样：AUC / AUPRC 无定义
+    auc[(n_pos == 0) | (n_neg == 0)] = np.nan
+    auprc[n_pos == 0] = np.nan
+
+    return {"AUC": auc, "AUPRC": auprc, "F1": f1, "Precision": precision,
+            "Recall": recall, "Brier": brier}
+
+
+def bootstrap_ci(
+    y_true: np.ndarray,
+    probs: np.ndarray,
+    groups: Optional[np.ndarray] = None,
+    n_bootstrap: int = 2000,
+    threshold: float = 0.5,
+    alpha: float = 0.05,
+    random_state: int = 42,
+    chunk_size: Optional[int] = None,
+    return_samples: bool = False
+):
+    """
+    按患者分层的 bootstrap 置信区间
+
+    参数:
+        y_true (np.ndarray): 二元标签
+        probs (np.ndarray): 阳性概率
+        groups (np.ndarray, optional): 每行的患者ID；同一患者的行一起被抽中。
+                                       None 表示每行是一个患者
+        n_bootstrap (int): 重抽样次数 B
+        threshold (float): F1 / Precision / Recall 的分类阈值
+        alpha (float): 置信区间为 [alpha/2, 1-alpha/2] 分位数
+        random_state (int): 随机种子
+        chunk_size (int, optional): 每块的重抽样次数；默认使每块约 1e6 个元素（小块可复用内存，更快）
+        return_samples (bool): 是否同时返回 B × 指标的抽样分布
+
+    返回:
+        pd.DataFrame: index 为指标名，列为 [estimate, ci_lower, ci_upper, std]
+        （return_samples=True 时返回 (ci, samples)）
+    """
+    y_true = np.asarray(y_true, dtype=int)
+    probs = np.asarray(probs, dtype=float)
+    if y_true.shape != probs.shape or y_true.ndim != 1:
+        raise ValueError("y_true and probs must be 1-D arrays of the same length")
+    if n_bootstrap < 1:
+        raise ValueError("n_bootstrap must be >= 1")
+
+    n = len(y_true)
+    if groups is None:
+        patient_codes = np.arange(n)
+    else:
+        patient_codes, _ = pd.factorize(pd.Series(groups), sort=False)
+    n_patients = int(patient_codes.max()) + 1 if n else 0
+
+    # 患者级标签（任一行阳性即为阳性）作为分层依据
+    patient_label = np.zeros(n_patients, dtype=int)
+    np.maximum.at(patient_label, patient_codes, y_true)
+    # 患者按层重新编号（同层相邻），抽样时只需“层内下标 + 层偏移”
+    stratum_order = np.argsort(patient_label, kind="stable")
+    patient_codes = np.argsort(stratum_order)[patient_codes]
+    strata_sizes = np.bincount(patient_label, minlength=2)
+    strata_offsets = np.r_[0, np.cumsum(strata_sizes)[:-1]]
+
+    # 只排序一次（并列概率归为一组），所有重抽样共享
+    _, group_id = np.unique(probs, return_inverse=True)
+    n_groups = int(group_id.max()) + 1 if n else 0
+    pos = y_true == 1
+
+    # 患者 → 并列组 的计数矩阵；重抽样权重（患者抽中次数）乘以它即得各组权重
+    A_pos = sparse.csr_matrix((pos.astype(float), (patient_codes, group_id)), shape=(n_patients, n_groups))
+    A_neg = sparse.csr_matrix(((~pos).astype(float), (patient_codes, group_id)), shape=(n_patients, n_groups))
+    predicted = probs >= threshold
+    patient_tp = np.bincount(patient_codes, weights=pos & predicted, minlength=n_patients)
+    patient_fp = np.bincount(patient_codes, weights=~pos & predicted, minlength=n_patients)
+    patient_sq = np.bincount(patient_codes, weights=(probs - y_true) ** 2, minlength=n_patients)
+
+    def metrics_for(counts: np.ndarray) -> Dict[str, np.ndarray]:
+        return _group_metrics(
+            np.asarray((A_pos.T @ counts.T).T),
+            np.asarray((A_neg.T @ counts.T).T),
+            counts @ patient_tp,
+            counts @ patient_fp,
+            counts @ patient_sq
+        )
+
+    point = metrics_for(np.ones((1, n_patients)))
+
+    if chunk_size is None:
+        chunk_size = max(1, int(1e6 // max(n_groups + n_patients, 1)))
+    rng = np.random.default_rng(random_state)
+    samples = {m: np.empty(n_bootstrap) for m in METRICS}
+
+    for start in range(0, n_bootstrap, chunk_size):
+        b = min(chunk_size, n_bootstrap - start)
+        # 一次生成 (b × n_patients) 的重抽样下标，层内有放回
+        idx = np.empty((b, n_patients), dtype=np.int64)
+        for size, offset in zip(strata_sizes, strata_offsets):
+            if size:
+                idx[:, offset:offset + size] = rng.integers(offset, offset + size, size=(b, size))
+        idx += (np.arange(b) * n_patients)[:, None]
+        counts = np.bincount(idx.ravel(), minlength=b * n_patients).reshape(b, n_patients).astype(float)
+
+        chunk = metrics_for(counts)
+        for m in METRICS:
+            samples[m][start:start + b] = chunk[m]
+
+    samples = pd.DataFrame(samples)
+    ci = pd.DataFrame({
+        "estimate": [point[m][0] for m in METRICS],
+        "ci_lower": samples.quantile(alpha / 2).to_numpy(),
+        "ci_upper": samples.quantile(1 - alpha / 2).to_numpy(),
+        "std": samples.std().to_numpy(),
+    }, index=list(METRICS))
+
+    if return_samples:
+        return ci, samples
+    return ci
+
+
+def format_ci(ci: pd.DataFrame, digits: int = 3) -> pd.Series:
+    """将 bootstrap_ci 的结果格式化为 "0.812 (0.771-0.850)" 形式"""
+    return pd.Series({
+        metric: f"{row.estimate:.{digits}f} ({row.ci_lower:.{digits}f}-{row.ci_upper:.{digits}f})"
+        for metric, row in ci.iterrows()
+    })
@@ -0,0 +1,214 @@
+"""
+calibration.py
+--------------
+基于 OOF 预测的概率校准与阈值扫描（无需重新训练）
+
+背景：
+    所有训练脚本都用固定的 0.5 阈值计算 F1 / Precision / Recall；
+    LightGBM 配合 scale_pos_weight 输出的概率也并未校准。
+    有了 OOFStore 持久化的 OOF 预测，这两件事都可以离线完成。
+
+做法：
+    1. PlattCalibrator：在 logit(p) 上拟合一维逻辑回归
+       IsotonicCalibrator：单调保序回归（out_of_bounds="clip"）
+    2. calibrate_oof：按折交叉拟合（用其他折的 OOF 拟合、作用于本折），
+       得到可用于无偏评估的校准后 OOF 概率；同时返回在全部 OOF 上拟合的校准器供部署
+    3. threshold_sweep：概率只排序一次，用累计和一次得到每个唯一阈值下的
+       TP / FP / TN / FN 与 precision / recall / F1 / specificity，O(n log n)
+    4. select_threshold：按 F1 / Youden 指数 / 任意扫描列选阈值，可附加最低召回约束
+
+示例：
+    >>> oof = OOFStore("./oof_store").load(key, "CRS")
+    >>> calibrator, oof = calibrate_oof(oof, method="isotonic")
+    >>> sweep = threshold_sweep(oof["y_true"], oof["prob_calibrated"])
+    >>> best = select_threshold(sweep, metric="f1", min_recall=0.8)
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.isotonic import IsotonicRegression
+from sklearn.linear_model import LogisticRegression
+
+_EPS = 1e-7
+
+
+def _logit(probs: np.ndarray) -> np.ndarray:
+    p = np.clip(np.asarray(probs, dtype=float), _EPS, 1 - _EPS)
+    return np.log(p / (1 - p))
+
+
+class PlattCalibrator:
+    """
+    Platt 缩放：p' = sigmoid(a · logit(p) + b)
+
+    属性:
+        a_ (float): 斜率
+        b_ (float): 截距
+    """
+
+    def fit(self, probs: np.ndarray, y_true: np.ndarray) -> "PlattCalibrator":
+        lr = LogisticRegression(C=1e6)
+        lr.fit(_logit(probs).reshape(-1, 1), np.asarray(y_true, dtype=int))
+        self.a_ = float(lr.coef_[0, 0])
+        self.b_ = float(lr.intercept_[0])
+        return self
+
+    def predict(self, probs: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-(self.a_ * _logit(probs) + self.b_)))
+
+
+class IsotonicCalibrator:
+    """
+    保序回归校准（超出训练范围的概率截断到边界）
+
+    属性:
+        isotonic_ (IsotonicRegression): 已拟合的保序回归
+    """
+
+    def fit(self, probs: np.ndarray, y_true: np.ndarray) -> "IsotonicCalibrator":
+        self.isotonic_ = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip")
+        self.isotonic_.fit(np.asarray(probs, dtype=float), np.asarray(y_true, dtype=float))
+        return self
+
+    def predict(self, probs: np.ndarray) -> np.ndarray:
+        return self.isotonic_.predict(np.asarray(probs, dtype=float))
+
+
+_CALIBRATORS = {"platt": PlattCalibrator, "isotonic": IsotonicCalibrator}
+
+
+def make_calibrator(method: str = "platt"):
+    """按名称创建校准器（"platt" 或 "isotonic"）"""
+    if method not in _CALIBRATORS:
+        raise ValueError(f"method must be one of {sorted(_CALIBRATORS)}, got {method!r}")
+    return _CALIBRATORS[method]()
+
+
+def calibrate_oof(
+    oof: pd.DataFrame,
+    method: str = "platt",
+    prob_col: str = "prob",
+    label_col: str = "y_true",
+    fold_col: Optional[str] = "fold"
+) -> Tuple[object, pd.DataFrame]:
+    """
+    在 OOF 预测上拟合校准器
+
+    参数:
+        oof (pd.DataFrame): OOFStore.load 的输出（或含概率 / 标签 / 折编号列的表）
+        method (str): "platt" 或 "isotonic"
+        fold_col (str, optional): 折编号列；给出时按折交叉拟合 prob_calibrated，
+                                  None 时 prob_calibrated 直接由全量校准器给出（有乐观偏差）
+
+    返回:
+        (calibrator, oof):
+            calibrator: 在全部 OOF 上拟合的校准器（用于部署）
+            oof: 增加 prob_calibrated 列的副本
+    """
+    oof = oof.copy()
+    probs = oof[prob_col].to_numpy(dtype=float)
+    y_true = oof[label_col].to_numpy(dtype=int)
+
+    calibrator = make_calibrator(method).fit(probs, y_true)
+
+    if fold_col is None:
+        oof["prob_calibrated"] = calibrator.predict(probs)
+        return calibrator, oof
+
+    calibrated = np.empty(len(oof))
+    folds = oof[fold_col].to_numpy()
+    for fold in np.unique(folds):
+        in_fold = folds == fold
+        rest = ~in_fold
+        if len(np.unique(y_true[rest])) < 2:
+            # 其余折只有一个类别时无法拟合，退回全量校准器
+            calibrated[in_fold] = calibrator.predict(probs[in_fold])
+            continue
+        fold_calibrator = make_calibrator(method).fit(probs[rest], y_true[rest])
+        calibrated[in_fold] = fold_calibrator.predict(probs[in_fold])
+    oof["prob_calibrated"] = calibrated
+
+    brier_raw = np.mean((probs - y_true) ** 2)
+    brier_cal = np.mean((calibrated - y_true) ** 2)
+    print(f"[calibrate_oof] {method}: Brier {brier_raw:.4f} → {brier_cal:.4f} (交叉拟合)")
+    return calibrator, oof
+
+
+def threshold_sweep(y_true: np.ndarray, probs: np.ndarray) -> pd.DataFrame:
+    """
+    对每个唯一的概率值作为阈值（预测为阳性当且仅当 prob >= threshold）计算混淆矩阵与指标
+
+    只排序一次，O(n log n)。
+
+    返回:
+        pd.DataFrame: [threshold, tp, fp, tn, fn, precision, recall, f1, specificity, youden]，
+                      按 threshold 升序
+    """
+    y_true = np.asarray(y_true, dtype=int)
+    probs = np.asarray(probs, dtype=float)
+    if y_true.shape != probs.shape:
+        raise ValueError("y_true and probs must have the same shape")
+
+    order = np.argsort(-probs, kind="stable")
+    p_sorted = probs[order]
+    y_sorted = y_true[order]
+
+    # 每个唯一概率值的最后一个位置：阈值取该值时，它之前（含）的样本都被预测为阳性
+    last = np.r_[np.flatnonzero(np.diff(p_sorted)), len(p_sorted) - 1] if len(p_sorted) else np.array([], int)
+    tp = np.cumsum(y_sorted)[last]
+    fp = last + 1 - tp
+    n_pos = int(y_true.sum())
+    n_neg = len(y_true) - n_pos
+    fn = n_pos - tp
+    tn = n_neg - fp
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(n_pos > 0, tp / max(n_pos, 1), 0.0)
+        specificity = np.where(n_neg > 0, tn / max(n_neg, 1), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+
+    sweep = pd.DataFrame({
+        "threshold": p_sorted[last],
+        "tp": tp, "fp": fp, "tn": tn, "fn": fn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "specificity": specificity,
+        "youden": recall + specificity - 1,
+    })
+    return sweep.iloc[::-1].reset_index(drop=True)
+
+
+def select_threshold(
+    sweep: pd.DataFrame,
+    metric: str = "f1",
+    min_recall: Optional[float] = None,
+    min_specificity: Optional[float] = None
+) -> pd.Series:
+    """
+    从 threshold_sweep 的结果中选取最优阈值
+
+    参数:
+        sweep (pd.DataFrame): threshold_sweep 的输出
+        metric (str): 最大化的列（"f1"、"youden"、"precision" 等）
+        min_recall, min_specificity (float, optional): 约束条件
+
+    返回:
+        pd.Series: 最优阈值所在行（并列时取较大阈值）
+    """
+    if metric not in sweep.columns:
+        raise ValueError(f"metric must be a column of the sweep table, got {metric!r}")
+    candidates = sweep
+    if min_recall is not None:
+        candidates = candidates[candidates["recall"] >= min_recall]
+    if min_specificity is not None:
+        candidates = candidates[candidates["specificity"] >= min_specificity]
+    if candidates.empty:
+        raise ValueError("No threshold satisfies the given constraints")
+    # 升序表中取最后一个最大值 → 并列时取较大阈值
+    values = candidates[metric].to_numpy()
+    best = len(values) - 1 - int(np.argmax(values[::-1]))
+    return candidates.iloc[best]
@@ -2,7 +2,7 @@
 自定义数据集分割器 - 遵循 scikit-learn API 约定
 ==================================================
 
-本模块提供两个数据分割类，用于替代 sklearn.model_selection.train_test_split：
+本模块提供以下数据分割类，用于替代 sklearn.model_selection.train_test_split：
 
 1. PatientLevelStratifiedSplitter
    - 实现患者级别的分层70/30划分
@@ -14,6 +14,15 @@
    - 对训练集进行5折Group-Stratified交叉验证
    - 适用于需要超参数调优的场景
 
+3. RepeatedNestedPatientCV
+   - R 次重复 × K 外层折 × J 内层折的惰性折叠生成器
+   - 向量化 NumPy 排列生成折叠，按 (数据哈希, 随机种子) 记忆化
+   - 适用于多种子重复交叉验证 + 嵌套调参
+
+4. MultiLabelPatientStratifiedSplitterWithCV
+   - 在多个二元毒性终点上联合分层（迭代分层算法的数组化实现）
+   - 返回格式与 PatientLevelStratifiedSplitterWithCV 相同
+
 使用示例：
 ---------
 # 方式1: 简单的70/30划分
@@ -39,10 +48,13 @@ train_df, test_df, cv_folds = splitter_cv.split(
 日期: 2025-11-20
 """
 
+import hashlib
+import os
+
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import StratifiedShuffleSplit, StratifiedKFold
-from typing import Tuple, List, Optional, Union
+from typing import Dict, Iterator, NamedTuple, Tuple, List, Optional, Union
 
 
 class PatientLevelStratifiedSplitter:
@@ -812,6 +824,562 @@ class PatientLevelStratifiedSplitterWithCV:
         return train_df, test_df, cv_folds_indices
 
 
+# ============================================================
+# 新增: 重复 + 嵌套交叉验证折叠生成器（惰性生成 + 记忆化）
+# ============================================================
+
+class CVFold(NamedTuple):
+    """
+    单个交叉验证折叠
+
+    属性
+    ----
+    repeat : int
+        重复编号（0 开始）
+    outer_fold : int
+        外层折编号（0 开始）
+    inner_fold : int or None
+        内层折编号（0 开始）；外层折叠为 None
+    train_indices : np.ndarray
+        训练行在原始 DataFrame 中的位置索引（可直接用于 iloc）
+    val_indices : np.ndarray
+        验证行在原始 DataFrame 中的位置索引
+    """
+    repeat: int
+    outer_fold: int
+    inner_fold: Optional[int]
+    train_indices: np.ndarray
+    val_indices: np.ndarray
+
+
+# 进程内折叠分配缓存: (数据哈希, 随机种子, 外层折数, 内层折数) -> (外层分配, 内层分配)
+_FOLD_ASSIGNMENT_CACHE: Dict[Tuple[str, int, int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _stratified_fold_assignment(label_codes: np.ndarray, n_folds: int,
+                                rng: np.random.Generator) -> np.ndarray:
+    """
+    向量化的患者级分层折叠分配
+
+    先随机打乱患者顺序，再按标签稳定排序（同一类别内部保持随机顺序），
+    最后按排序后的位置对 n_folds 取模。每个类别被连续地轮流分配到各折，
+    因此各折中每个类别的数量最多相差 1。
+
+    参数
+    ----
+    label_codes : np.ndarray
+        每个患者的标签编码（整数）
+    n_folds : int
+        折数
+    rng : np.random.Generator
+        随机数生成器
+
+    返回
+    ----
+    np.ndarray
+        每个患者所属的折编号，取值 0..n_folds-1
+    """
+    n = len(label_codes)
+    perm = rng.permutation(n)
+    order = perm[np.argsort(label_codes[perm], kind="stable")]
+    folds = np.empty(n, dtype=np.int64)
+    folds[order] = np.arange(n) % n_folds
+    return folds
+
+
+class RepeatedNestedPatientCV:
+    """
+    患者级重复 + 嵌套分层交叉验证生成器
+
+    为 R 次重复 × K 个外层折 × J 个内层折惰性地生成整数行索引。
+    与 group_stratified_kfold / PatientLevelStratifiedSplitterWithCV 每次调用
+    都用 pandas sample / isin 重新计算不同，本类：
+
+    1. 只在 fit() 时提取一次患者 ID 与标签数组
+    2. 每次重复使用 NumPy 随机排列 + 稳定排序一次性得到全部患者的外层和内层折分配
+    3. 按 (数据哈希, 随机种子) 记忆化折叠分配，可选落盘到 cache_dir，
+       训练 worker 用相同参数 fit 后即可直接读取，无需重新计算
+    4. 通过 split() 生成器或 get_fold() 按需取出单个折叠
+
+    第 r 次重复使用的随机种子为 random_state + r。
+
+    参数
+    ----
+    n_repeats : int, default=10
+        重复次数 R，必须 >= 1
+    n_folds : int, default=5
+        外层折数 K，必须 >= 2
+    n_inner_folds : int, default=0
+        内层折数 J；0 表示不生成内层折叠，否则必须 >= 2
+    random_state : int, default=42
+        基础随机种子
+    cache_dir : str, optional
+        折叠分配的落盘目录（.npz），供多个进程共享；None 表示只用进程内缓存
+    verbose : bool, default=True
+        是否打印统计信息
+
+    属性
+    ----
+    patient_ids_ : np.ndarray
+        唯一患者 ID（按首次出现顺序）
+    patient_labels_ : np.ndarray
+        每个患者的标签（取该患者第一行）
+    data_hash_ : str
+        患者 ID + 标签的内容哈希，用作缓存键
+
+    示例
+    ----
+    >>> cv = RepeatedNestedPatientCV(n_repeats=50, n_folds=5, n_inner_folds=3)
+    >>> cv.fit(train_df, label_col="CRS_grade", patient_id_col="ID")
+    >>> for fold in cv.split():
+    ...     if fold.inner_fold is None:
+    ...         X_tr = train_df.iloc[fold.train_indices]
+    ...         X_va = train_df.iloc[fold.val_indices]
+    >>>
+    >>> # 在 worker 中按键取单个折叠（命中缓存，不重新计算）
+    >>> fold = cv.get_fold(repeat=7, outer_fold=2, inner_fold=1)
+    """
+
+    def __init__(
+        self,
+        n_repeats: int = 10,
+        n_folds: int = 5,
+        n_inner_folds: int = 0,
+        random_state: int = 42,
+        cache_dir: Optional[str] = None,
+        verbose: bool = True
+    ):
+        if n_repeats < 1:
+            raise ValueError(f"n_repeats must be >= 1, got {n_repeats}")
+        if n_folds < 2:
+            raise ValueError(f"n_folds must be >= 2, got {n_folds}")
+        if n_inner_folds != 0 and n_inner_folds < 2:
+            raise ValueError(f"n_inner_folds must be 0 or >= 2, got {n_inner_folds}")
+
+        self.n_repeats = n_repeats
+        self.n_folds = n_folds
+        self.n_inner_folds = n_inner_folds
+        self.random_state = random_state
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+
+        # fit 后填充
+        self.patient_ids_ = None
+        self.patient_labels_ = None
+        self.data_hash_ = None
+        self._row_codes = None
+        self._label_codes = None
+
+    def fit(self, df: pd.DataFrame, label_col: str, patient_id_col: str = "ID") -> "RepeatedNestedPatientCV":
+        """
+        提取患者 ID 与标签数组并计算数据哈希
+
+        参数
+        ----
+        df : pd.DataFrame
+            完整数据集，同一患者可以有多行
+        label_col : str
+            分层使用的标签列名
+        patient_id_col : str, default="ID"
+            患者 ID 列名
+
+        返回
+        ----
+        self
+        """
+        assert patient_id_col in df.columns, f"数据中缺少患者ID列: {patient_id_col}"
+        assert label_col in df.columns, f"数据中缺少标签列: {label_col}"
+
+        # 行 -> 患者编码；每个患者取第一行的标签
+        row_codes, patient_ids = pd.factorize(df[patient_id_col], sort=False)
+        _, first_rows = np.unique(row_codes, return_index=True)
+        patient_labels = df[label_col].to_numpy()[first_rows]
+        label_codes, _ = pd.factorize(pd.Series(patient_labels), sort=True)
+
+        self.patient_ids_ = np.asarray(patient_ids)
+        self.patient_labels_ = patient_labels
+        self._row_codes = row_codes
+        self._label_codes = label_codes
+
+        hashed = pd.util.hash_pandas_object(
+            pd.Series(label_codes, index=self.patient_ids_), index=True
+        )
+        self.data_hash_ = hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+        if self.verbose:
+            class_counts = np.bincount(label_codes[label_codes >= 0])
+            print(f"[RepeatedNestedPatientCV] {len(df)} 行, {len(self.patient_ids_)} 名患者, "
+                  f"各类别患者数: {class_counts.tolist()}")
+            print(f"  计划: {self.n_repeats} 次重复 × {self.n_folds} 外层折"
+                  + (f" × {self.n_inner_folds} 内层折" if self.n_inner_folds else "")
+                  + f" (数据哈希 {self.data_hash_})")
+            if len(class_counts) and class_counts.min() < self.n_folds:
+                print(f"  Warning: 最小类别仅 {class_counts.min()} 名患者，少于外层折数 {self.n_folds}")
+
+        return self
+
+    def _cache_path(self, seed: int) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(
+            self.cache_dir,
+            f"folds_{self.data_hash_}_seed{seed}_k{self.n_folds}_j{self.n_inner_folds}.npz"
+        )
+
+    def _assignment(self, repeat: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取第 repeat 次重复的折叠分配（内存缓存 → 磁盘缓存 → 计算）
+
+        返回
+        ----
+        outer : np.ndarray, shape (n_patients,)
+            每个患者的外层折编号
+        inner : np.ndarray, shape (n_folds, n_patients)
+            inner[k, p] 为外层折 k 的训练集中患者 p 的内层折编号；
+            患者 p 属于外层验证集（或未启用内层折叠）时为 -1
+        """
+        if self.data_hash_ is None:
+            raise RuntimeError("Must call fit() before generating folds")
+        if not 0 <= repeat < self.n_repeats:
+            raise IndexError(f"repeat must be in [0, {self.n_repeats}), got {repeat}")
+
+        seed = self.random_state + repeat
+        key = (self.data_hash_, seed, self.n_folds, self.n_inner_folds)
+        if key in _FOLD_ASSIGNMENT_CACHE:
+            return _FOLD_ASSIGNMENT_CACHE[key]
+
+        path = self._cache_path(seed)
+        if path is not None and os.path.exists(path):
+            with np.load(path) as data:
+                result = (data["outer"], data["inner"])
+            _FOLD_ASSIGNMENT_CACHE[key] = result
+            return result
+
+        rng = np.random.default_rng(seed)
+        outer = _stratified_fold_assignment(self._label_codes, self.n_folds, rng)
+        inner = np.full((self.n_folds, len(outer)), -1, dtype=np.int64)
+        if self.n_inner_folds:
+            for k in range(self.n_folds):
+                in_train = outer != k
+                inner[k, in_train] = _stratified_fold_assignment(
+                    self._label_codes[in_train], self.n_inner_folds, rng
+                )
+
+        result = (outer, inner)
+        _FOLD_ASSIGNMENT_CACHE[key] = result
+
+        if path is not None:
+            # 先写临时文件再原子替换，避免并发 worker 读到半写文件
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, outer=outer, inner=inner)
+            os.replace(tmp_path, path)
+
+        return result
+
+    def _rows(self, patient_mask: np.ndarray) -> np.ndarray:
+        """将患者级布尔掩码展开为行位置索引"""
+        return np.flatnonzero(patient_mask[self._row_codes])
+
+    def get_fold(self, repeat: int, outer_fold: int, inner_fold: Optional[int] = None) -> CVFold:
+        """
+        按键获取单个折叠
+
+        参数
+        ----
+        repeat : int
+            重复编号（0 开始）
+        outer_fold : int
+            外层折编号（0 开始）
+        inner_fold : int, optional
+            内层折编号（0 开始）；None 表示返回外层折叠
+
+        返回
+        ----
+        CVFold
+            包含训练/验证行位置索引的折叠
+        """
+        if not 0 <= outer_fold < self.n_folds:
+            raise IndexError(f"outer_fold must be in [0, {self.n_folds}), got {outer_fold}")
+        outer, inner = self._assignment(repeat)
+
+        if inner_fold is None:
+            train_mask = outer != outer_fold
+            val_mask = ~train_mask
+        else:
+            if not 0 <= inner_fold < self.n_inner_folds:
+                raise IndexError(f"inner_fold must be in [0, {self.n_inner_folds}), got {inner_fold}")
+            inner_k = inner[outer_fold]
+            val_mask = inner_k == inner_fold
+            train_mask = (inner_k >= 0) & ~val_mask
+
+        return CVFold(repeat, outer_fold, inner_fold, self._rows(train_mask), self._rows(val_mask))
+
+    def fold_keys(self) -> List[Tuple[int, int, Optional[int]]]:
+        """
+        列出所有折叠的键 (repeat, outer_fold, inner_fold)，便于分发给训练 worker
+        """
+        keys = []
+        for r in range(self.n_repeats):
+            for k in range(self.n_folds):
+                keys.append((r, k, None))
+                keys.extend((r, k, j) for j in range(self.n_inner_folds))
+        return keys
+
+    def get_n_splits(self) -> int:
+        """折叠总数（外层 + 内层）"""
+        return self.n_repeats * self.n_folds * (1 + self.n_inner_folds)
+
+    def split(self) -> Iterator[CVFold]:
+        """
+        惰性生成所有折叠
+
+        顺序为：每次重复内，依次产出外层折 k，紧接着是该外层折训练集上的
+        J 个内层折。每次重复的折叠分配在第一次访问时才计算。
+
+        产出
+        ----
+        CVFold
+        """
+        for repeat, outer_fold, inner_fold in self.fold_keys():
+            yield self.get_fold(repeat, outer_fold, inner_fold)
+
+    @staticmethod
+    def clear_cache():
+        """清空进程内的折叠分配缓存"""
+        _FOLD_ASSIGNMENT_CACHE.clear()
+
+
+# ============================================================
+# 新增: 多标签迭代分层分割器（多个毒性终点联合分层）
+# ============================================================
+
+def _allocate_by_quota(n_items: int, weights: np.ndarray) -> np.ndarray:
+    """
+    按权重把 n_items 个样本分配到各组（最大余数法），返回每组的数量
+    """
+    weights = np.clip(weights, 0, None).astype(float)
+    if weights.sum() <= 0:
+        weights = np.ones_like(weights)
+    exact = n_items * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    remainder = n_items - counts.sum()
+    if remainder > 0:
+        counts[np.argsort(-(exact - counts), kind="stable")[:remainder]] += 1
+    return counts
+
+
+def _iterative_stratification(Y: np.ndarray, proportions: np.ndarray,
+                              rng: np.random.Generator) -> np.ndarray:
+    """
+    多标签迭代分层（Sechidis et al., 2011）的批量向量化实现
+
+    原算法逐个样本分配；这里每轮取剩余正样本最少的标签，把带有该标签的
+    全部未分配患者作为一批，按各折对该标签的剩余需求量一次性按配额分配，
+    再用矩阵乘法更新所有标签的剩余需求。复杂度 O(n_labels × n_patients)，
+    全部为数组运算。
+
+    参数
+    ----
+    Y : np.ndarray, shape (n_patients, n_labels)
+        0/1 标签矩阵
+    proportions : np.ndarray, shape (n_folds,)
+        各折的目标比例（和为 1）
+    rng : np.random.Generator
+        随机数生成器
+
+    返回
+    ----
+    np.ndarray
+        每个患者所属的折编号
+    """
+    n_patients, n_labels = Y.shape
+    n_folds = len(proportions)
+
+    folds = np.full(n_patients, -1, dtype=np.int64)
+    # 各折对每个标签 / 对总样本数的剩余需求量
+    desired_labels = np.outer(proportions, Y.sum(axis=0)).astype(float)
+    desired_sizes = proportions * n_patients
+
+    perm = rng.permutation(n_patients)
+    Y_perm = Y[perm]
+    unassigned = np.ones(n_patients, dtype=bool)
+
+    for _ in range(n_labels):
+        remaining = Y_perm[unassigned].sum(axis=0)
+        remaining = np.where(remaining > 0, remaining, np.inf)
+        if np.isinf(remaining).all():
+            break
+        label = int(np.argmin(remaining))
+
+        batch = np.flatnonzero(unassigned & (Y_perm[:, label] == 1))
+        counts = _allocate_by_quota(len(batch), desired_labels[:, label])
+        batch_folds = np.repeat(np.arange(n_folds), counts)
+
+        folds[perm[batch]] = batch_folds
+        unassigned[batch] = False
+
+        onehot = np.eye(n_folds)[batch_folds]
+        desired_labels -= onehot.T @ Y_perm[batch]
+        desired_sizes -= counts
+
+    # 没有任何正标签的患者按剩余容量分配
+    rest = np.flatnonzero(unassigned)
+    counts = _allocate_by_quota(len(rest), desired_sizes)
+    folds[perm[rest]] = np.repeat(np.arange(n_folds), counts)
+
+    return folds
+
+
+class MultiLabelPatientStratifiedSplitterWithCV:
+    """
+    多标签患者级分层分割器 + 交叉验证
+
+    ToxicityBinarizer 可以一次二元化多个毒性等级（CRS、ICANS、Early/Late ICAHT、
+    Infection），而 PatientLevelStratifiedSplitterWithCV 只能按单个 label_col 分层。
+    本类用迭代分层算法（数组化实现）同时在多个二元终点上分层，使各终点的
+    阳性比例在训练/测试集及每个交叉验证折中都近似一致，从而所有毒性模型
+    可以共用一套折叠和一份缓存的特征矩阵。
+
+    split() 的返回格式与 PatientLevelStratifiedSplitterWithCV 完全相同。
+
+    参数
+    ----
+    test_size : float, default=0.3
+        测试集所占比例，范围 (0, 1)
+    n_folds : int, default=5
+        交叉验证折数，必须 >= 2
+    random_state : int, default=42
+        随机种子
+
+    示例
+    ----
+    >>> binarizer = ToxicityBinarizer(
+    ...     columns={"CRS grade": 2, "ICANS grade": 1, "Infection grade": 2},
+    ...     suffix="_binary"
+    ... )
+    >>> df_bin = binarizer.fit_transform(df)
+    >>> splitter = MultiLabelPatientStratifiedSplitterWithCV(test_size=0.3, n_folds=5)
+    >>> train_df, test_df, cv_folds = splitter.split(
+    ...     df_bin,
+    ...     label_cols=["CRS grade_binary", "ICANS grade_binary", "Infection grade_binary"],
+    ...     patient_id_col="ID"
+    ... )
+    >>> for train_idx, val_idx in cv_folds:
+    ...     X_train_fold = train_df.iloc[train_idx]
+
+    注意
+    ----
+    - 标签列应为 0/1（缺失值按 0 处理，不参与分层计数）
+    - 同一患者的多行始终落在同一集合、同一折中
+    """
+
+    def __init__(self, test_size: float = 0.3, n_folds: int = 5, random_state: int = 42):
+        if not 0 < test_size < 1:
+            raise ValueError(f"test_size must be between 0 and 1, got {test_size}")
+        if n_folds < 2:
+            raise ValueError(f"n_folds must be >= 2, got {n_folds}")
+
+        self.test_size = test_size
+        self.n_folds = n_folds
+        self.random_state = random_state
+
+    @staticmethod
+    def _patient_label_matrix(df: pd.DataFrame, label_cols: List[str],
+                              patient_id_col: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        返回 (行 -> 患者编码, 患者 × 标签 的 0/1 矩阵)，每个患者取第一行的标签
+        """
+        row_codes, _ = pd.factorize(df[patient_id_col], sort=False)
+        _, first_rows = np.unique(row_codes, return_index=True)
+        Y = (
+            df[label_cols].iloc[first_rows]
+            .apply(pd.to_numeric, errors="coerce")
+            .fillna(0)
+            .to_numpy(dtype=float)
+        )
+        return row_codes, (Y > 0).astype(np.int64)
+
+    def split(
+        self,
+        df: pd.DataFrame,
+        label_cols: Union[str, List[str], dict],
+        patient_id_col: str = "ID"
+    ) -> Tuple[pd.DataFrame, pd.DataFrame, List[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        执行多标签患者级分层划分 + 生成交叉验证索引
+
+        参数
+        ----
+        df : pd.DataFrame
+            完整数据集，同一患者可以有多行
+        label_cols : str, list or dict
+            用于联合分层的二元标签列；dict 时使用其键（兼容 ToxicityBinarizer 的 columns 配置）
+        patient_id_col : str, default="ID"
+            患者ID列名
+
+        返回
+        ----
+        train_df : pd.DataFrame
+            训练集（索引已重置）
+        test_df : pd.DataFrame
+            测试集（索引已重置）
+        cv_folds_indices : List[Tuple[np.ndarray, np.ndarray]]
+            train_df 上的 (train_indices, val_indices) 整数索引列表
+        """
+        if isinstance(label_cols, str):
+            label_cols = [label_cols]
+        elif isinstance(label_cols, dict):
+            label_cols = list(label_cols.keys())
+
+        assert patient_id_col in df.columns, f"数据中缺少患者ID列: {patient_id_col}"
+        for col in label_cols:
+            assert col in df.columns, f"数据中缺少标签列: {col}"
+
+        rng = np.random.default_rng(self.random_state)
+
+        # 阶段1: 训练/测试集划分（两组迭代分层）
+        row_codes, Y = self._patient_label_matrix(df, label_cols, patient_id_col)
+        patient_split = _iterative_stratification(
+            Y, np.array([1 - self.test_size, self.test_size]), rng
+        )
+        is_test_row = patient_split[row_codes] == 1
+
+        train_df = df[~is_test_row].copy().reset_index(drop=True)
+        test_df = df[is_test_row].copy().reset_index(drop=True)
+
+        n_train_patients = int((patient_split == 0).sum())
+        n_test_patients = int((patient_split == 1).sum())
+        print(f"训练集大小: {len(train_df)} (包含 {n_train_patients} 名患者)")
+        print(f"测试集大小: {len(test_df)} (包含 {n_test_patients} 名患者)")
+        for j, col in enumerate(label_cols):
+            print(f"  [{col}] 阳性患者: 训练 {int(Y[patient_split == 0, j].sum())}, "
+                  f"测试 {int(Y[patient_split == 1, j].sum())}")
+
+        # 阶段2: 训练集上的 K 折多标签迭代分层
+        train_row_codes, Y_train = self._patient_label_matrix(train_df, label_cols, patient_id_col)
+        patient_folds = _iterative_stratification(
+            Y_train, np.full(self.n_folds, 1.0 / self.n_folds), rng
+        )
+        row_folds = patient_folds[train_row_codes]
+
+        print(f"\n正在生成 {self.n_folds} 折多标签分层交叉验证索引...")
+        cv_folds_indices = []
+        for fold_idx in range(self.n_folds):
+            fold_train_indices = np.flatnonzero(row_folds != fold_idx)
+            fold_val_indices = np.flatnonzero(row_folds == fold_idx)
+            cv_folds_indices.append((fold_train_indices, fold_val_indices))
+
+            val_pos = Y_train[patient_folds == fold_idx].sum(axis=0).astype(int).tolist()
+            print(f"  Fold {fold_idx + 1}: "
+                  f"训练 {len(fold_train_indices)} 样本 ({int((patient_folds != fold_idx).sum())} 患者), "
+                  f"验证 {len(fold_val_indices)} 样本 ({int((patient_folds == fold_idx).sum())} 患者), "
+                  f"验证阳性 {dict(zip(label_cols, val_pos))}")
+
+        print(f"交叉验证索引生成完成! 共 {len(cv_folds_indices)} 折\n")
+        return train_df, test_df, cv_folds_indices
+
+
 # ============================================================
 # 新增: 快速验证函数 (可选, 用于测试)
 # ============================================================
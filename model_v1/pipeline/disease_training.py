@@ -0,0 +1,234 @@
+"""
+disease_training.py
+-------------------
+按疾病分区并行训练：基于 disease_partition 的输出目录
+
+背景：
+    DiseaseDataPartitioner 生成 ALL/、B-NHL/ 等分区，每个分区复制了一份
+    processed/ 动态文件；之后要为每个分区手动跑一遍训练脚本，每次都重新聚合
+    该分区的动态特征。分病种越多，总耗时线性增长。
+
+做法：
+    1. 自动发现分区：output/{疾病}/csv/{疾病}_static_data.csv，读取其中的患者ID作为成员
+    2. 整个队列的特征表只聚合一次并缓存（load_or_build_feature_table），
+       各分区按成员ID从缓存中筛选，不再读取分区内复制的 processed/ 目录
+    3. 各分区在进程池中并发训练，共享一个总的 CPU 预算：
+       并发分区数 × 每个 LightGBM 的 n_jobs ≤ n_jobs_total
+    4. 每个分区内部复用 MultiLabelPatientStratifiedSplitterWithCV + MultiEndpointTrainer
+    5. 输出一张汇总指标表 disease_metrics_summary.csv
+
+注意：
+    分区成员按原始患者ID匹配，应使用 partition_data.py 的输出，
+    而不是 reindex_patients.py 重新编号后的目录。
+
+输出目录结构：
+    output_dir/
+    ├── ALL/
+    │   ├── CRS/fold1_model.pkl ...
+    │   └── multi_endpoint_metrics.csv
+    ├── B-NHL/
+    │   └── ...
+    └── disease_metrics_summary.csv
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .data_splitters import MultiLabelPatientStratifiedSplitterWithCV
+from .feature_table import load_or_build_feature_table
+from .multi_endpoint_trainer import MultiEndpointTrainer
+from .perfect_pipeline import ToxicityBinarizer
+
+
+def discover_partitions(partition_root: str, patient_id_col: str = "ID") -> Dict[str, np.ndarray]:
+    """
+    发现 DiseaseDataPartitioner 输出的所有分区
+
+    参数:
+        partition_root (str): 分区输出根目录（含 {疾病}/csv/{疾病}_static_data.csv）
+        patient_id_col (str): 患者ID列名
+
+    返回:
+        dict: {疾病名: 成员患者ID数组}
+    """
+    partitions = {}
+    for disease_dir in sorted(Path(partition_root).iterdir()):
+        static_file = disease_dir / "csv" / f"{disease_dir.name}_static_data.csv"
+        if disease_dir.is_dir() and static_file.exists():
+            ids = pd.read_csv(static_file, usecols=[patient_id_col])[patient_id_col]
+            partitions[disease_dir.name] = ids.astype(int).to_numpy()
+    return partitions
+
+
+def _train_partition(
+    disease: str,
+    df_part: pd.DataFrame,
+    endpoints: Dict[str, str],
+    patient_id_col: str,
+    exclude_cols: List[str],
+    test_size: float,
+    n_folds: int,
+    random_state: int,
+    model_params: dict,
+    output_dir: str
+) -> pd.DataFrame:
+    """单个分区的训练任务（在子进程中执行）"""
+    print(f"\n🚀 [{disease}] {len(df_part)} patients")
+
+    splitter = MultiLabelPatientStratifiedSplitterWithCV(
+        test_size=test_size, n_folds=n_folds, random_state=random_state
+    )
+    train_df, _, cv_folds = splitter.split(df_part, list(endpoints.values()), patient_id_col)
+
+    trainer = MultiEndpointTrainer(
+        endpoints,
+        patient_id_col=patient_id_col,
+        exclude_cols=exclude_cols,
+        model_params=model_params,
+        output_dir=os.path.join(output_dir, disease)
+    )
+    metrics = trainer.fit(train_df, cv_folds)
+    metrics.insert(0, "disease", disease)
+    return metrics
+
+
+class DiseasePartitionTrainer:
+    """
+    分病种并行训练驱动器
+
+    参数:
+        cohort_static_path (str): 全队列静态表（分区前的 encoded_standardized_v2.csv）
+        dynamic_dir (str): 全队列动态目录（分区前的 processed_standardized/）
+        partition_root (str): disease_partition 输出根目录
+        output_dir (str): 模型与指标输出目录
+        label_thresholds (dict): {毒性等级列: 阈值}，用 ToxicityBinarizer 二元化为 {列}_binary
+        patient_id_col (str): 患者ID列名
+        cache_dir (str, optional): 队列特征表缓存目录，默认 output_dir/feature_cache
+        n_jobs_total (int): 总 CPU 预算
+        max_concurrent (int, optional): 最多同时训练的分区数，默认 min(分区数, n_jobs_total)
+        test_size, n_folds, random_state: 分区内的划分参数
+        model_params (dict, optional): 覆盖默认 LGBMClassifier 参数（n_jobs 由预算自动设置）
+        obs_start, obs_end (int): 动态观察窗口
+
+    示例:
+        >>> driver = DiseasePartitionTrainer(
+        ...     cohort_static_path="data_preprocessing/output/dataset/encoded_standardized_v2.csv",
+        ...     dynamic_dir="data_preprocessing/output/dataset/processed_standardized",
+        ...     partition_root="disease_partition/output",
+        ...     output_dir="./disease_CV_results",
+        ...     label_thresholds={"CRS": 2, "ICANS": 1},
+        ...     n_jobs_total=12
+        ... )
+        >>> summary = driver.run()
+    """
+
+    def __init__(
+        self,
+        cohort_static_path: str,
+        dynamic_dir: str,
+        partition_root: str,
+        output_dir: str,
+        label_thresholds: Dict[str, int],
+        patient_id_col: str = "ID",
+        cache_dir: Optional[str] = None,
+        n_jobs_total: int = 6,
+        max_concurrent: Optional[int] = None,
+        test_size: float = 0.3,
+        n_folds: int = 5,
+        random_state: int = 42,
+        model_params: Optional[dict] = None,
+        obs_start: int = -15,
+        obs_end: int = 2
+    ):
+        self.cohort_static_path = cohort_static_path
+        self.dynamic_dir = dynamic_dir
+        self.partition_root = partition_root
+        self.output_dir = output_dir
+        self.label_thresholds = label_thresholds
+        self.patient_id_col = patient_id_col
+        self.cache_dir = cache_dir or os.path.join(output_dir, "feature_cache")
+        self.n_jobs_total = n_jobs_total
+        self.max_concurrent = max_concurrent
+        self.test_size = test_size
+        self.n_folds = n_folds
+        self.random_state = random_state
+        self.model_params = model_params or {}
+        self.obs_start = obs_start
+        self.obs_end = obs_end
+
+    def run(self) -> pd.DataFrame:
+        """
+        发现分区 → 构建/读取队列特征缓存 → 并发训练 → 汇总指标
+
+        返回:
+            pd.DataFrame: 所有分区 × 终点 × 折的指标（含每个终点的均值行）
+        """
+        partitions = discover_partitions(self.partition_root, self.patient_id_col)
+        if not partitions:
+            raise FileNotFoundError(f"[DiseasePartitionTrainer] 未在 {self.partition_root} 下发现任何分区")
+        print(f"[DiseasePartitionTrainer] 发现 {len(partitions)} 个分区: "
+              f"{ {k: len(v) for k, v in partitions.items()} }")
+
+        # 1. 全队列只二元化 + 聚合一次
+        static_df = pd.read_csv(self.cohort_static_path)
+        binarizer = ToxicityBinarizer(columns=self.label_thresholds, suffix="_binary")
+        static_df = binarizer.fit_transform(static_df)
+        endpoints = {col: f"{col}_binary" for col in self.label_thresholds}
+
+        df_cohort = load_or_build_feature_table(
+            static_df, self.dynamic_dir, self.cache_dir,
+            patient_id_col=self.patient_id_col,
+            label_cols=list(endpoints.values()),
+            obs_start=self.obs_start, obs_end=self.obs_end
+        )
+        # 原始毒性等级列不能作为特征（否则终点泄漏）
+        exclude_cols = [f"s_{col}" for col in self.label_thresholds]
+
+        # 2. 分配 CPU 预算
+        n_concurrent = self.max_concurrent or min(len(partitions), self.n_jobs_total)
+        n_concurrent = max(1, min(n_concurrent, len(partitions)))
+        model_params = dict(self.model_params)
+        model_params["n_jobs"] = max(1, self.n_jobs_total // n_concurrent)
+        print(f"[DiseasePartitionTrainer] 并发分区数 {n_concurrent}, "
+              f"每个模型 n_jobs={model_params['n_jobs']}")
+
+        # 3. 并发训练各分区
+        results = []
+        cohort_ids = df_cohort[self.patient_id_col].astype(int)
+        with ProcessPoolExecutor(max_workers=n_concurrent) as executor:
+            futures = {}
+            for disease, ids in partitions.items():
+                df_part = df_cohort[cohort_ids.isin(ids)].reset_index(drop=True)
+                futures[executor.submit(
+                    _train_partition, disease, df_part, endpoints, self.patient_id_col,
+                    exclude_cols, self.test_size, self.n_folds, self.random_state,
+                    model_params, self.output_dir
+                )] = disease
+
+            for future in as_completed(futures):
+                disease = futures[future]
+                try:
+                    results.append(future.result())
+                    print(f"✅ [{disease}] 训练完成")
+                except Exception as e:
+                    print(f"⚠️ [{disease}] 训练失败: {e}")
+
+        if not results:
+            raise RuntimeError("[DiseasePartitionTrainer] 所有分区训练均失败")
+
+        # 4. 汇总
+        summary = pd.concat(results, ignore_index=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary_path = os.path.join(self.output_dir, "disease_metrics_summary.csv")
+        summary.to_csv(summary_path, index=False)
+
+        print(f"\n📊 Per-disease average metrics:")
+        print(summary[summary["fold"] == "mean"].set_index(["disease", "endpoint"])
+              [["AUC", "AUPRC", "F1", "Precision", "Recall", "Brier"]])
+        print(f"\n🎉 Summary saved to {summary_path}")
+        return summary
@@ -0,0 +1,366 @@
+"""
+feature_table.py
+----------------
+患者级特征表构建（静态 + 动态聚合）与表格预处理器
+
+功能：
+1. 动态特征聚合：Day -15 ~ +2 观察窗口内每个变量的 mean/std/min/max/slope/auc
+   （逐患者版本 aggregate_time_series + 整批向量化版本 aggregate_time_series_batch）
+2. 特征表构建：静态列加 "s_" 前缀 + 动态聚合特征 + 一个或多个标签列
+3. 特征表缓存：按 (静态表内容, 动态目录, 观察窗口) 哈希落盘，重复使用
+4. 列类型识别：数值列 / 类别列
+5. 表格预处理器：数值（中位数插补 + 标准化）+ 类别（众数插补 + OneHot）
+
+与 train_BNHL_CRS_CV_pipeline.py 中的 aggregate_time_series / build_feature_table /
+make_pipeline 逻辑一致，抽取为可复用模块，供多终点训练、分病种训练等共享。
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.integrate import trapezoid
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from .fold_statistics import PrefittedTransformer
+
+
+# ============================================================
+# 1. 单个患者的动态特征聚合
+# ============================================================
+
+def aggregate_time_series(df_ts: pd.DataFrame, obs_start: int = -15, obs_end: int = 2) -> Dict[str, float]:
+    """
+    对单个患者的动态时间序列做窗口内统计聚合
+
+    参数:
+        df_ts (pd.DataFrame): 第一列为 Day（或名为 Day），其余为测量变量
+        obs_start (int): 观察窗口起始天（包含）
+        obs_end (int): 观察窗口结束天（包含）
+
+    返回:
+        dict: {变量_mean, 变量_std, 变量_min, 变量_max, 变量_slope, 变量_auc}
+              变量在窗口内无观测值时只返回 变量_mean=NaN；观测值 <2 个时不返回 slope/auc
+    """
+    if 'Day' not in df_ts.columns:
+        df_ts = df_ts.rename(columns={df_ts.columns[0]: 'Day'})
+    df = df_ts[(df_ts['Day'] >= obs_start) & (df_ts['Day'] <= obs_end)]
+    if len(df) == 0:
+        return {}
+
+    ts_cols = [c for c in df.columns if c != 'Day']
+    features = {}
+    for col in ts_cols:
+        sub = df[['Day', col]].dropna()
+        vals = sub[col].values
+        ds = sub['Day'].values
+        prefix = f"{col}"
+        if len(vals) == 0:
+            features[f"{prefix}_mean"] = np.nan
+            continue
+        features[f"{prefix}_mean"] = np.nanmean(vals)
+        features[f"{prefix}_std"] = np.nanstd(vals)
+        features[f"{prefix}_min"] = np.nanmin(vals)
+        features[f"{prefix}_max"] = np.nanmax(vals)
+        if len(vals) >= 2:
+            slope, *_ = stats.linregress(ds, vals)
+            features[f"{prefix}_slope"] = slope
+            features[f"{prefix}_auc"] = trapezoid(vals, ds)
+    return features
+
+
+# ============================================================
+# 1b. 批量向量化动态特征聚合
+# ============================================================
+
+_DYNAMIC_STATS = ("mean", "std", "min", "max", "slope", "auc")
+
+
+def read_dynamic_batch(patient_ids: Sequence[int], dynamic_dir: str) -> pd.DataFrame:
+    """
+    读取一批患者的动态 CSV 并纵向拼接为长表
+
+    参数:
+        patient_ids (Sequence[int]): 患者ID
+        dynamic_dir (str): 动态 CSV 目录（文件名 {patient_id}.csv）
+
+    返回:
+        pd.DataFrame: 列为 [_pid, Day, 变量...]；缺失或读取失败的文件被跳过
+    """
+    frames = []
+    for pid in patient_ids:
+        dyn_path = os.path.join(dynamic_dir, f"{pid}.csv")
+        if not os.path.exists(dyn_path):
+            continue
+        try:
+            df_ts = pd.read_csv(dyn_path)
+        except Exception as e:
+            print(f"⚠️ Failed to process {pid}: {e}")
+            continue
+        if 'Day' not in df_ts.columns:
+            df_ts = df_ts.rename(columns={df_ts.columns[0]: 'Day'})
+        df_ts.insert(0, "_pid", pid)
+        frames.append(df_ts)
+    if not frames:
+        return pd.DataFrame(columns=["_pid", "Day"])
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def aggregate_time_series_batch(long_df: pd.DataFrame, obs_start: int = -15, obs_end: int = 2) -> pd.DataFrame:
+    """
+    一次性为一批患者计算与 aggregate_time_series 相同的动态特征
+
+    对 (患者 × 变量) 不再逐个调用 linregress / trapezoid，而是用分组求和得到
+    闭式解：
+        slope = (nΣdv − ΣdΣv) / (nΣd² − (Σd)²)       （仅用该变量的非缺失点）
+        auc   = Σ (d_i − d_{i−1})(v_i + v_{i−1}) / 2   （相邻两个非缺失点）
+
+    参数:
+        long_df (pd.DataFrame): read_dynamic_batch 的输出（列 _pid, Day, 变量...）
+        obs_start, obs_end (int): 观察窗口
+
+    返回:
+        pd.DataFrame: 以患者ID为索引，列为 {变量}_{mean,std,min,max,slope,auc}；
+                      与逐患者版本一致：观测值不足 2 个时 slope/auc 为 NaN，
+                      全队列都不存在的统计量列不输出
+    """
+    df = long_df[(long_df["Day"] >= obs_start) & (long_df["Day"] <= obs_end)]
+    var_cols = [c for c in df.columns if c not in ("_pid", "Day")]
+    if len(df) == 0 or not var_cols:
+        return pd.DataFrame(index=pd.Index([], name="_pid"))
+
+    pid = df["_pid"].to_numpy()
+    V = df[var_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    d = df["Day"].to_numpy(dtype=float)[:, None]
+    valid = ~np.isnan(V)
+    D = np.where(valid, d, np.nan)
+
+    g = pd.DataFrame(V, columns=var_cols).groupby(pid, sort=False)
+    n = g.count()
+    mean = g.mean()
+    std = g.std(ddof=0)
+    vmin = g.min()
+    vmax = g.max()
+
+    def _group_sum(arr):
+        return pd.DataFrame(np.where(valid, arr, 0.0), columns=var_cols).groupby(pid, sort=False).sum()
+
+    s_d = _group_sum(D)
+    s_v = _group_sum(V)
+    s_dd = _group_sum(D * D)
+    s_dv = _group_sum(D * V)
+    denom = n * s_dd - s_d ** 2
+    slope = (n * s_dv - s_d * s_v) / denom.where(denom > 1e-12)
+
+    # 上一个非缺失点（组内 ffill 后再下移一行）
+    prev_v = pd.DataFrame(V, columns=var_cols).groupby(pid, sort=False).ffill()
+    prev_d = pd.DataFrame(D, columns=var_cols).groupby(pid, sort=False).ffill()
+    prev_v = prev_v.groupby(pid, sort=False).shift(1).to_numpy()
+    prev_d = prev_d.groupby(pid, sort=False).shift(1).to_numpy()
+    segment = (D - prev_d) * (V + prev_v) / 2.0
+    auc = pd.DataFrame(np.where(np.isnan(segment), 0.0, segment), columns=var_cols).groupby(pid, sort=False).sum()
+
+    enough = n >= 2
+    has_any = n >= 1
+    stats_frames = {
+        "mean": mean,
+        "std": std.where(has_any),
+        "min": vmin,
+        "max": vmax,
+        "slope": slope.where(enough),
+        "auc": auc.where(enough),
+    }
+
+    out = pd.concat(
+        {f"{col}_{stat}": stats_frames[stat][col] for col in var_cols for stat in _DYNAMIC_STATS},
+        axis=1,
+    )
+    # 与逐患者版本保持一致：除 _mean 外，全为 NaN 的统计量列不输出
+    all_nan = out.isna().all()
+    keep = [c for c in out.columns if c.endswith("_mean") or not all_nan[c]]
+    out = out[keep]
+    out.index.name = "_pid"
+    return out
+
+
+# ============================================================
+# 2. 构建完整特征表（静态 + 动态）
+# ============================================================
+
+def build_feature_table(
+    static_df: pd.DataFrame,
+    dynamic_dir: str,
+    patient_id_col: str = "patient_id",
+    label_cols: Sequence[str] = ("label",),
+    obs_start: int = -15,
+    obs_end: int = 2,
+    static_prefix: str = "s_",
+    verbose: bool = True
+) -> pd.DataFrame:
+    """
+    构建患者级特征表
+
+    参数:
+        static_df (pd.DataFrame): 静态数据，每行一个患者
+        dynamic_dir (str): 动态 CSV 目录（文件名 {patient_id}.csv）
+        patient_id_col (str): 患者ID列名
+        label_cols (Sequence[str]): 原样保留（不加前缀、不作为特征）的标签列
+        obs_start, obs_end (int): 动态观察窗口
+        static_prefix (str): 静态特征列名前缀
+        verbose (bool): 是否打印进度
+
+    返回:
+        pd.DataFrame: [patient_id_col, *label_cols, s_静态特征..., 动态特征...]
+    """
+    if verbose:
+        print("🔹 Aggregating dynamic features...")
+
+    label_cols = [c for c in label_cols if c in static_df.columns]
+    static_df = static_df.reset_index(drop=True)
+    pids = static_df[patient_id_col].astype(int).to_numpy()
+
+    static_part = (
+        static_df.drop(columns=[patient_id_col] + label_cols)
+        .add_prefix(static_prefix)
+    )
+
+    # 整批读取 + 向量化聚合，再按患者顺序对齐
+    dyn_feats = aggregate_time_series_batch(read_dynamic_batch(pids, dynamic_dir), obs_start, obs_end)
+    dyn_feats = dyn_feats.reindex(pids)
+    dyn_feats.index = static_df.index
+
+    df_all = pd.concat(
+        [
+            pd.DataFrame({patient_id_col: pids}),
+            static_df[label_cols],
+            static_part,
+            dyn_feats,
+        ],
+        axis=1,
+    )
+
+    if verbose:
+        print(f"✅ Feature table ready: {len(df_all)} patients, {len(df_all.columns)} columns")
+    return df_all
+
+
+def _dynamic_fingerprint(patient_ids: Sequence[int], dynamic_dir: str) -> List[Tuple]:
+    """
+    动态 CSV 的文件指纹：每个患者的 (文件名, st_size, st_mtime_ns)，缺失文件记为 (文件名, None)
+    """
+    fingerprint = []
+    for pid in patient_ids:
+        name = f"{pid}.csv"
+        try:
+            stat = os.stat(os.path.join(dynamic_dir, name))
+        except FileNotFoundError:
+            fingerprint.append((name, None))
+            continue
+        fingerprint.append((name, stat.st_size, stat.st_mtime_ns))
+    return fingerprint
+
+
+def load_or_build_feature_table(
+    static_df: pd.DataFrame,
+    dynamic_dir: str,
+    cache_dir: str,
+    patient_id_col: str = "patient_id",
+    label_cols: Sequence[str] = ("label",),
+    obs_start: int = -15,
+    obs_end: int = 2
+) -> pd.DataFrame:
+    """
+    带磁盘缓存的 build_feature_table
+
+    缓存键由静态表内容、动态目录、每个患者动态 CSV 的文件指纹（文件名、大小、修改时间，
+    缺失文件单独标记）、标签列和观察窗口共同决定；任一变化都会重建。
+    整个队列只聚合一次，各疾病分区 / 各终点直接按患者ID从缓存中筛选。
+
+    参数:
+        static_df, dynamic_dir, patient_id_col, label_cols, obs_start, obs_end:
+            同 build_feature_table
+        cache_dir (str): 缓存目录（feature_table_{key}.pkl）
+
+    返回:
+        pd.DataFrame: 特征表
+    """
+    hasher = hashlib.sha1()
+    hasher.update(pd.util.hash_pandas_object(static_df, index=False).to_numpy().tobytes())
+    hasher.update(repr((os.path.abspath(dynamic_dir), patient_id_col, list(label_cols),
+                        obs_start, obs_end)).encode("utf-8"))
+    pids = static_df[patient_id_col].astype(int).to_numpy()
+    hasher.update(repr(_dynamic_fingerprint(pids, dynamic_dir)).encode("utf-8"))
+    cache_path = os.path.join(cache_dir, f"feature_table_{hasher.hexdigest()[:16]}.pkl")
+
+    if os.path.exists(cache_path):
+        df_all = pd.read_pickle(cache_path)
+        print(f"✅ Feature table loaded from cache: {cache_path} "
+              f"({len(df_all)} patients, {len(df_all.columns)} columns)")
+        return df_all
+
+    df_all = build_feature_table(static_df, dynamic_dir, patient_id_col, label_cols, obs_start, obs_end)
+    os.makedirs(cache_dir, exist_ok=True)
+    df_all.to_pickle(cache_path)
+    print(f"💾 Feature table cached: {cache_path}")
+    return df_all
+
+
+# ============================================================
+# 3. 列类型识别 + 表格预处理器
+# ============================================================
+
+def split_feature_columns(df_all: pd.DataFrame, exclude_cols: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """
+    识别特征表中的数值列和类别列
+
+    参数:
+        df_all (pd.DataFrame): 特征表
+        exclude_cols (Sequence[str]): 不作为特征的列（患者ID、所有标签列等）
+
+    返回:
+        (numeric_cols, categorical_cols)
+    """
+    exclude = set(exclude_cols)
+    numeric_cols = [c for c in df_all.select_dtypes(include=[np.number]).columns if c not in exclude]
+    categorical_cols = [c for c in df_all.columns if c not in exclude and c not in numeric_cols]
+    return numeric_cols, categorical_cols
+
+
+def build_tabular_preprocessor(
+    numeric_cols: List[str],
+    categorical_cols: List[str],
+    sparse_output: bool = False,
+    numeric_pipeline: Optional[Pipeline] = None
+) -> ColumnTransformer:
+    """
+    构建特征表的预处理器（每折只在训练集上 fit，防止泄漏）
+
+    - 数值列：中位数插补 + 标准化
+    - 类别列：众数插补 + OneHot（忽略未知类别）
+
+    默认 sparse_threshold=0 保证输出始终为稠密矩阵；
+    sparse_output=True 时输出 CSR 矩阵（OneHot 块保持稀疏，按行切片与 LightGBM 均支持）。
+    numeric_pipeline 为已拟合的数值分支（如 FoldStatistics.numeric_pipeline 的输出）时，
+    fit 只拟合类别分支。
+    """
+    if numeric_pipeline is not None:
+        num_pipe = PrefittedTransformer(numeric_pipeline)
+    else:
+        num_pipe = Pipeline([
+            ("imputer", SimpleImputer(strategy="median")),
+            ("scaler", StandardScaler())
+        ])
+    cat_pipe = Pipeline([
+        ("imputer", SimpleImputer(strategy="most_frequent")),
+        ("encoder", OneHotEncoder(handle_unknown="ignore"))
+    ])
+    return ColumnTransformer([
+        ("num", num_pipe, numeric_cols),
+        ("cat", cat_pipe, categorical_cols)
+    ], sparse_threshold=1.0 if sparse_output else 0)
@@ -0,0 +1,208 @@
+"""
+fold_ensemble.py
+----------------
+折模型集成的批量推理引擎
+
+背景：
+    run_cv_training 为每折保存 fold{i}_model.pkl（{"preprocessor", "model"}），
+    而 evaluate_BNHL_CRS_model.py 只加载一个 pipeline，并用 iterrows 逐个患者
+    重建测试特征。对整个历史队列做审计评分时，这条逐患者路径太慢。
+
+做法：
+    1. 启动时一次性加载全部折模型
+    2. 按批读取动态文件，用 aggregate_time_series_batch 向量化构建特征
+    3. 每折：FusedStaticTransform（由 preprocessor 编译）+ model.predict_proba（整批一次调用）
+    4. 输出折间概率的均值与离散度（std / min / max）
+    5. 静态表按 chunksize 分块读取，结果逐批产出 / 追加写入 CSV，
+       内存占用与患者总数无关
+
+示例：
+    >>> engine = FoldEnsemblePredictor("./BNHL_CRS_CV_results")
+    >>> for batch in engine.iter_predict("cohort_static.csv", DYNAMIC_DIR, batch_size=1000):
+    ...     print(batch.head())
+    >>> engine.predict_to_csv("cohort_static.csv", DYNAMIC_DIR, "cohort_scores.csv")
+"""
+
+import glob
+import os
+import re
+from typing import Iterator, List, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .feature_table import aggregate_time_series_batch, read_dynamic_batch
+from .fused_transform import FusedStaticTransform
+
+
+class FoldEnsemblePredictor:
+    """
+    加载一个目录下所有 fold{i}_model.pkl，并以折集成方式批量打分
+
+    参数:
+        model_dir (str): 折模型目录（run_cv_training / MultiEndpointTrainer 的输出）
+        patient_id_col (str): 静态表中的患者ID列名
+        obs_start, obs_end (int): 动态观察窗口（须与训练时一致）
+        static_prefix (str): 静态特征前缀（须与 build_feature_table 一致）
+        threshold (float): 由集成均值概率得到预测类别的阈值
+
+    属性:
+        folds_ (list): [(fold_id, preprocessor, model), ...]，按折编号排序
+        feature_names_ (list): 预处理器期望的输入特征列
+        transforms_ (list): 每折的特征变换函数（编译后的融合变换）
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        patient_id_col: str = "patient_id",
+        obs_start: int = -15,
+        obs_end: int = 2,
+        static_prefix: str = "s_",
+        threshold: float = 0.5
+    ):
+        self.model_dir = model_dir
+        self.patient_id_col = patient_id_col
+        self.obs_start = obs_start
+        self.obs_end = obs_end
+        self.static_prefix = static_prefix
+        self.threshold = threshold
+
+        self.folds_ = self._load_folds(model_dir)
+        self.feature_names_ = list(self.folds_[0][1].feature_names_in_)
+        self.transforms_ = [self._compile(preprocessor) for _, preprocessor, _ in self.folds_]
+        print(f"[FoldEnsemblePredictor] 已加载 {len(self.folds_)} 个折模型, "
+              f"{len(self.feature_names_)} 个输入特征")
+
+    @staticmethod
+    def _load_folds(model_dir: str) -> List[Tuple[int, object, object]]:
+        paths = glob.glob(os.path.join(model_dir, "fold*_model.pkl"))
+        if not paths:
+            raise FileNotFoundError(f"[FoldEnsemblePredictor] {model_dir} 下没有 fold*_model.pkl")
+
+        folds = []
+        for path in paths:
+            fold_id = int(re.search(r"fold(\d+)_model\.pkl$", path).group(1))
+            artifact = joblib.load(path)
+            folds.append((fold_id, artifact["preprocessor"], artifact["model"]))
+        return sorted(folds, key=lambda f: f[0])
+
+    @staticmethod
+    def _compile(preprocessor):
+        # 与 MultiEndpointTrainer 训练时一致的 float32 融合变换；不支持的预处理器回退到 sklearn
+        try:
+            return FusedStaticTransform.from_column_transformer(preprocessor).transform
+        except (NotImplementedError, AttributeError):
+            return preprocessor.transform
+
+    def build_features(self, static_df: pd.DataFrame, dynamic_dir: str) -> pd.DataFrame:
+        """
+        为一批患者构建与训练一致的输入特征（静态加前缀 + 向量化动态聚合）
+
+        返回:
+            pd.DataFrame: 列严格对齐 feature_names_（缺失的特征为 NaN）
+        """
+        pids = static_df[self.patient_id_col].astype(int).to_numpy()
+        static_part = static_df.drop(columns=[self.patient_id_col]).add_prefix(self.static_prefix)
+        static_part.index = pids
+
+        dyn = aggregate_time_series_batch(
+            read_dynamic_batch(pids, dynamic_dir), self.obs_start, self.obs_end
+        ).reindex(pids)
+
+        X = pd.concat([static_part, dyn], axis=1)
+        X = X.loc[:, ~X.columns.duplicated()]
+        return X.reindex(columns=self.feature_names_)
+
+    def predict_features(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        对已构建的特征矩阵做折集成预测
+
+        返回:
+            np.ndarray, shape (n_patients, n_folds): 每折的阳性概率
+        """
+        X = X.reindex(columns=self.feature_names_)
+        probs = np.empty((len(X), len(self.folds_)))
+        for j, (_, _, model) in enumerate(self.folds_):
+            probs[:, j] = model.predict_proba(self.transforms_[j](X))[:, 1]
+        return probs
+
+    def _summarize(self, pids: np.ndarray, fold_probs: np.ndarray) -> pd.DataFrame:
+        out = pd.DataFrame({self.patient_id_col: pids})
+        out["prob_mean"] = fold_probs.mean(axis=1)
+        out["prob_std"] = fold_probs.std(axis=1)
+        out["prob_min"] = fold_probs.min(axis=1)
+        out["prob_max"] = fold_probs.max(axis=1)
+        out["prediction"] = (out["prob_mean"] >= self.threshold).astype(int)
+        for j, (fold_id, _, _) in enumerate(self.folds_):
+            out[f"fold{fold_id}_prob"] = fold_probs[:, j]
+        return out
+
+    def predict_batch(self, static_df: pd.DataFrame, dynamic_dir: str) -> pd.DataFrame:
+        """
+        对一批患者打分
+
+        参数:
+            static_df (pd.DataFrame): 静态数据（可以包含标签列，会被预处理器忽略）
+            dynamic_dir (str): 动态 CSV 目录
+
+        返回:
+            pd.DataFrame: [patient_id, prob_mean, prob_std, prob_min, prob_max, prediction, fold{i}_prob...]
+        """
+        X = self.build_features(static_df, dynamic_dir)
+        return self._summarize(static_df[self.patient_id_col].to_numpy(), self.predict_features(X))
+
+    def iter_predict(
+        self,
+        static: Union[str, pd.DataFrame],
+        dynamic_dir: str,
+        batch_size: int = 1000
+    ) -> Iterator[pd.DataFrame]:
+        """
+        流式打分：逐批产出结果
+
+        参数:
+            static (str or pd.DataFrame): 静态表路径（按 chunksize 分块读取）或 DataFrame
+            dynamic_dir (str): 动态 CSV 目录
+            batch_size (int): 每批患者数
+
+        产出:
+            pd.DataFrame: 每批的打分结果
+        """
+        if isinstance(static, str):
+            chunks = pd.read_csv(static, chunksize=batch_size)
+        else:
+            chunks = (static.iloc[i:i + batch_size] for i in range(0, len(static), batch_size))
+
+        n_done = 0
+        for chunk in chunks:
+            result = self.predict_batch(chunk, dynamic_dir)
+            n_done += len(result)
+            print(f"[FoldEnsemblePredictor] 已打分 {n_done} 名患者")
+            yield result
+
+    def predict_to_csv(
+        self,
+        static: Union[str, pd.DataFrame],
+        dynamic_dir: str,
+        output_path: str,
+        batch_size: int = 1000
+    ) -> int:
+        """
+        流式打分并追加写入 CSV
+
+        返回:
+            int: 打分的患者总数
+        """
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+        n_total = 0
+        for i, result in enumerate(self.iter_predict(static, dynamic_dir, batch_size)):
+            result.to_csv(output_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            n_total += len(result)
+
+        print(f"✅ Scores saved: {output_path} ({n_total} patients)")
+        return n_total
@@ -0,0 +1,208 @@
+"""
+fold_statistics.py
+------------------
+一次性计算所有 CV 折训练集的插补 / 标准化统计量
+
+背景：
+    每一折都在高度重叠的训练子集上从头拟合 SimpleImputer(strategy="median")
+    与 StandardScaler。中位数需要逐列排序，K 折就排序 K 次；
+    在重复 / 嵌套 CV 中，这些重复拟合是预处理耗时的主要部分。
+
+做法：
+    1. 每列只排序一次（NaN 排在最后），各折的中位数由“折成员掩码在排序后的累计计数”
+       直接定位第 ⌈n/2⌉ 与 ⌊n/2⌋+1 个有效值得到
+    2. 折成员矩阵 F（K × n）与（按全体均值平移后的）数值矩阵做矩阵乘法，
+       一次得到所有折的有效值个数、和、平方和；再代入中位数插补后的缺失个数，
+       得到 StandardScaler 在插补后数据上的均值与方差
+    3. 按折产出已拟合的 SimpleImputer / StandardScaler / Pipeline，
+       统计量只来自该折训练行（无泄漏），与 sklearn 逐折 fit 的结果一致
+       （训练时全缺失的列同样被插补器丢弃）
+    4. PrefittedTransformer 包装已拟合的 Pipeline，放入 ColumnTransformer 后
+       fit 不会重新拟合（clone 返回自身）
+
+示例：
+    >>> stats = compute_fold_statistics(df_all[numeric_cols], [tr for tr, _ in cv_folds])
+    >>> num_pipe = stats.numeric_pipeline(0)            # 第 1 折的 imputer + scaler
+    >>> preprocessor = build_tabular_preprocessor(numeric_cols, categorical_cols,
+    ...                                           numeric_pipeline=num_pipe)
+"""
+
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+class PrefittedTransformer(BaseEstimator, TransformerMixin):
+    """
+    已拟合变换器的包装：fit 为空操作，transform 直接委托
+
+    ColumnTransformer 在 fit 时会 clone 每个子变换器，这里让 clone 返回自身，
+    从而保留预先计算的统计量。
+
+    参数:
+        estimator: 已拟合的 sklearn 变换器（如 FoldStatistics.numeric_pipeline 的输出）
+    """
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def __sklearn_clone__(self):
+        return self
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return self.estimator.transform(X)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.estimator.get_feature_names_out(input_features)
+
+
+class FoldStatistics:
+    """
+    compute_fold_statistics 的结果
+
+    属性:
+        columns (list): 列名
+        medians (np.ndarray, K × p): 每折训练集的中位数（全缺失为 NaN）
+        means (np.ndarray, K × p): 中位数插补后的均值
+        variances (np.ndarray, K × p): 中位数插补后的方差（ddof=0，与 StandardScaler 一致）
+        n_samples (np.ndarray, K): 每折训练样本数
+    """
+
+    def __init__(self, columns, medians, means, variances, n_samples):
+        self.columns = list(columns)
+        self.medians = medians
+        self.means = means
+        self.variances = variances
+        self.n_samples = n_samples
+        self._col_index = {col: j for j, col in enumerate(self.columns)}
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.n_samples)
+
+    def _select(self, columns: Optional[Sequence[str]]) -> np.ndarray:
+        if columns is None:
+            return np.arange(len(self.columns))
+        return np.array([self._col_index[col] for col in columns], dtype=int)
+
+    def imputer(self, fold: int, columns: Optional[Sequence[str]] = None) -> SimpleImputer:
+        """第 fold 折（从 0 开始）的已拟合 SimpleImputer(strategy="median")"""
+        idx = self._select(columns)
+        names = [self.columns[j] for j in idx]
+        # 在一行“中位数”数据上 fit：statistics_ 恰好等于各折中位数，其余内部状态由 sklearn 设置
+        imputer = SimpleImputer(strategy="median")
+        imputer.fit(pd.DataFrame(self.medians[fold, idx][None, :], columns=names))
+        return imputer
+
+    def scaler(self, fold: int, columns: Optional[Sequence[str]] = None) -> StandardScaler:
+        """第 fold 折的已拟合 StandardScaler（只包含该折未被插补器丢弃的列）"""
+        idx = self._select(columns)
+        idx = idx[~np.isnan(self.medians[fold, idx])]
+        mean = self.means[fold, idx]
+        var = self.variances[fold, idx]
+        n = self.n_samples[fold]
+
+        scaler = StandardScaler()
+        scaler.fit(np.zeros((1, len(idx))))
+        # 与 sklearn 的 _is_constant_feature 相同的常量判定
+        eps = np.finfo(np.float64).eps
+        constant = var <= n * eps * var + (n * mean * eps) ** 2
+        scaler.mean_ = mean.copy()
+        scaler.var_ = var.copy()
+        scaler.scale_ = np.where(constant, 1.0, np.sqrt(var))
+        scaler.n_samples_seen_ = int(n)
+        return scaler
+
+    def numeric_pipeline(self, fold: int, columns: Optional[Sequence[str]] = None) -> Pipeline:
+        """第 fold 折的已拟合 imputer + scaler（与 build_tabular_preprocessor 的数值分支相同）"""
+        return Pipeline([
+            ("imputer", self.imputer(fold, columns)),
+            ("scaler", self.scaler(fold, columns))
+        ])
+
+
+def _fold_masks(train_sets, n: int) -> np.ndarray:
+    masks = np.zeros((len(train_sets), n), dtype=bool)
+    for k, rows in enumerate(train_sets):
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            masks[k] = rows
+        else:
+            masks[k, rows] = True
+    return masks
+
+
+def compute_fold_statistics(
+    X: Union[pd.DataFrame, np.ndarray],
+    train_sets: Union[np.ndarray, List[np.ndarray]],
+    columns: Optional[Sequence[str]] = None
+) -> FoldStatistics:
+    """
+    一次性计算所有折训练集的中位数，以及中位数插补后的均值与方差
+
+    参数:
+        X (pd.DataFrame or np.ndarray): 数值特征矩阵（n × p）
+        train_sets: 每折训练集的行位置索引列表，或 K × n 的布尔掩码
+        columns (list, optional): X 为 ndarray 时的列名
+
+    返回:
+        FoldStatistics
+    """
+    if isinstance(X, pd.DataFrame):
+        columns = list(X.columns)
+        A = X.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        A = np.asarray(X, dtype=np.float64)
+        columns = list(columns) if columns is not None else list(range(A.shape[1]))
+
+    n, p = A.shape
+    masks = _fold_masks(train_sets, n)
+    n_folds = len(masks)
+    valid = ~np.isnan(A)
+
+    # 1. 中位数：每列排序一次，各折用累计计数定位中间位置
+    order = np.argsort(A, axis=0, kind="stable")
+    A_sorted = np.take_along_axis(A, order, axis=0)
+    valid_sorted = np.take_along_axis(valid, order, axis=0)
+    cols = np.arange(p)
+
+    medians = np.full((n_folds, p), np.nan)
+    for k in range(n_folds):
+        counts = np.cumsum(masks[k][order] & valid_sorted, axis=0, dtype=np.int32)
+        total = counts[-1] if n else np.zeros(p, dtype=np.int32)
+        has_values = total > 0
+        lo = np.argmax(counts >= ((total + 1) // 2)[None, :], axis=0)
+        hi = np.argmax(counts >= (total // 2 + 1)[None, :], axis=0)
+        med = (A_sorted[lo, cols] + A_sorted[hi, cols]) / 2
+        medians[k, has_values] = med[has_values]
+
+    # 2. 均值 / 方差：折成员矩阵乘法（先按全体均值平移，减小相消误差）
+    shift = np.where(valid, A, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    centered = np.where(valid, A - shift, 0.0)
+    F = masks.astype(np.float64)
+
+    n_samples = masks.sum(axis=1)
+    n_valid = F @ valid.astype(np.float64)
+    s1 = F @ centered
+    s2 = F @ (centered ** 2)
+
+    # 缺失值被中位数填充后对和与平方和的贡献
+    fill = np.nan_to_num(medians - shift)
+    n_missing = n_samples[:, None] - n_valid
+    s1 = s1 + n_missing * fill
+    s2 = s2 + n_missing * fill ** 2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_c = s1 / n_samples[:, None]
+        variances = np.maximum(s2 / n_samples[:, None] - mean_c ** 2, 0.0)
+    means = mean_c + shift
+
+    return FoldStatistics(columns, medians, means, variances, n_samples)
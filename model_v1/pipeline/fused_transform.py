@@ -0,0 +1,238 @@
+"""
+fused_transform.py
+------------------
+将已拟合的静态 ColumnTransformer 编译为单次融合变换
+
+背景：
+    FullPreprocessor.static_transformer 与 build_tabular_preprocessor 都是
+    SimpleImputer → StandardScaler / OneHotEncoder / OrdinalEncoder 的多段 sklearn Pipeline，
+    每一段都会分配中间数组，ColumnTransformer 最后再 hstack 一次，
+    FullPreprocessor.transform 又与动态块 hstack 一次。CV 循环与在线推理中这些复制反复发生。
+
+做法：
+    1. compile 时从各个已拟合步骤中取出常量：
+       - 数值块：插补值向量、均值向量、尺度向量
+       - OneHot 块：每列的类别查找表（pd.Index）与输出偏移
+       - Ordinal 块：每列的类别查找表
+    2. transform 时按块直接写入一个预分配的输出矩阵（默认 float32）：
+       数值块原地插补与标准化，类别块用 get_indexer 查表后置 1 / 写编码
+    3. 可传入 out（例如更大矩阵的一个切片），静态与动态特征共用同一块内存
+
+支持的步骤：
+    SimpleImputer（missing_values=NaN，不支持 add_indicator）、StandardScaler、
+    OneHotEncoder（drop=None，无 infrequent 类别）、OrdinalEncoder、"passthrough"，
+    以及包装上述 Pipeline 的 PrefittedTransformer。
+    ColumnTransformer 的 remainder 支持 "drop" 与 "passthrough"（数值列）。
+    其他步骤会在 compile 时抛出 NotImplementedError，调用方应回退到 sklearn 的 transform。
+
+示例：
+    >>> fused = FusedStaticTransform.from_column_transformer(preprocessor)
+    >>> X_t = fused.transform(X_val)              # float32, shape (n, fused.n_features_out_)
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+
+from .fold_statistics import PrefittedTransformer
+
+
+class _NumericBlock:
+    """插补 + 标准化（两者均可省略）"""
+
+    def __init__(self, cols, fill=None, mean=None, scale=None):
+        self.cols = cols
+        self.fill = fill
+        self.mean = mean
+        self.scale = scale
+        self.width = len(cols)
+
+    def write(self, X: pd.DataFrame, out: np.ndarray):
+        values = X[self.cols].to_numpy(dtype=np.float64, copy=True)
+        if self.fill is not None:
+            np.copyto(values, np.broadcast_to(self.fill, values.shape), where=np.isnan(values))
+        if self.mean is not None:
+            values -= self.mean
+        if self.scale is not None:
+            values /= self.scale
+        out[:] = values
+
+
+class _OneHotBlock:
+    """插补 + OneHot：每列一个类别查找表"""
+
+    def __init__(self, cols, fill, categories, handle_unknown):
+        self.cols = cols
+        self.fill = fill
+        self.lookups = [pd.Index(cats) for cats in categories]
+        self.offsets = np.cumsum([0] + [len(cats) for cats in categories[:-1]])
+        self.handle_unknown = handle_unknown
+        self.width = int(sum(len(cats) for cats in categories))
+
+    def write(self, X: pd.DataFrame, out: np.ndarray):
+        out[:] = 0
+        rows = np.arange(len(X))
+        for j, col in enumerate(self.cols):
+            values = X[col]
+            if self.fill is not None:
+                values = values.where(values.notna(), self.fill[j])
+            codes = self.lookups[j].get_indexer(values)
+            known = codes >= 0
+            if not known.all() and self.handle_unknown == "error":
+                raise ValueError(f"Found unknown categories {list(values[~known].unique())} in column {col!r}")
+            out[rows[known], self.offsets[j] + codes[known]] = 1
+
+
+class _OrdinalBlock:
+    """插补 + Ordinal 编码"""
+
+    def __init__(self, cols, fill, categories, unknown_value):
+        self.cols = cols
+        self.fill = fill
+        self.lookups = [pd.Index(cats) for cats in categories]
+        self.unknown_value = unknown_value
+        self.width = len(cols)
+
+    def write(self, X: pd.DataFrame, out: np.ndarray):
+        for j, col in enumerate(self.cols):
+            values = X[col]
+            if self.fill is not None:
+                values = values.where(values.notna(), self.fill[j])
+            codes = self.lookups[j].get_indexer(values).astype(np.float64)
+            unknown = codes < 0
+            if unknown.any():
+                if self.unknown_value is None:
+                    raise ValueError(f"Found unknown categories {list(values[unknown].unique())} in column {col!r}")
+                codes[unknown] = self.unknown_value
+            out[:, j] = codes
+
+
+def _compile_entry(cols: List[str], steps: list):
+    """将 ColumnTransformer 的一项（列 + 步骤序列）编译为一个块"""
+    # remainder="passthrough" 在较新的 sklearn 中是一个恒等 FunctionTransformer
+    steps = [s for s in steps
+             if not (isinstance(s, str) and s == "passthrough")
+             and not (isinstance(s, FunctionTransformer) and s.func is None)]
+    fill = None
+
+    if steps and isinstance(steps[0], SimpleImputer):
+        imputer = steps.pop(0)
+        if imputer.add_indicator or not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+            raise NotImplementedError("SimpleImputer with add_indicator or non-NaN missing_values is not supported")
+
+        stats = imputer.statistics_
+        if stats.dtype.kind == "f":
+            empty = np.isnan(stats)
+        else:
+            empty = pd.isna(stats)
+        if empty.any() and not imputer.keep_empty_features:
+            # SimpleImputer 会丢弃训练时全缺失的列
+            cols = [c for c, e in zip(cols, empty) if not e]
+            stats = stats[~empty]
+        elif empty.any():
+            stats = np.where(empty, 0, stats)
+        fill = stats
+
+    if not steps:
+        return _NumericBlock(cols, fill=None if fill is None else fill.astype(np.float64))
+
+    if len(steps) > 1:
+        raise NotImplementedError(f"Unsupported step sequence: {[type(s).__name__ for s in steps]}")
+    step = steps[0]
+
+    if isinstance(step, StandardScaler):
+        return _NumericBlock(
+            cols,
+            fill=None if fill is None else fill.astype(np.float64),
+            mean=step.mean_ if step.with_mean else None,
+            scale=step.scale_ if step.with_std else None
+        )
+
+    if isinstance(step, OneHotEncoder):
+        if step.drop_idx_ is not None or getattr(step, "_infrequent_enabled", False):
+            raise NotImplementedError("OneHotEncoder with drop or infrequent categories is not supported")
+        return _OneHotBlock(cols, fill, step.categories_, step.handle_unknown)
+
+    if isinstance(step, OrdinalEncoder):
+        unknown_value = step.unknown_value if step.handle_unknown == "use_encoded_value" else None
+        return _OrdinalBlock(cols, fill, step.categories_, unknown_value)
+
+    raise NotImplementedError(f"Unsupported transformer: {type(step).__name__}")
+
+
+class FusedStaticTransform:
+    """
+    已拟合 ColumnTransformer 的融合版本
+
+    参数:
+        blocks (list): 按输出顺序排列的已编译块
+        dtype: 输出矩阵的数据类型（默认 float32）
+
+    属性:
+        n_features_out_ (int): 输出列数（与 ColumnTransformer.transform 一致）
+    """
+
+    def __init__(self, blocks: list, dtype=np.float32):
+        self.blocks = blocks
+        self.dtype = dtype
+        self.n_features_out_ = int(sum(b.width for b in blocks))
+
+    @classmethod
+    def from_column_transformer(cls, ct: ColumnTransformer, dtype=np.float32) -> "FusedStaticTransform":
+        """
+        从已拟合的 ColumnTransformer 编译
+
+        异常:
+            NotImplementedError: 含有不支持的步骤
+        """
+        names_in = list(ct.feature_names_in_)
+        blocks = []
+        for name, trans, cols in ct.transformers_:
+            if isinstance(trans, str) and trans == "drop":
+                continue
+            cols = [names_in[c] if isinstance(c, (int, np.integer)) else c for c in cols]
+            if len(cols) == 0:
+                continue
+            if isinstance(trans, PrefittedTransformer):
+                trans = trans.estimator
+            steps = [s for _, s in trans.steps] if isinstance(trans, Pipeline) else [trans]
+            blocks.append(_compile_entry(cols, steps))
+
+        fused = cls(blocks, dtype=dtype)
+        try:
+            expected = len(ct.get_feature_names_out())
+        except Exception:
+            expected = fused.n_features_out_
+        if expected != fused.n_features_out_:
+            raise NotImplementedError(
+                f"Compiled width {fused.n_features_out_} does not match ColumnTransformer output {expected}"
+            )
+        return fused
+
+    def transform(self, X: pd.DataFrame, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        对 X 做融合变换
+
+        参数:
+            X (pd.DataFrame): 输入数据（列名与拟合时一致）
+            out (np.ndarray, optional): 预分配的输出，shape (len(X), n_features_out_)，
+                                        可以是更大矩阵的列切片
+
+        返回:
+            np.ndarray: out
+        """
+        if out is None:
+            out = np.empty((len(X), self.n_features_out_), dtype=self.dtype)
+        elif out.shape != (len(X), self.n_features_out_):
+            raise ValueError(f"out must have shape {(len(X), self.n_features_out_)}, got {out.shape}")
+
+        start = 0
+        for block in self.blocks:
+            block.write(X, out[:, start:start + block.width])
+            start += block.width
+        return out
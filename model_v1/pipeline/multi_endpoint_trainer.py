@@ -0,0 +1,314 @@
+"""
+multi_endpoint_trainer.py
+-------------------------
+多终点联合交叉验证训练：共享一份特征表与一套折叠
+
+背景：
+    以往对 CRS、ICANS、ICAHT、Infection 分别重跑 train_BNHL_CRS_CV_pipeline.py，
+    每次都要重新读取静态表、聚合动态特征、拟合预处理器。这些步骤与终点无关，
+    却占据了绝大部分耗时。
+
+做法：
+    1. 特征表（build_feature_table）只构建一次
+    2. 所有折的数值插补 / 标准化统计量由 compute_fold_statistics 一次性算出，
+       每折的预处理器只需在该折训练集上 fit 类别分支，编译为 FusedStaticTransform 后
+       训练/验证矩阵各 transform 一次（float32，无中间数组）
+    3. 在同一对矩阵上为每个终点各训练一个 LightGBM
+    N 个终点的总耗时接近单终点的耗时（只多出 N 次模型拟合）。
+    4. 可选：OOF 预测按实验哈希写入 OOFStore，之后校准 / 调阈值无需重新训练
+
+输出目录结构：
+    output_dir/
+    ├── CRS/
+    │   ├── fold1_model.pkl          # {"preprocessor", "model"}，与 run_cv_training 一致
+    │   ├── ...
+    │   └── cv_metrics_summary.csv
+    ├── ICANS/
+    │   └── ...
+    └── multi_endpoint_metrics.csv   # 所有终点 × 折的指标长表
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import (
+    roc_auc_score, average_precision_score, f1_score,
+    precision_score, recall_score, brier_score_loss
+)
+
+from .feature_table import build_tabular_preprocessor, split_feature_columns
+from .fold_statistics import compute_fold_statistics
+from .fused_transform import FusedStaticTransform
+from .oof_store import OOFStore, experiment_hash
+from .perfect_pipeline import ConstantColumnDropper
+
+
+# fit() 返回的指标表的列
+METRIC_COLUMNS = ["endpoint", "fold", "AUC", "AUPRC", "F1", "Precision", "Recall", "Brier",
+                  "Train_pos", "Val_pos"]
+
+
+def compute_binary_metrics(y_true: np.ndarray, probs: np.ndarray, threshold: float = 0.5) -> Dict[str, float]:
+    """
+    计算二分类指标（AUC、AUPRC、F1、Precision、Recall、Brier）
+
+    验证集中只有一个类别时 AUC / AUPRC 记为 NaN。
+    """
+    preds = (probs >= threshold).astype(int)
+    has_both = len(np.unique(y_true)) == 2
+    return {
+        "AUC": roc_auc_score(y_true, probs) if has_both else np.nan,
+        "AUPRC": average_precision_score(y_true, probs) if has_both else np.nan,
+        "F1": f1_score(y_true, preds, zero_division=0),
+        "Precision": precision_score(y_true, preds, zero_division=0),
+        "Recall": recall_score(y_true, preds, zero_division=0),
+        "Brier": brier_score_loss(y_true, probs),
+    }
+
+
+class MultiEndpointTrainer:
+    """
+    多终点 LightGBM 交叉验证训练器
+
+    参数:
+        endpoints (dict): {终点名: 特征表中的二元标签列}
+                          例如 {"CRS": "CRS grade_binary", "ICANS": "ICANS grade_binary"}
+        patient_id_col (str): 患者ID列名
+        exclude_cols (list, optional): 其他不作为特征的列（如原始毒性等级列，防止终点之间互相泄漏）
+        model_params (dict, optional): 覆盖默认的 LGBMClassifier 参数
+        early_stopping_rounds (int): 早停轮数（以验证折 AUC 为准）
+        pruner_params (dict, optional): 传给 ConstantColumnDropper 的参数（如
+                              {"variance_threshold": 1e-8, "corr_threshold": 0.95}），
+                              每折只在训练集上识别并删除近常量 / 高相关列；None 表示不剪枝
+        sparse_output (bool): True 时每折特征矩阵为 float32 CSR（OneHot 块不稠密化）；
+                              默认为 FusedStaticTransform 输出的稠密 float32
+        output_dir (str, optional): 模型与指标输出目录；None 时不落盘
+        oof_store (str or OOFStore, optional): OOF 预测的持久化目录 / 存储；None 时只保留在内存
+
+    属性:
+        fold_metrics_ (pd.DataFrame): 每个终点 × 折的指标
+        oof_probs_ (dict): {终点: OOF 预测概率数组}（标签缺失的行为 NaN）
+        oof_folds_ (np.ndarray): 每行所在的验证折编号（未覆盖为 -1）
+        experiment_key_ (str): 实验哈希（配置 + 特征表 + 折叠），即 OOFStore 中的键
+
+    示例:
+        >>> df_all = build_feature_table(static_df, DYNAMIC_DIR, "ID",
+        ...                              label_cols=list(endpoints.values()))
+        >>> trainer = MultiEndpointTrainer(endpoints, patient_id_col="ID",
+        ...                                exclude_cols=RAW_GRADE_COLS,
+        ...                                output_dir="./multi_endpoint_CV_results")
+        >>> metrics = trainer.fit(df_all, cv_folds)
+    """
+
+    def __init__(
+        self,
+        endpoints: Dict[str, str],
+        patient_id_col: str = "patient_id",
+        exclude_cols: Optional[List[str]] = None,
+        model_params: Optional[dict] = None,
+        early_stopping_rounds: int = 50,
+        pruner_params: Optional[dict] = None,
+        sparse_output: bool = False,
+        output_dir: Optional[str] = None,
+        oof_store: Optional[Union[str, OOFStore]] = None
+    ):
+        if not endpoints:
+            raise ValueError("[MultiEndpointTrainer] endpoints 不能为空")
+
+        self.endpoints = endpoints
+        self.patient_id_col = patient_id_col
+        self.exclude_cols = exclude_cols or []
+        self.model_params = model_params or {}
+        self.early_stopping_rounds = early_stopping_rounds
+        self.pruner_params = pruner_params
+        self.sparse_output = sparse_output
+        self.output_dir = output_dir
+        self.oof_store = OOFStore(oof_store) if isinstance(oof_store, str) else oof_store
+
+        self.fold_metrics_ = None
+        self.oof_probs_ = None
+        self.oof_folds_ = None
+        self.experiment_key_ = None
+
+    def _make_model(self, y_train: np.ndarray):
+        from lightgbm import LGBMClassifier
+
+        pos = y_train.sum()
+        neg = len(y_train) - pos
+        params = dict(
+            n_estimators=1000,
+            learning_rate=0.03,
+            random_state=42,
+            n_jobs=6,
+            objective="binary",
+            scale_pos_weight=neg / max(pos, 1),
+            verbose=-1,
+        )
+        params.update(self.model_params)
+        return LGBMClassifier(**params)
+
+    def fit(self, df_all: pd.DataFrame, cv_folds: List[Tuple[np.ndarray, np.ndarray]]) -> pd.DataFrame:
+        """
+        在共享的特征表与折叠上训练所有终点
+
+        参数:
+            df_all (pd.DataFrame): 特征表（含所有终点标签列）
+            cv_folds (list): [(train_indices, val_indices), ...]，df_all 的行位置索引
+                             （PatientLevelStratifiedSplitterWithCV /
+                              MultiLabelPatientStratifiedSplitterWithCV 的输出格式）
+
+        返回:
+            pd.DataFrame: 每个终点 × 折的指标 + 每个终点的均值行
+        """
+        from lightgbm import early_stopping
+
+        label_cols = list(self.endpoints.values())
+        missing = [c for c in label_cols if c not in df_all.columns]
+        if missing:
+            raise ValueError(f"[MultiEndpointTrainer] 特征表中缺少标签列: {missing}")
+
+        exclude = [self.patient_id_col] + label_cols + list(self.exclude_cols)
+        numeric_cols, categorical_cols = split_feature_columns(df_all, exclude)
+        X_all = df_all[numeric_cols + categorical_cols]
+        Y_all = df_all[label_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+        print(f"[MultiEndpointTrainer] {len(self.endpoints)} 个终点, {len(cv_folds)} 折, "
+              f"{len(numeric_cols)} 数值列 + {len(categorical_cols)} 类别列")
+
+        oof_probs = {name: np.full(len(df_all), np.nan) for name in self.endpoints}
+        oof_folds = np.full(len(df_all), -1, dtype=np.int64)
+        records = []
+
+        # 所有折的中位数 / 均值 / 方差一次算出（每折只用其训练行）
+        fold_stats = compute_fold_statistics(X_all[numeric_cols], [train_idx for train_idx, _ in cv_folds])
+
+        for i, (train_idx, val_idx) in enumerate(cv_folds, 1):
+            # 每折预处理只做一次，所有终点共享
+            fold_numeric, fold_categorical = numeric_cols, categorical_cols
+            if self.pruner_params is not None:
+                # 只在该折训练集上识别冗余列
+                pruner = ConstantColumnDropper(**self.pruner_params).fit(X_all.iloc[train_idx])
+                dropped = set(pruner.drop_cols_)
+                fold_numeric = [c for c in numeric_cols if c not in dropped]
+                fold_categorical = [c for c in categorical_cols if c not in dropped]
+
+            preprocessor = build_tabular_preprocessor(
+                fold_numeric, fold_categorical, self.sparse_output,
+                numeric_pipeline=fold_stats.numeric_pipeline(i - 1, fold_numeric)
+            )
+            if self.sparse_output:
+                X_train_t = preprocessor.fit_transform(X_all.iloc[train_idx]).astype(np.float32)
+                X_val_t = preprocessor.transform(X_all.iloc[val_idx]).astype(np.float32)
+            else:
+                preprocessor.fit(X_all.iloc[train_idx])
+                fused = FusedStaticTransform.from_column_transformer(preprocessor)
+                X_train_t = fused.transform(X_all.iloc[train_idx])
+                X_val_t = fused.transform(X_all.iloc[val_idx])
+
+            oof_folds[val_idx] = i
+            for j, name in enumerate(self.endpoints):
+                y_train = Y_all[train_idx, j]
+                y_val = Y_all[val_idx, j]
+                train_ok = ~np.isnan(y_train)
+                val_ok = ~np.isnan(y_val)
+                y_train = y_train[train_ok].astype(int)
+                y_val = y_val[val_ok].astype(int)
+
+                if len(np.unique(y_train)) < 2:
+                    print(f"  ⚠️ Fold{i} [{name}]: 训练集只有一个类别，跳过")
+                    continue
+                if val_ok.sum() == 0 or len(np.unique(y_val)) < 2:
+                    # 验证集为空或只有一个类别时无法早停评估 AUC
+                    print(f"  ⚠️ Fold{i} [{name}]: 验证集为空或只有一个类别，跳过")
+                    continue
+
+                model = self._make_model(y_train)
+                model.fit(
+                    X_train_t[train_ok], y_train,
+                    eval_set=[(X_val_t[val_ok], y_val)],
+                    eval_metric="auc",
+                    callbacks=[early_stopping(self.early_stopping_rounds, verbose=False)]
+                )
+
+                val_probs = model.predict_proba(X_val_t[val_ok])[:, 1]
+                oof_probs[name][val_idx[val_ok]] = val_probs
+
+                metrics = {"endpoint": name, "fold": i}
+                metrics.update(compute_binary_metrics(y_val, val_probs))
+                metrics["Train_pos"] = int(y_train.sum())
+                metrics["Val_pos"] = int(y_val.sum())
+                records.append(metrics)
+
+                print(f"Fold{i} [{name}]: AUC={metrics['AUC']:.3f}, AUPRC={metrics['AUPRC']:.3f}, "
+                      f"F1={metrics['F1']:.3f}, Prec={metrics['Precision']:.3f}, "
+                      f"Rec={metrics['Recall']:.3f}, Brier={metrics['Brier']:.3f}")
+
+                if self.output_dir is not None:
+                    endpoint_dir = os.path.join(self.output_dir, name)
+                    os.makedirs(endpoint_dir, exist_ok=True)
+                    joblib.dump({"preprocessor": preprocessor, "model": model},
+                                os.path.join(endpoint_dir, f"fold{i}_model.pkl"))
+
+        if not records:
+            print("⚠️ 所有终点 / 折均被跳过，没有训练任何模型，返回空的指标表")
+            all_metrics = pd.DataFrame(columns=METRIC_COLUMNS)
+            self.fold_metrics_ = all_metrics
+            self.oof_probs_ = oof_probs
+            self.oof_folds_ = oof_folds
+            return all_metrics
+
+        df_metrics = pd.DataFrame(records)
+        summaries = []
+        for name, group in df_metrics.groupby("endpoint", sort=False):
+            overall = group.drop(columns=["endpoint", "fold"]).mean(numeric_only=True)
+            overall["endpoint"] = name
+            overall["fold"] = "mean"
+            endpoint_summary = pd.concat([group, overall.to_frame().T], ignore_index=True)
+            summaries.append(endpoint_summary)
+
+            if self.output_dir is not None:
+                endpoint_summary.drop(columns=["endpoint"]).to_csv(
+                    os.path.join(self.output_dir, name, "cv_metrics_summary.csv"), index=False
+                )
+
+        all_metrics = pd.concat(summaries, ignore_index=True)
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            all_metrics.to_csv(os.path.join(self.output_dir, "multi_endpoint_metrics.csv"), index=False)
+            print(f"\n✅ Multi-endpoint CV complete! Results stored in {self.output_dir}")
+
+        print("\n📊 Average metrics per endpoint:")
+        print(all_metrics[all_metrics["fold"] == "mean"].set_index("endpoint")
+              [["AUC", "AUPRC", "F1", "Precision", "Recall", "Brier"]])
+
+        self.fold_metrics_ = all_metrics
+        self.oof_probs_ = oof_probs
+        self.oof_folds_ = oof_folds
+        self.experiment_key_ = experiment_hash(self._config(), df_all, cv_folds)
+
+        if self.oof_store is not None:
+            patient_ids = (df_all[self.patient_id_col].to_numpy()
+                           if self.patient_id_col in df_all.columns else None)
+            for j, name in enumerate(self.endpoints):
+                self.oof_store.save(
+                    self.experiment_key_, name, Y_all[:, j], oof_probs[name], oof_folds,
+                    patient_ids=patient_ids, meta={"config": self._config(), "n_folds": len(cv_folds)}
+                )
+            print(f"💾 OOF predictions stored: {self.oof_store.root_dir}/{self.experiment_key_}")
+
+        return all_metrics
+
+    def _config(self) -> dict:
+        """参与实验哈希的配置"""
+        return {
+            "trainer": "MultiEndpointTrainer",
+            "endpoints": self.endpoints,
+            "exclude_cols": list(self.exclude_cols),
+            "model_params": self.model_params,
+            "early_stopping_rounds": self.early_stopping_rounds,
+            "pruner_params": self.pruner_params,
+            "sparse_output": self.sparse_output,
+        }
@@ -0,0 +1,187 @@
+"""
+oof_store.py
+------------
+按实验哈希持久化 OOF（out-of-fold）预测
+
+背景：
+    run_cv_training 在内存中累积 oof_probs / oof_preds，算完指标即丢弃；
+    之后想换阈值、做概率校准，只能重新训练全部折模型。
+
+做法：
+    1. experiment_hash：由实验配置（模型参数、特征列设置等）、特征表内容与折叠划分
+       共同决定一个 16 位哈希；任一变化都会得到新键
+    2. OOFStore.save：每个 (实验键, 终点) 写一个 .npz（y_true / prob / fold / patient_id），
+       以及该实验的 meta.json；先写临时文件再原子替换，并发 worker 不会读到半写文件
+    3. OOFStore.load：返回 DataFrame，直接交给 calibration 模块做校准 / 阈值扫描
+
+目录结构：
+    root_dir/
+    └── {experiment_key}/
+        ├── meta.json
+        ├── CRS.npz
+        └── ICANS.npz
+
+示例：
+    >>> store = OOFStore("./oof_store")
+    >>> key = experiment_hash({"model_params": params}, df_all, cv_folds)
+    >>> store.save(key, "CRS", y_true, oof_probs, fold_ids, patient_ids)
+    >>> oof = store.load(key, "CRS")              # [patient_id, y_true, prob, fold]
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def experiment_hash(
+    config: dict,
+    df: Optional[pd.DataFrame] = None,
+    cv_folds: Optional[Sequence[Tuple[np.ndarray, np.ndarray]]] = None
+) -> str:
+    """
+    计算实验键
+
+    参数:
+        config (dict): 实验配置（需可 JSON 序列化；键顺序无关）
+        df (pd.DataFrame, optional): 特征表（内容参与哈希）
+        cv_folds (list, optional): [(train_indices, val_indices), ...]
+
+    返回:
+        str: 16 位十六进制哈希
+    """
+    hasher = hashlib.sha1()
+    hasher.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    if df is not None:
+        hasher.update(repr(list(df.columns)).encode("utf-8"))
+        hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    if cv_folds is not None:
+        for train_idx, val_idx in cv_folds:
+            hasher.update(np.asarray(train_idx, dtype=np.int64).tobytes())
+            hasher.update(b"|")
+            hasher.update(np.asarray(val_idx, dtype=np.int64).tobytes())
+            hasher.update(b";")
+    return hasher.hexdigest()[:16]
+
+
+class OOFStore:
+    """
+    OOF 预测的磁盘存储
+
+    参数:
+        root_dir (str): 存储根目录
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root_dir, key)
+
+    def _path(self, key: str, endpoint: str) -> str:
+        return os.path.join(self._dir(key), f"{endpoint}.npz")
+
+    def exists(self, key: str, endpoint: Optional[str] = None) -> bool:
+        if endpoint is None:
+            return os.path.isdir(self._dir(key))
+        return os.path.exists(self._path(key, endpoint))
+
+    def keys(self) -> List[str]:
+        """所有已保存的实验键"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(d for d in os.listdir(self.root_dir) if os.path.isdir(self._dir(d)))
+
+    def endpoints(self, key: str) -> List[str]:
+        """某个实验下已保存的终点"""
+        if not self.exists(key):
+            return []
+        return sorted(f[:-4] for f in os.listdir(self._dir(key)) if f.endswith(".npz"))
+
+    def save(
+        self,
+        key: str,
+        endpoint: str,
+        y_true: np.ndarray,
+        probs: np.ndarray,
+        folds: np.ndarray,
+        patient_ids: Optional[np.ndarray] = None,
+        meta: Optional[dict] = None
+    ) -> str:
+        """
+        保存一个终点的 OOF 预测
+
+        参数:
+            key (str): 实验键（experiment_hash 的输出）
+            endpoint (str): 终点名
+            y_true (np.ndarray): 标签（缺失为 NaN）
+            probs (np.ndarray): OOF 阳性概率（未被任何验证折覆盖的行为 NaN）
+            folds (np.ndarray): 每行所在的验证折编号（未覆盖为 -1）
+            patient_ids (np.ndarray, optional): 患者ID；默认为行号
+            meta (dict, optional): 写入 meta.json 的实验信息（与已有内容合并）
+
+        返回:
+            str: .npz 路径
+        """
+        y_true = np.asarray(y_true, dtype=float)
+        probs = np.asarray(probs, dtype=float)
+        folds = np.asarray(folds, dtype=np.int64)
+        if patient_ids is None:
+            patient_ids = np.arange(len(probs))
+        patient_ids = np.asarray(patient_ids)
+        if patient_ids.dtype == object:
+            patient_ids = patient_ids.astype(str)
+        if not (len(y_true) == len(probs) == len(folds) == len(patient_ids)):
+            raise ValueError("y_true, probs, folds and patient_ids must have the same length")
+
+        os.makedirs(self._dir(key), exist_ok=True)
+        path = self._path(key, endpoint)
+        # 先写临时文件再原子替换，避免并发 worker 读到半写文件
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, y_true=y_true, prob=probs, fold=folds, patient_id=patient_ids)
+        os.replace(tmp_path, path)
+
+        if meta is not None:
+            merged = self.load_meta(key)
+            merged.update(meta)
+            meta_path = os.path.join(self._dir(key), "meta.json")
+            tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(merged, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp_meta, meta_path)
+        return path
+
+    def load(self, key: str, endpoint: str, dropna: bool = True) -> pd.DataFrame:
+        """
+        读取一个终点的 OOF 预测
+
+        参数:
+            dropna (bool): 是否去掉标签或概率缺失的行
+
+        返回:
+            pd.DataFrame: [patient_id, y_true, prob, fold]
+        """
+        path = self._path(key, endpoint)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"[OOFStore] 没有找到 {key}/{endpoint} 的 OOF 预测: {path}")
+        with np.load(path, allow_pickle=False) as data:
+            oof = pd.DataFrame({
+                "patient_id": data["patient_id"],
+                "y_true": data["y_true"],
+                "prob": data["prob"],
+                "fold": data["fold"],
+            })
+        if dropna:
+            oof = oof[oof["y_true"].notna() & oof["prob"].notna()].reset_index(drop=True)
+            oof["y_true"] = oof["y_true"].astype(int)
+        return oof
+
+    def load_meta(self, key: str) -> dict:
+        meta_path = os.path.join(self._dir(key), "meta.json")
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
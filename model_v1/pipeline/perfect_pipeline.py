@@ -23,7 +23,7 @@ from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from scipy.stats import linregress
+from scipy import sparse
 from scipy.integrate import trapezoid
 import os
 
@@ -34,7 +34,7 @@ import os
 
 class ConstantColumnDropper(BaseEstimator, TransformerMixin):
     """
-    删除数据集中所有值都相同的列（常量列）
+    删除数据集中所有值都相同的列（常量列），可选删除近常量列与高相关列
     
     功能说明:
         在数据预处理阶段自动识别并删除常量列（如经过疾病筛选后，所有样本的
@@ -42,36 +42,64 @@ class ConstantColumnDropper(BaseEstimator, TransformerMixin):
         - 减少特征维度，提高训练效率
         - 避免某些算法的数值问题
         - 使特征集更简洁
+        
+        聚合后的宽表（数百个 *_mean/_std/_auc/_slope 列）中还有大量近常量列
+        与近似重复的列，可选地一并删除，后续 LightGBM / SHAP / 预处理都会更快。
     
     使用场景:
         - 在数据拆分之前使用，确保训练集和测试集使用相同的特征集
         - 特别适用于经过条件筛选后的医疗数据（如单一疾病类型）
+        - 启用相关性剪枝时应在每折训练集上 fit（防止泄漏）
     
     实现逻辑:
-        1. fit阶段：在训练集上识别唯一值数量≤1的列（常量列）
-        2. transform阶段：删除这些列（训练集和测试集都应用相同的删除规则）
-        3. 防止数据泄漏：只使用训练集的统计信息，测试集不影响决策
+        1. fit阶段：数值列一次性向量化计算 NaN 感知的 min / max / 方差：
+           - 常量列：非缺失值全部相同或全为缺失值（等价于 nunique() <= 1）
+           - 近常量列：方差 <= variance_threshold
+           非数值列用 DataFrame.nunique 判断常量
+        2. 相关性剪枝（可选）：对剩余数值列按列块做矩阵乘法，计算 pairwise-complete
+           相关系数（与 DataFrame.corr 一致，缺失值按成对删除）；按列顺序贪心保留，
+           与已保留列的 |r| > corr_threshold 的列被删除
+        3. transform阶段：删除这些列（训练集和测试集都应用相同的删除规则）
+        4. 防止数据泄漏：只使用训练集的统计信息，测试集不影响决策
     
     参数:
-        无
+        variance_threshold (float, optional): 近常量列的方差阈值（原始尺度），None 表示不检查
+        corr_threshold (float, optional): 相关性剪枝阈值（如 0.95），None 表示不剪枝
+        corr_block_size (int): 相关性矩阵乘法的列块大小
+        exclude_cols (list, optional): 不参与检查的列（如患者ID、标签列）
     
     属性:
         constant_cols_ (list): fit后存储识别出的常量列名列表
+        near_constant_cols_ (list): 近常量列
+        correlated_cols_ (dict): {被删除列: 与之高相关的保留列}
+        drop_cols_ (list): 所有被删除的列
     
     示例:
         >>> dropper = ConstantColumnDropper()
         >>> X_train_cleaned = dropper.fit_transform(X_train)
         >>> X_test_cleaned = dropper.transform(X_test)
         >>> print(f"删除了 {len(dropper.constant_cols_)} 个常量列: {dropper.constant_cols_}")
+        >>> 
+        >>> # 宽表：同时删除近常量列与 |r| > 0.95 的冗余列
+        >>> pruner = ConstantColumnDropper(variance_threshold=1e-8, corr_threshold=0.95,
+        ...                                exclude_cols=["ID", "CRS_binary"])
+        >>> X_train_pruned = pruner.fit_transform(X_train)
     """
 
-    def __init__(self):
+    def __init__(self, variance_threshold=None, corr_threshold=None, corr_block_size=256, exclude_cols=None):
         """初始化常量列删除器"""
+        self.variance_threshold = variance_threshold
+        self.corr_threshold = corr_threshold
+        self.corr_block_size = corr_block_size
+        self.exclude_cols = exclude_cols
         self.constant_cols_ = []
+        self.near_constant_cols_ = []
+        self.correlated_cols_ = {}
+        self.drop_cols_ = []
 
     def fit(self, X, y=None):
         """
-        在训练集上识别常量列
+        在训练集上识别常量列（以及可选的近常量列、高相关列）
         
         参数:
             X (pd.DataFrame): 输入数据框
@@ -80,20 +108,122 @@ class ConstantColumnDropper(BaseEstimator, TransformerMixin):
         返回:
             self: 返回自身以支持链式调用
         """
-        # 识别唯一值数量≤1的列（即所有值都相同或全为缺失值的列）
-        self.constant_cols_ = [col for col in X.columns if X[col].nunique() <= 1]
+        exclude = set(self.exclude_cols or [])
+        candidates = [col for col in X.columns if col not in exclude]
+        numeric_cols = [col for col in candidates if pd.api.types.is_numeric_dtype(X[col])]
+        numeric_set = set(numeric_cols)
+        other_cols = [col for col in candidates if col not in numeric_set]
+
+        # 数值列：一次向量化计算 NaN 感知的 min / max / 方差
+        A = X[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(A)
+        n_valid = valid.sum(axis=0)
+        col_min = np.fmin.reduce(A, axis=0) if len(A) else np.full(len(numeric_cols), np.nan)
+        col_max = np.fmax.reduce(A, axis=0) if len(A) else np.full(len(numeric_cols), np.nan)
+        is_constant = (n_valid == 0) | (col_min == col_max)
+
+        # 非数值列：nunique
+        other_constant = (X[other_cols].nunique() <= 1).to_numpy() if other_cols else np.zeros(0, dtype=bool)
+
+        constant = {col for col, flag in zip(numeric_cols, is_constant) if flag} | \
+                   {col for col, flag in zip(other_cols, other_constant) if flag}
+        self.constant_cols_ = [col for col in candidates if col in constant]
+
+        # 近常量列
+        self.near_constant_cols_ = []
+        is_near_constant = np.zeros(len(numeric_cols), dtype=bool)
+        if self.variance_threshold is not None and len(numeric_cols):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(valid, A, 0.0).sum(axis=0) / n_valid
+                var = np.where(valid, (A - mean) ** 2, 0.0).sum(axis=0) / n_valid
+            is_near_constant = ~is_constant & (var <= self.variance_threshold)
+            self.near_constant_cols_ = [col for col, flag in zip(numeric_cols, is_near_constant) if flag]
+
+        # 相关性剪枝
+        self.correlated_cols_ = {}
+        if self.corr_threshold is not None:
+            remaining = ~is_constant & ~is_near_constant
+            self.correlated_cols_ = self._find_correlated(
+                A[:, remaining], [col for col, keep in zip(numeric_cols, remaining) if keep]
+            )
+
+        dropped = set(self.constant_cols_) | set(self.near_constant_cols_) | set(self.correlated_cols_)
+        self.drop_cols_ = [col for col in X.columns if col in dropped]
         
         # 打印识别结果，便于调试和验证
         if self.constant_cols_:
             print(f"[ConstantColumnDropper] 识别到 {len(self.constant_cols_)} 个常量列: {self.constant_cols_}")
         else:
             print(f"[ConstantColumnDropper] 未发现常量列")
+        if self.variance_threshold is not None:
+            print(f"[ConstantColumnDropper] 近常量列（方差 <= {self.variance_threshold}）: {len(self.near_constant_cols_)} 个")
+        if self.corr_threshold is not None:
+            print(f"[ConstantColumnDropper] 高相关列（|r| > {self.corr_threshold}）: {len(self.correlated_cols_)} 个")
         
         return self
 
+    @staticmethod
+    def _pairwise_abs_corr(Za, Ma, Zb, Mb):
+        """
+        两组列之间的 |相关系数|（pairwise-complete，与 DataFrame.corr 一致）
+
+        Z 为已中心化且缺失处填 0 的值，M 为非缺失掩码（float）；
+        每个统计量都是一次矩阵乘法。
+        """
+        n = Ma.T @ Mb
+        sa = Za.T @ Mb
+        sb = Ma.T @ Zb
+        saa = (Za ** 2).T @ Mb
+        sbb = Ma.T @ (Zb ** 2)
+        sab = Za.T @ Zb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sab - sa * sb / n
+            var_a = saa - sa ** 2 / n
+            var_b = sbb - sb ** 2 / n
+            r = np.abs(cov / np.sqrt(var_a * var_b))
+        r[(n < 3) | ~np.isfinite(r)] = 0.0
+        return r
+
+    def _find_correlated(self, A, cols):
+        """分块计算相关系数，按列顺序贪心保留；返回 {被删除列: 保留列}"""
+        if len(cols) < 2:
+            return {}
+
+        # 先按列中心化以减小数值误差，缺失处填 0 并记录掩码
+        M = (~np.isnan(A)).astype(np.float64)
+        Z = A - np.nanmean(A, axis=0)
+        Z[M == 0] = 0.0
+
+        kept = []
+        dropped = {}
+        for start in range(0, len(cols), self.corr_block_size):
+            block = np.arange(start, min(start + self.corr_block_size, len(cols)))
+            Zb, Mb = Z[:, block], M[:, block]
+            alive = np.ones(len(block), dtype=bool)
+
+            # 与之前块中已保留的列比较
+            if kept:
+                C = self._pairwise_abs_corr(Zb, Mb, Z[:, kept], M[:, kept])
+                for i in np.flatnonzero((C > self.corr_threshold).any(axis=1)):
+                    alive[i] = False
+                    dropped[cols[block[i]]] = cols[kept[int(np.argmax(C[i]))]]
+
+            # 块内贪心
+            C_in = self._pairwise_abs_corr(Zb, Mb, Zb, Mb)
+            for i in range(len(block)):
+                if not alive[i]:
+                    continue
+                kept.append(int(block[i]))
+                later = np.flatnonzero(alive & (C_in[i] > self.corr_threshold) & (np.arange(len(block)) > i))
+                for j in later:
+                    alive[j] = False
+                    dropped[cols[block[j]]] = cols[block[i]]
+
+        return dropped
+
     def transform(self, X):
         """
-        删除识别出的常量列
+        删除识别出的常量列（以及近常量列、高相关列）
         
         参数:
             X (pd.DataFrame): 输入数据框
@@ -102,7 +232,8 @@ class ConstantColumnDropper(BaseEstimator, TransformerMixin):
             pd.DataFrame: 删除常量列后的数据框
         """
         # 使用 errors="ignore" 避免列不存在时报错（兼容性处理）
-        return X.drop(columns=self.constant_cols_, errors="ignore")
+        drop_cols = getattr(self, "drop_cols_", None) or self.constant_cols_
+        return X.drop(columns=drop_cols, errors="ignore")
 
 
 # ============================================================
@@ -332,37 +463,43 @@ class DynamicFeatureAggregator(BaseEstimator, TransformerMixin):
         self.feature_names_ = None
 
     def _extract_features(self, csv_path):
-        df = pd.read_csv(csv_path)
+        return self._extract_features_from_frame(pd.read_csv(csv_path))
+
+    def _extract_features_from_frame(self, df):
+        # 与 _extract_features 相同，但直接接收内存中的时间序列（供在线打分服务使用）
         if "Day" not in df.columns:
-            df.rename(columns={df.columns[0]: "Day"}, inplace=True)
+            df = df.rename(columns={df.columns[0]: "Day"})
 
         df = df[(df["Day"] >= self.obs_start) & (df["Day"] <= self.obs_end)]
-        
+
+        # 所有变量一次性按列计算（结果与逐列 linregress / trapezoid 一致）
+        day = df["Day"].to_numpy(dtype=float)
+        values = df.drop(columns="Day").astype(float)
+        V = values.to_numpy()
+
+        mean = values.mean().to_numpy()
+        std = values.std().to_numpy()
+        vmin = values.min().to_numpy()
+        vmax = values.max().to_numpy()
+
+        # AUC：前向填充后缺失记 0
+        auc = trapezoid(values.ffill().fillna(0).to_numpy(), day, axis=0)
+
+        # slope：最小二乘斜率；序列含缺失、少于 2 个点或 Day 全相同时为 NaN
+        if len(day) >= 2 and np.ptp(day) > 0:
+            dx = day - day.mean()
+            slope = (dx @ (V - V.mean(axis=0))) / (dx @ dx)
+        else:
+            slope = np.full(V.shape[1], np.nan)
+
         out = {}
-        for col in df.columns:
-            if col == "Day":
-                continue
-
-            series = df[col].astype(float)
-
-            out[f"{col}_mean"] = series.mean()
-            out[f"{col}_std"] = series.std()
-            out[f"{col}_min"] = series.min()
-            out[f"{col}_max"] = series.max()
-
-            # AUC
-            try:
-                out[f"{col}_auc"] = trapezoid(series.fillna(method='ffill').fillna(0),
-                                              df["Day"])
-            except:
-                out[f"{col}_auc"] = np.nan
-
-            # slope
-            try:
-                slope, _, _, _, _ = linregress(df["Day"], series)
-                out[f"{col}_slope"] = slope
-            except:
-                out[f"{col}_slope"] = np.nan
+        for i, col in enumerate(values.columns):
+            out[f"{col}_mean"] = mean[i]
+            out[f"{col}_std"] = std[i]
+            out[f"{col}_min"] = vmin[i]
+            out[f"{col}_max"] = vmax[i]
+            out[f"{col}_auc"] = auc[i]
+            out[f"{col}_slope"] = slope[i]
 
         return out
 
@@ -398,13 +535,23 @@ class DynamicFeatureAggregator(BaseEstimator, TransformerMixin):
 class FullPreprocessor(BaseEstimator, TransformerMixin):
     """
     将静态特征预处理 + 动态特征聚合整合为一个 sklearn transformer。
+
+    输出模式：
+        - dtype: 输出矩阵的数据类型。非 float64 时（如 np.float32）fit 后自动 compile，
+                 静态与动态特征直接写入同一个 dtype 矩阵
+        - sparse_output: True 时 OneHot 块保持稀疏，输出 CSR 矩阵（LightGBM 可直接训练）。
+                 动态特征是稠密的，CSR 存储每个非零值需要额外的列下标，
+                 只有 OneHot 列占多数时才比稠密 float32 更省内存
     """
 
-    def __init__(self, numeric_cols, categorical_cols, ordinal_cols, dynamic_dir):
+    def __init__(self, numeric_cols, categorical_cols, ordinal_cols, dynamic_dir,
+                 dtype=np.float64, sparse_output=False):
         self.numeric_cols = numeric_cols
         self.categorical_cols = categorical_cols
         self.ordinal_cols = ordinal_cols
         self.dynamic_dir = dynamic_dir
+        self.dtype = dtype
+        self.sparse_output = sparse_output
 
         # 组件
         self.constant_dropper = ConstantColumnDropper()
@@ -427,12 +574,18 @@ class FullPreprocessor(BaseEstimator, TransformerMixin):
                     ("imputer", SimpleImputer(strategy="most_frequent")),
                     ("ordinal", OrdinalEncoder())
                 ]), ordinal_cols)
-            ]
+            ],
+            # 稠密模式下强制输出稠密矩阵（否则 OneHot 足够稀疏时会返回稀疏矩阵，无法 np.hstack）
+            sparse_threshold=1.0 if sparse_output else 0.0
         )
 
         self.fitted_ = False
+        self.fused_static_ = None
 
     def fit(self, X, y=None):
+        # 重新拟合后旧的融合变换失效
+        self.fused_static_ = None
+
         # 1. 删除常量列
         X = self.constant_dropper.fit_transform(X)
 
@@ -443,6 +596,21 @@ class FullPreprocessor(BaseEstimator, TransformerMixin):
         self.static_transformer.fit(X, y)
 
         self.fitted_ = True
+        if not self.sparse_output and np.dtype(self.dtype) != np.float64:
+            self.compile(dtype=self.dtype)
+        return self
+
+    def compile(self, dtype=np.float32):
+        """
+        将已拟合的静态 ColumnTransformer 编译为 FusedStaticTransform
+
+        编译后 transform 把静态与动态特征直接写入同一个预分配的 dtype 矩阵，
+        不再经过各 sklearn 步骤的中间数组与 np.hstack。
+        """
+        assert self.fitted_, "Must call fit() before compile()"
+        from .fused_transform import FusedStaticTransform
+
+        self.fused_static_ = FusedStaticTransform.from_column_transformer(self.static_transformer, dtype=dtype)
         return self
 
     def transform(self, X):
@@ -451,35 +619,56 @@ class FullPreprocessor(BaseEstimator, TransformerMixin):
         # 常量列删除
         Xc = self.constant_dropper.transform(X)
 
+        fused = getattr(self, "fused_static_", None)
+        if fused is not None:
+            X_dyn = self.dynamic_agg.transform(Xc)
+            n_static = fused.n_features_out_
+            out = np.empty((len(Xc), n_static + X_dyn.shape[1]), dtype=fused.dtype)
+            fused.transform(Xc, out=out[:, :n_static])
+            out[:, n_static:] = X_dyn.to_numpy()
+            return out
+
+        dtype = getattr(self, "dtype", np.float64)
+
         # 静态
         X_static = self.static_transformer.transform(Xc)
 
         # 动态
-        X_dyn = self.dynamic_agg.transform(Xc).to_numpy()
+        X_dyn = self.dynamic_agg.transform(Xc).to_numpy(dtype=dtype)
+
+        # 稀疏模式：OneHot 块保持 CSR，与动态块按列拼接
+        if getattr(self, "sparse_output", False):
+            return sparse.hstack([sparse.csr_matrix(X_static), sparse.csr_matrix(X_dyn)],
+                                 format="csr", dtype=dtype)
 
         # 拼接静态 + 动态
-        return np.hstack([X_static, X_dyn])
+        return np.hstack([X_static, X_dyn]).astype(dtype, copy=False)
 
 
 # ============================================================
 # 5. 最终构造模型 Pipeline
 # ============================================================
 
-from lightgbm import LGBMClassifier
-
-
-def build_no_leak_pipeline(numeric_cols, categorical_cols, ordinal_cols, dynamic_dir):
+def build_no_leak_pipeline(numeric_cols, categorical_cols, ordinal_cols, dynamic_dir,
+                           dtype=np.float64, sparse_output=False):
     """
     构建一个包含：
         - 完整预处理器
         - LightGBM 模型
     的 sklearn Pipeline。
+
+    dtype / sparse_output 透传给 FullPreprocessor（例如 dtype=np.float32 降低训练峰值内存）。
     """
+    # 延迟导入：只加载预处理器（如打分服务加载导出的树模型）时不需要 LightGBM
+    from lightgbm import LGBMClassifier
+
     preproc = FullPreprocessor(
         numeric_cols=numeric_cols,
         categorical_cols=categorical_cols,
         ordinal_cols=ordinal_cols,
-        dynamic_dir=dynamic_dir
+        dynamic_dir=dynamic_dir,
+        dtype=dtype,
+        sparse_output=sparse_output
     )
 
     model = LGBMClassifier(
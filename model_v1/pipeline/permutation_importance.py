@@ -0,0 +1,335 @@
+"""
+permutation_importance.py
+-------------------------
+按特征组并行计算置换重要性
+
+背景：
+    目前只有 SHAP 一种重要性工具，而且它无法把同一原始变量派生出的
+    6 个聚合列（如 CBC004_mean / _std / _min / _max / _slope / _auc）合并评估。
+
+做法：
+    1. feature_groups：把预处理器的每个输出列映射回输入列，再按规则分组：
+       - "variable"：原始变量（动态列去掉统计量后缀；OneHot 列归回原静态列）
+       - "category"：变量类别（CBC004 → CBC；所有静态列 → static）
+       - "block"：静态 / 动态两大块
+    2. 在已变换的矩阵上置换：变换是逐行的，对一个组的所有输出列施加同一个行置换，
+       等价于置换原始变量后重新变换，不需要重复预处理
+    3. 基线预测只计算一次（也可直接传入 OOFStore 中的 OOF 概率）
+    4. 每个 worker 启动时只接收一次模型与数据（数据经 .npy memmap 共享），
+       并预先平铺 n_repeats 份；每个组只改写该组的列、一次 predict_proba 得到
+       全部重复的预测，再用向量化的秩统计量同时计算 n_repeats 个 AUC
+       LightGBM 模型先导出为 FlatTreeEnsemble（tree_export）再交给 worker：
+       主进程已初始化 OpenMP 线程池，fork 出的子进程反序列化 / 调用 Booster 会死锁
+    5. 每个组的随机数种子由 (random_state, 组序号) 决定，结果与并行调度无关
+
+示例：
+    >>> groups = feature_groups(preprocessor, by="variable")
+    >>> imp = grouped_permutation_importance(model, X_val_t, y_val, groups, n_repeats=5, n_jobs=8)
+    >>> fold_imp = fold_permutation_importance("./BNHL_CRS_CV_results", df_all, cv_folds,
+    ...                                        label_col="label", by="category")
+"""
+
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import rankdata
+
+from .feature_table import _DYNAMIC_STATS
+from .fold_ensemble import FoldEnsemblePredictor
+from .tree_export import export_lgbm_model
+
+_HIGHER_IS_BETTER = {"auc": True, "brier": False, "log_loss": False}
+
+
+# ============================================================
+# 特征分组
+# ============================================================
+
+def _output_to_input(preprocessor) -> List[str]:
+    """ColumnTransformer 每个输出列对应的输入列"""
+    names_out = [str(n) for n in preprocessor.get_feature_names_out()]
+    inputs_by_transformer = {
+        name: [str(c) for c in cols] for name, _, cols in preprocessor.transformers_
+    }
+
+    mapping = []
+    for out_name in names_out:
+        trans_name, _, rest = out_name.partition("__")
+        candidates = inputs_by_transformer.get(trans_name, [])
+        if rest in candidates:
+            mapping.append(rest)
+            continue
+        # OneHot 输出为 “输入列_类别”：取能作为前缀的最长输入列
+        prefixed = [c for c in candidates if rest.startswith(f"{c}_")]
+        mapping.append(max(prefixed, key=len) if prefixed else rest)
+    return mapping
+
+
+def _group_of(col: str, by: str, static_prefix: str) -> str:
+    is_static = col.startswith(static_prefix)
+    if by == "block":
+        return "static" if is_static else "dynamic"
+    if is_static:
+        return col if by == "variable" else "static"
+
+    base, _, stat = col.rpartition("_")
+    variable = base if base and stat in _DYNAMIC_STATS else col
+    if by == "variable":
+        return variable
+    return re.sub(r"\d+$", "", variable).strip() or variable
+
+
+def feature_groups(
+    preprocessor,
+    by: Union[str, Dict[str, str], Callable[[str], str]] = "variable",
+    static_prefix: str = "s_"
+) -> Dict[str, List[int]]:
+    """
+    构建 {组名: 变换后矩阵中的列下标}
+
+    参数:
+        preprocessor: 已拟合的 ColumnTransformer（build_tabular_preprocessor 的输出）
+        by: "variable" / "category" / "block"，或 {输入列: 组名} 字典，或 输入列 → 组名 的函数
+        static_prefix (str): 静态特征前缀（与 build_feature_table 一致）
+
+    返回:
+        dict: {组名: [列下标, ...]}，按首次出现顺序
+    """
+    if isinstance(by, str):
+        if by not in ("variable", "category", "block"):
+            raise ValueError(f"by must be 'variable', 'category' or 'block', got {by!r}")
+        rule = lambda col: _group_of(col, by, static_prefix)
+    elif isinstance(by, dict):
+        rule = lambda col: by.get(col, col)
+    else:
+        rule = by
+
+    groups: Dict[str, List[int]] = {}
+    for j, col in enumerate(_output_to_input(preprocessor)):
+        groups.setdefault(rule(col), []).append(j)
+    return groups
+
+
+# ============================================================
+# 向量化评分
+# ============================================================
+
+def _batch_scores(y: np.ndarray, P: np.ndarray, metric: str) -> np.ndarray:
+    """对 P 的每一行（一次重复的预测）计算指标"""
+    if metric == "auc":
+        pos = y == 1
+        n_pos, n_neg = pos.sum(), (~pos).sum()
+        if n_pos == 0 or n_neg == 0:
+            return np.full(len(P), np.nan)
+        ranks = rankdata(P, axis=1)
+        return (ranks[:, pos].sum(axis=1) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+    if metric == "brier":
+        return ((P - y) ** 2).mean(axis=1)
+    if metric == "log_loss":
+        P = np.clip(P, 1e-15, 1 - 1e-15)
+        return -(y * np.log(P) + (1 - y) * np.log(1 - P)).mean(axis=1)
+    raise ValueError(f"metric must be one of {sorted(_HIGHER_IS_BETTER)}, got {metric!r}")
+
+
+def _is_lightgbm(model) -> bool:
+    booster = getattr(model, "booster_", None)
+    return booster is not None and type(booster).__module__.startswith("lightgbm")
+
+
+def _predict_positive(model, X: np.ndarray) -> np.ndarray:
+    return model.predict_proba(X)[:, 1]
+
+
+# ============================================================
+# 进程池 worker
+# ============================================================
+
+_WORKER = {}
+
+
+def _init_worker(model_bytes: bytes, X_path: str, y: np.ndarray, baseline_score: float,
+                 metric: str, n_repeats: int, random_state: int):
+    X = np.load(X_path, mmap_mode="r")
+    _WORKER.update(
+        model=pickle.loads(model_bytes), X=X, y=y, baseline=baseline_score,
+        metric=metric, n_repeats=n_repeats, random_state=random_state,
+        # 预先平铺 n_repeats 份；每个组只改写自己的列，结束后复原
+        stacked=np.tile(np.asarray(X), (n_repeats, 1))
+    )
+
+
+def _permute_group(group_idx: int, cols: List[int]) -> np.ndarray:
+    X, stacked = _WORKER["X"], _WORKER["stacked"]
+    n, n_repeats = len(X), _WORKER["n_repeats"]
+    rng = np.random.default_rng([_WORKER["random_state"], group_idx])
+
+    original = np.asarray(X[:, cols])
+    for r in range(n_repeats):
+        stacked[r * n:(r + 1) * n, cols] = original[rng.permutation(n)]
+
+    probs = _predict_positive(_WORKER["model"], stacked)
+    scores = _batch_scores(_WORKER["y"], probs.reshape(n_repeats, n), _WORKER["metric"])
+    stacked[:, cols] = np.tile(original, (n_repeats, 1))
+
+    if _HIGHER_IS_BETTER[_WORKER["metric"]]:
+        return _WORKER["baseline"] - scores
+    return scores - _WORKER["baseline"]
+
+
+# ============================================================
+# 公开接口
+# ============================================================
+
+def grouped_permutation_importance(
+    model,
+    X_t: np.ndarray,
+    y: np.ndarray,
+    groups: Dict[str, Sequence[int]],
+    n_repeats: int = 5,
+    metric: str = "auc",
+    n_jobs: Optional[int] = None,
+    random_state: int = 42,
+    baseline_probs: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """
+    按特征组计算置换重要性
+
+    参数:
+        model: 已训练的分类器（有 predict_proba）
+        X_t (np.ndarray or sparse): 已变换的输入矩阵（稀疏矩阵会被稠密化）
+        y (np.ndarray): 二元标签
+        groups (dict): {组名: 列下标}（feature_groups 的输出）
+        n_repeats (int): 每个组的置换次数
+        metric (str): "auc"（下降量）、"brier" / "log_loss"（上升量）
+        n_jobs (int, optional): 进程数，默认 os.cpu_count()；1 表示在当前进程内计算
+        random_state (int): 随机种子
+        baseline_probs (np.ndarray, optional): 已缓存的基线预测（如 OOF 概率）；None 时计算一次
+
+    返回:
+        pd.DataFrame: [group, n_features, importance_mean, importance_std, baseline_score]，
+                      按 importance_mean 降序
+    """
+    if metric not in _HIGHER_IS_BETTER:
+        raise ValueError(f"metric must be one of {sorted(_HIGHER_IS_BETTER)}, got {metric!r}")
+    if n_repeats < 1:
+        raise ValueError("n_repeats must be >= 1")
+
+    X_t = X_t.toarray() if sparse.issparse(X_t) else np.asarray(X_t)
+    y = np.asarray(y, dtype=int)
+    if baseline_probs is None:
+        baseline_probs = _predict_positive(model, X_t)
+    baseline_score = float(_batch_scores(y, np.asarray(baseline_probs, dtype=float)[None, :], metric)[0])
+
+    names = list(groups)
+    n_workers = max(1, min(n_jobs or os.cpu_count() or 1, len(names)))
+
+    fd, X_path = tempfile.mkstemp(suffix=".npy")
+    os.close(fd)
+    try:
+        np.save(X_path, X_t)
+        # 串行与并行使用同一个纯 NumPy 的树模型，结果与 n_jobs 无关
+        worker_model = export_lgbm_model(model) if _is_lightgbm(model) else model
+        init_args = (pickle.dumps(worker_model), X_path, y, baseline_score, metric, n_repeats, random_state)
+        if n_workers == 1:
+            _init_worker(*init_args)
+            try:
+                results = [_permute_group(i, list(groups[g])) for i, g in enumerate(names)]
+            finally:
+                _WORKER.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=init_args) as executor:
+                results = list(executor.map(
+                    _permute_group, range(len(names)), [list(groups[g]) for g in names]
+                ))
+    finally:
+        os.remove(X_path)
+
+    importance = pd.DataFrame({
+        "group": names,
+        "n_features": [len(groups[g]) for g in names],
+        "importance_mean": [r.mean() for r in results],
+        "importance_std": [r.std() for r in results],
+        "baseline_score": baseline_score,
+    })
+    return importance.sort_values("importance_mean", ascending=False).reset_index(drop=True)
+
+
+def fold_permutation_importance(
+    model_dir: str,
+    df_all: pd.DataFrame,
+    cv_folds: List[Tuple[np.ndarray, np.ndarray]],
+    label_col: str,
+    by: Union[str, Dict[str, str], Callable[[str], str]] = "variable",
+    n_repeats: int = 5,
+    metric: str = "auc",
+    n_jobs: Optional[int] = None,
+    random_state: int = 42,
+    oof_probs: Optional[np.ndarray] = None,
+    static_prefix: str = "s_",
+    output_path: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    对每个折模型在其验证折上计算分组置换重要性，并跨折汇总
+
+    参数:
+        model_dir (str): fold{i}_model.pkl 所在目录（fold i 对应 cv_folds[i-1]）
+        df_all (pd.DataFrame): 训练时使用的特征表
+        cv_folds (list): [(train_indices, val_indices), ...]
+        label_col (str): 标签列
+        by: 分组规则（同 feature_groups）
+        oof_probs (np.ndarray, optional): 与 df_all 行对齐的 OOF 概率（如 MultiEndpointTrainer.oof_probs_），
+                                          提供时直接作为每折的基线预测
+        其余参数同 grouped_permutation_importance
+
+    返回:
+        pd.DataFrame: index 为组名，列为 fold{i}、n_features、importance_mean、importance_std，
+                      按 importance_mean 降序
+    """
+    folds = FoldEnsemblePredictor._load_folds(model_dir)
+    y_all = pd.to_numeric(df_all[label_col], errors="coerce").to_numpy(dtype=float)
+
+    per_fold, n_features = {}, {}
+    for fold_id, preprocessor, model in folds:
+        if not 1 <= fold_id <= len(cv_folds):
+            raise ValueError(f"fold{fold_id}_model.pkl has no matching entry in cv_folds")
+        val_idx = np.asarray(cv_folds[fold_id - 1][1])
+        val_idx = val_idx[~np.isnan(y_all[val_idx])]
+
+        X_val = df_all.iloc[val_idx][list(preprocessor.feature_names_in_)]
+        X_val_t = FoldEnsemblePredictor._compile(preprocessor)(X_val)
+        groups = feature_groups(preprocessor, by, static_prefix)
+        baseline = None if oof_probs is None else np.asarray(oof_probs)[val_idx]
+
+        imp = grouped_permutation_importance(
+            model, X_val_t, y_all[val_idx].astype(int), groups, n_repeats=n_repeats,
+            metric=metric, n_jobs=n_jobs, random_state=random_state + fold_id, baseline_probs=baseline
+        ).set_index("group")
+        per_fold[f"fold{fold_id}"] = imp["importance_mean"]
+        for g, k in imp["n_features"].items():
+            n_features[g] = max(n_features.get(g, 0), int(k))
+        print(f"[fold_permutation_importance] Fold{fold_id}: {len(groups)} 组, "
+              f"基线 {metric}={imp['baseline_score'].iloc[0]:.4f}")
+
+    # 某折中不存在的组（被剪枝的列）重要性记为 0
+    importance = pd.DataFrame(per_fold).fillna(0.0)
+    importance.insert(0, "n_features", pd.Series(n_features))
+    importance["importance_mean"] = importance[list(per_fold)].mean(axis=1)
+    importance["importance_std"] = importance[list(per_fold)].std(axis=1, ddof=0)
+    importance = importance.sort_values("importance_mean", ascending=False)
+    importance.index.name = "group"
+
+    if output_path is not None:
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        importance.to_csv(output_path)
+        print(f"✅ Permutation importance saved: {output_path}")
+    return importance
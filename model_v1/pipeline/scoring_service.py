@@ -0,0 +1,484 @@
+"""
+scoring_service.py
+------------------
+本地低延迟打分服务：常驻内存的 build_no_leak_pipeline 模型
+
+背景：
+    床旁风险提醒需要在 100 ms 内给出单个患者的 CRS 风险，但现有脚本每次运行都要
+    重新 import sklearn / LightGBM、joblib.load 整个 pipeline、再从磁盘读取 CSV，
+    冷启动就远超这个预算。
+
+做法：
+    1. 服务启动时加载一次 pipeline（preprocessor=FullPreprocessor, model=LGBMClassifier），
+       模型导出为 FlatTreeEnsemble（tree_export）求值，并用一条空记录预热一遍完整的推理路径；
+       部署 compile_pipeline 的输出时，启动过程不需要 import LightGBM
+    2. 请求直接携带患者的静态行与动态测量值（JSON），动态特征在内存中聚合，
+       与 DynamicFeatureAggregator 的训练特征完全一致，不读写任何文件
+    3. 并发请求由 MicroBatcher 合并成小批次（max_batch_size / max_wait_ms），
+       一次 transform + predict_proba
+    4. LatencyTracker 记录端到端延迟与每批推理耗时，GET /stats 返回 p50/p90/p99
+    5. 只监听 127.0.0.1 或 Unix socket，不依赖任何外部服务
+
+接口：
+    POST /score    {"static": {...}, "dynamic": {"Day": [...], "CBC001": [...]}}
+                   或 {"patients": [{"static": ..., "dynamic": ...}, ...]}
+                   → {"probabilities": [...], "latency_ms": ...}
+    GET  /stats    → 延迟分位数、批次大小统计
+    GET  /health   → {"status": "ok"}
+
+示例：
+    $ python -m pipeline.scoring_service --model ./final_pipeline.pkl --port 8765
+    $ python -m pipeline.scoring_service --model ./final_pipeline.pkl --unix-socket /tmp/crs.sock
+    $ curl -s localhost:8765/score -d @patient.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from .fused_transform import FusedStaticTransform
+from .perfect_pipeline import FullPreprocessor
+from .tree_export import FlatTreeEnsemble, export_lgbm_model
+
+
+# ============================================================
+# 1. 延迟统计
+# ============================================================
+
+class LatencyTracker:
+    """
+    滑动窗口内的延迟分位数统计（线程安全）
+
+    参数:
+        window (int): 保留最近多少次观测
+    """
+
+    def __init__(self, window: int = 10000):
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count_ = 0
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._values.append(latency_ms)
+            self.count_ += 1
+
+    def summary(self) -> Dict[str, float]:
+        """返回 {count, mean, p50, p90, p99, max}（单位 ms）"""
+        with self._lock:
+            values = np.fromiter(self._values, dtype=float)
+            count = self.count_
+        if len(values) == 0:
+            return {"count": count}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {
+            "count": count,
+            "mean": float(values.mean()),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(values.max()),
+        }
+
+
+# ============================================================
+# 2. 常驻模型
+# ============================================================
+
+class WarmPipelineScorer:
+    """
+    常驻内存的 build_no_leak_pipeline 打分器
+
+    直接复用已拟合 FullPreprocessor 的各个组件（常量列删除、静态 ColumnTransformer、
+    动态聚合器），但动态数据来自请求体而不是 dynamic_dir。
+
+    参数:
+        pipeline (str, Pipeline or dict): joblib 保存的模型路径、已加载的 Pipeline，
+                                          或 compile_pipeline 的输出 {"preprocessor", "model"}
+        warmup (bool): 加载后是否用一条空记录预热推理路径
+        compile_trees (bool): 是否将 LightGBM 模型导出为 FlatTreeEnsemble 求值
+    """
+
+    def __init__(self, pipeline: Union[str, Pipeline, dict], warmup: bool = True, compile_trees: bool = True):
+        if isinstance(pipeline, str):
+            t0 = time.perf_counter()
+            pipeline = joblib.load(pipeline)
+            print(f"[WarmPipelineScorer] 模型加载耗时 {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        if isinstance(pipeline, dict):
+            preprocessor, model = pipeline["preprocessor"], pipeline["model"]
+        else:
+            preprocessor, model = pipeline.named_steps.get("preprocessor"), pipeline.named_steps["model"]
+        if not isinstance(preprocessor, FullPreprocessor) or not preprocessor.fitted_:
+            raise ValueError("[WarmPipelineScorer] pipeline 必须包含已拟合的 FullPreprocessor（build_no_leak_pipeline 的输出）")
+
+        if compile_trees and not isinstance(model, FlatTreeEnsemble):
+            model = export_lgbm_model(model)
+
+        self.preprocessor = preprocessor
+        self.model = model
+        try:
+            # float64 与 pipeline 训练时的输入精度一致，保证打分结果与 predict_proba 相同
+            self.static_transform_ = FusedStaticTransform.from_column_transformer(
+                preprocessor.static_transformer, dtype=np.float64
+            )
+        except NotImplementedError:
+            self.static_transform_ = None
+        self.static_cols_ = list(preprocessor.static_transformer.feature_names_in_)
+        self.categorical_cols_ = [c for c in list(preprocessor.categorical_cols) + list(preprocessor.ordinal_cols)
+                                  if c in self.static_cols_]
+
+        if warmup:
+            self.score([{"static": {}, "dynamic": {}}])
+
+    def _dynamic_features(self, dynamic) -> Dict[str, float]:
+        agg = self.preprocessor.dynamic_agg
+        if not dynamic:
+            return {}
+        frame = pd.DataFrame(dynamic)
+        if frame.empty:
+            return {}
+        return agg._extract_features_from_frame(frame)
+
+    def transform(self, records: List[dict]) -> np.ndarray:
+        """将一批请求记录转换为模型输入矩阵（与 FullPreprocessor.transform 相同的列顺序）"""
+        static_df = pd.DataFrame([r.get("static") or {} for r in records]).reindex(columns=self.static_cols_)
+        static_df[self.categorical_cols_] = static_df[self.categorical_cols_].astype(object)
+        X_dyn = pd.DataFrame([self._dynamic_features(r.get("dynamic")) for r in records]) \
+            .reindex(columns=self.preprocessor.dynamic_agg.feature_names_).to_numpy(dtype=float)
+
+        if self.static_transform_ is None:
+            X_static = self.preprocessor.static_transformer.transform(static_df)
+            if hasattr(X_static, "toarray"):
+                X_static = X_static.toarray()
+            return np.hstack([X_static, X_dyn])
+
+        # 静态与动态特征写入同一个预分配矩阵
+        n_static = self.static_transform_.n_features_out_
+        out = np.empty((len(records), n_static + X_dyn.shape[1]))
+        self.static_transform_.transform(static_df, out=out[:, :n_static])
+        out[:, n_static:] = X_dyn
+        return out
+
+    def score(self, records: List[dict]) -> np.ndarray:
+        """返回每条记录的阳性概率"""
+        return self.model.predict_proba(self.transform(records))[:, 1]
+
+
+def compile_pipeline(pipeline: Pipeline) -> dict:
+    """
+    将 build_no_leak_pipeline 转换为打分服务的部署格式
+
+    返回的 {"preprocessor": FullPreprocessor, "model": FlatTreeEnsemble} 用 joblib 保存后，
+    服务加载时不再需要 import LightGBM。
+
+    示例:
+        >>> joblib.dump(compile_pipeline(final_pipe), "final_pipeline_compiled.pkl")
+    """
+    return {
+        "preprocessor": pipeline.named_steps["preprocessor"],
+        "model": export_lgbm_model(pipeline.named_steps["model"]),
+    }
+
+
+# ============================================================
+# 3. 微批处理
+# ============================================================
+
+class MicroBatcher:
+    """
+    将并发提交的单条记录合并为小批次后统一打分
+
+    批次在以下任一条件满足时发出：
+        - 已积累 max_batch_size 条记录
+        - 距离批次第一条记录到达已过 max_wait_ms
+
+    参数:
+        score_fn (callable): records -> 概率数组
+        max_batch_size (int): 单批最大记录数
+        max_wait_ms (float): 单批最长等待时间
+
+    整批打分失败时逐条重新打分：同批的正常记录仍得到与单条打分相同的结果，
+    只有出错的记录对应的 Future 设置异常。
+
+    示例:
+        >>> batcher = MicroBatcher(lambda records: np.array([float(r["x"]) for r in records]),
+        ...                        max_wait_ms=200).start()
+        >>> good, bad = batcher.submit({"x": 0.25}), batcher.submit({"x": "abc"})
+        >>> good.result(timeout=5), type(bad.exception(timeout=5)).__name__
+        (0.25, 'ValueError')
+        >>> batcher.stop()
+    """
+
+    def __init__(self, score_fn: Callable[[List[dict]], np.ndarray],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}")
+
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_latency = LatencyTracker()
+        self.batch_sizes = LatencyTracker()
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, record: dict) -> Future:
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _collect(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                probs = [float(p) for p in self.score_fn([record for record, _ in batch])]
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # 批内有一条记录出错时逐条重新打分，只让出错记录对应的请求失败
+                self._score_individually(batch)
+            else:
+                for (_, future), prob in zip(batch, probs):
+                    future.set_result(prob)
+
+            self.batch_latency.record((time.perf_counter() - t0) * 1000)
+            self.batch_sizes.record(len(batch))
+
+    def _score_individually(self, batch: list):
+        for record, future in batch:
+            try:
+                prob = float(self.score_fn([record])[0])
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(prob)
+
+
+# ============================================================
+# 4. HTTP / Unix socket 服务
+# ============================================================
+
+class _ScoringRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, service.stats())
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        t0 = time.perf_counter()
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            records = payload["patients"] if "patients" in payload else [payload]
+            futures = [service.batcher.submit(r) for r in records]
+            probs = [f.result(timeout=service.request_timeout) for f in futures]
+        except Exception as e:
+            self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        latency_ms = (time.perf_counter() - t0) * 1000
+        service.request_latency.record(latency_ms)
+        self._send_json(200, {"probabilities": probs, "latency_ms": latency_ms})
+
+    def address_string(self):
+        # Unix socket 的 client_address 是空字符串
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.service.verbose:
+            super().log_message(format, *args)
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ScoringService:
+    """
+    本地 CRS 风险打分服务
+
+    参数:
+        pipeline (str, Pipeline or dict): build_no_leak_pipeline 拟合后保存的模型，或 compile_pipeline 的输出
+        host (str): TCP 监听地址（默认仅本机）
+        port (int): TCP 端口；指定 unix_socket 时忽略
+        unix_socket (str, optional): Unix socket 路径
+        max_batch_size (int): 微批最大记录数
+        max_wait_ms (float): 微批最长等待时间
+        request_timeout (float): 单个请求等待打分结果的超时（秒）
+        verbose (bool): 是否打印每个请求的访问日志
+
+    示例:
+        >>> service = ScoringService("./final_pipeline.pkl", port=8765).start()
+        >>> ...
+        >>> print(service.stats())
+        >>> service.shutdown()
+    """
+
+    def __init__(
+        self,
+        pipeline: Union[str, Pipeline, dict],
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_socket: Optional[str] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        request_timeout: float = 10.0,
+        verbose: bool = False
+    ):
+        self.scorer = WarmPipelineScorer(pipeline)
+        self.batcher = MicroBatcher(self.scorer.score, max_batch_size, max_wait_ms)
+        self.request_latency = LatencyTracker()
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+
+        self._server = None
+        self._thread = None
+
+    def _make_server(self):
+        if self.unix_socket is not None:
+            if os.path.exists(self.unix_socket):
+                os.remove(self.unix_socket)
+            server = _ThreadingUnixHTTPServer(self.unix_socket, _ScoringRequestHandler)
+        else:
+            server = ThreadingHTTPServer((self.host, self.port), _ScoringRequestHandler)
+            self.port = server.server_address[1]
+        server.service = self
+        return server
+
+    @property
+    def address(self) -> str:
+        return self.unix_socket if self.unix_socket is not None else f"http://{self.host}:{self.port}"
+
+    def stats(self) -> dict:
+        return {
+            "request_latency_ms": self.request_latency.summary(),
+            "batch_latency_ms": self.batcher.batch_latency.summary(),
+            "batch_size": self.batcher.batch_sizes.summary(),
+        }
+
+    def start(self):
+        """在后台线程中启动服务（非阻塞）"""
+        self.batcher.start()
+        self._server = self._make_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ScoringService", daemon=True)
+        self._thread.start()
+        print(f"[ScoringService] 监听 {self.address}")
+        return self
+
+    def serve_forever(self):
+        """阻塞运行，Ctrl+C 退出"""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.batcher.stop()
+        if self.unix_socket is not None and os.path.exists(self.unix_socket):
+            os.remove(self.unix_socket)
+        print(f"[ScoringService] 已停止, 延迟统计: {self.request_latency.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 CRS 风险打分服务")
+    parser.add_argument("--model", required=True, help="build_no_leak_pipeline 或 compile_pipeline 保存的 joblib 文件")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="使用 Unix socket 代替 TCP")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    ScoringService(
+        args.model,
+        host=args.host,
+        port=args.port,
+        unix_socket=args.unix_socket,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        verbose=args.verbose
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
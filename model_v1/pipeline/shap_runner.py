@@ -0,0 +1,366 @@
+"""
+shap_runner.py
+--------------
+分块、并行、带缓存的 SHAP 计算（含折模型聚合）
+
+背景：
+    explain_BNHL_CRS_SHAP.py 与模板中的 shap_explain.py 对整个变换后的训练矩阵
+    一次性调用 shap.TreeExplainer(model).shap_values：单核、整块 SHAP 矩阵常驻内存，
+    每次调整图表都要重算。
+
+做法：
+    1. 缓存键 = (模型哈希, 数据哈希)；命中时直接以只读 memmap 打开已有结果
+    2. 行按 chunk_size 分块，在进程池中计算；每个 worker 只在启动时接收一次模型，
+       从输入 memmap 读取自己的行块，直接写入输出 .npy memmap 的对应行
+       （SHAP 矩阵不经过主进程内存）
+    3. 每块同时返回 |SHAP| 的列和，mean |SHAP| 随结果一起写入元数据，无需再扫一遍
+    4. fold_shap_importance：对目录下每个 fold{i}_model.pkl 计算 SHAP，
+       输出各折 mean |SHAP| 及其均值 / 标准差（某折未使用的特征记为 0）
+
+后端：
+    - LightGBM 模型：booster.predict(pred_contrib=True)，即 LightGBM 内置的精确 TreeSHAP，
+      结果与 shap.TreeExplainer 在 log-odds 空间一致，不依赖 shap 包
+    - 其他树模型：shap.TreeExplainer（按需导入）
+
+缓存目录结构：
+    cache_dir/
+    ├── shap_{model_hash}_{data_hash}.npy     # (n_rows × n_features) SHAP 矩阵
+    └── shap_{model_hash}_{data_hash}.json    # expected_value / mean_abs_shap / 形状
+
+示例：
+    >>> runner = ShapRunner("./shap_cache", chunk_size=2000, n_jobs=8)
+    >>> values, expected = runner.shap_values(model, X_t)      # values 为只读 memmap
+    >>> importance = fold_shap_importance("./BNHL_CRS_CV_results", df_features, runner)
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .fold_ensemble import FoldEnsemblePredictor
+
+
+# ============================================================
+# 解释后端
+# ============================================================
+
+def _is_lightgbm(model) -> bool:
+    booster = getattr(model, "booster_", model)
+    return type(booster).__module__.startswith("lightgbm")
+
+
+def _make_explain_fn(model, backend: str):
+    """返回 f(X_chunk) -> (shap_values, expected_value)"""
+    if backend == "auto":
+        backend = "lightgbm" if _is_lightgbm(model) else "shap"
+
+    if backend == "lightgbm":
+        booster = getattr(model, "booster_", model)
+
+        def explain(X):
+            if sparse.issparse(X):
+                X = X.toarray()
+            # 每个 worker 单线程，并行度由进程池控制
+            contrib = booster.predict(X, pred_contrib=True, num_threads=1)
+            return contrib[:, :-1], float(contrib[0, -1]) if len(contrib) else 0.0
+        return explain
+
+    if backend == "shap":
+        import shap
+
+        explainer = shap.TreeExplainer(model)
+        expected = np.ravel(explainer.expected_value)[-1]
+
+        def explain(X):
+            values = explainer.shap_values(X)
+            if isinstance(values, list):
+                values = values[-1]
+            elif values.ndim == 3:
+                values = values[..., -1]
+            return values, float(expected)
+        return explain
+
+    raise ValueError(f"backend must be 'auto', 'lightgbm' or 'shap', got {backend!r}")
+
+
+# ============================================================
+# 进程池 worker
+# ============================================================
+
+_WORKER = {}
+
+
+def _init_worker(model_bytes: bytes, backend: str, input_path: str, output_path: str):
+    _WORKER["explain"] = _make_explain_fn(pickle.loads(model_bytes), backend)
+    _WORKER["X"] = _open_input(input_path)
+    _WORKER["out"] = np.load(output_path, mmap_mode="r+")
+
+
+def _run_chunk(start: int, stop: int) -> np.ndarray:
+    values, _ = _WORKER["explain"](_WORKER["X"][start:stop])
+    out = _WORKER["out"]
+    out[start:stop] = values
+    out.flush()
+    return np.abs(values).sum(axis=0)
+
+
+def _open_input(path: str):
+    if path.endswith(".npz"):
+        return sparse.load_npz(path).tocsr()
+    return np.load(path, mmap_mode="r")
+
+
+# ============================================================
+# 哈希
+# ============================================================
+
+def model_hash(model) -> str:
+    """模型哈希（LightGBM 用 model_to_string，其他模型用 joblib.hash）"""
+    if not _is_lightgbm(model):
+        return joblib.hash(model)[:16]
+    hasher = hashlib.sha1()
+    hasher.update(getattr(model, "booster_", model).model_to_string().encode("utf-8"))
+    return hasher.hexdigest()[:16]
+
+
+def data_hash(X) -> str:
+    """输入矩阵哈希（稠密或 CSR）"""
+    hasher = hashlib.sha1()
+    if sparse.issparse(X):
+        X = X.tocsr()
+        hasher.update(repr(("csr", X.shape, str(X.dtype))).encode("utf-8"))
+        for part in (X.data, X.indices, X.indptr):
+            hasher.update(np.ascontiguousarray(part).tobytes())
+    else:
+        X = np.asarray(X)
+        hasher.update(repr((X.shape, str(X.dtype))).encode("utf-8"))
+        hasher.update(np.ascontiguousarray(X).tobytes())
+    return hasher.hexdigest()[:16]
+
+
+# ============================================================
+# ShapRunner
+# ============================================================
+
+class ShapRunner:
+    """
+    分块并行 + 磁盘缓存的 SHAP 计算器
+
+    参数:
+        cache_dir (str): 缓存目录
+        chunk_size (int): 每个任务的行数
+        n_jobs (int, optional): 进程数，默认 os.cpu_count()；1 表示在当前进程内分块计算
+        backend (str): "auto" / "lightgbm" / "shap"
+        dtype: SHAP 矩阵的存储类型（默认 float32）
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        chunk_size: int = 2000,
+        n_jobs: Optional[int] = None,
+        backend: str = "auto",
+        dtype=np.float32
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.backend = backend
+        self.dtype = dtype
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, f"shap_{key}")
+        return f"{base}.npy", f"{base}.json"
+
+    def load(self, key: str) -> Optional[Tuple[np.memmap, dict]]:
+        """按缓存键读取（未命中返回 None）"""
+        values_path, meta_path = self._paths(key)
+        if not (os.path.exists(values_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        return np.load(values_path, mmap_mode="r"), meta
+
+    def compute(self, model, X, key: Optional[str] = None) -> Tuple[np.memmap, dict]:
+        """
+        计算（或从缓存读取）SHAP 值
+
+        参数:
+            model: 已训练的树模型（LGBMClassifier / Booster / shap 支持的模型）
+            X (np.ndarray or scipy.sparse matrix): 变换后的输入矩阵（可以是 memmap）
+            key (str, optional): 缓存键；默认由 model_hash 与 data_hash 组成
+
+        返回:
+            (values, meta):
+                values: 只读 memmap，shape (n_rows, n_features)
+                meta: {"expected_value", "mean_abs_shap", "n_rows", "n_features"}
+        """
+        key = key or f"{model_hash(model)}_{data_hash(X)}"
+        cached = self.load(key)
+        if cached is not None:
+            print(f"[ShapRunner] 缓存命中: {key}")
+            return cached
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        values_path, meta_path = self._paths(key)
+        tmp_values = f"{values_path}.{os.getpid()}.tmp.npy"
+
+        n_rows, n_features = X.shape
+        out = np.lib.format.open_memmap(tmp_values, mode="w+", dtype=self.dtype, shape=(n_rows, n_features))
+        explain = _make_explain_fn(model, self.backend)
+        _, expected_value = explain(X[:1])
+
+        ranges = [(s, min(s + self.chunk_size, n_rows)) for s in range(0, n_rows, self.chunk_size)]
+        n_workers = min(self.n_jobs, len(ranges))
+        abs_sum = np.zeros(n_features)
+
+        if n_workers <= 1:
+            for start, stop in ranges:
+                values, _ = explain(X[start:stop])
+                out[start:stop] = values
+                abs_sum += np.abs(values).sum(axis=0)
+            out.flush()
+        else:
+            out.flush()
+            input_path, is_temp = self._input_file(X, key)
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=n_workers,
+                    initializer=_init_worker,
+                    initargs=(pickle.dumps(model), self.backend, input_path, tmp_values)
+                ) as executor:
+                    starts, stops = zip(*ranges)
+                    for chunk_sum in executor.map(_run_chunk, starts, stops):
+                        abs_sum += chunk_sum
+            finally:
+                if is_temp:
+                    os.remove(input_path)
+        del out
+
+        meta = {
+            "expected_value": expected_value,
+            "mean_abs_shap": (abs_sum / max(n_rows, 1)).tolist(),
+            "n_rows": int(n_rows),
+            "n_features": int(n_features),
+        }
+        # 先替换矩阵再写元数据：元数据存在即代表结果完整
+        os.replace(tmp_values, values_path)
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+        print(f"[ShapRunner] {n_rows} 行 × {n_features} 特征, {len(ranges)} 块, "
+              f"{n_workers} 进程 → {values_path}")
+        return np.load(values_path, mmap_mode="r"), meta
+
+    def shap_values(self, model, X, key: Optional[str] = None) -> Tuple[np.memmap, float]:
+        """compute 的简化接口：返回 (values, expected_value)"""
+        values, meta = self.compute(model, X, key)
+        return values, meta["expected_value"]
+
+    def _input_file(self, X, key: str) -> Tuple[str, bool]:
+        """worker 读取的输入文件：已是 .npy memmap 时直接复用，否则写一个临时文件"""
+        if isinstance(X, np.memmap) and X.filename and str(X.filename).endswith(".npy") \
+                and X.offset and X.flags.c_contiguous:
+            return str(X.filename), False
+        if sparse.issparse(X):
+            path = os.path.join(self.cache_dir, f"_input_{key}.{os.getpid()}.npz")
+            sparse.save_npz(path, X.tocsr(), compressed=False)
+        else:
+            path = os.path.join(self.cache_dir, f"_input_{key}.{os.getpid()}.npy")
+            np.save(path, np.ascontiguousarray(X))
+        return path, True
+
+
+# ============================================================
+# 折模型聚合
+# ============================================================
+
+def fold_shap_importance(
+    model_dir: str,
+    X: pd.DataFrame,
+    runner: ShapRunner,
+    output_path: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    对目录下所有折模型计算 SHAP，并聚合 mean |SHAP|
+
+    参数:
+        model_dir (str): fold{i}_model.pkl 所在目录（run_cv_training / MultiEndpointTrainer 的输出）
+        X (pd.DataFrame): 原始特征表（各折预处理器的输入列）
+        runner (ShapRunner): SHAP 计算器（决定缓存目录、分块与并行度）
+        output_path (str, optional): 保存聚合结果的 CSV 路径
+
+    返回:
+        pd.DataFrame: index 为变换后的特征名，列为 fold{i}、mean_abs_shap、std_abs_shap，
+                      按 mean_abs_shap 降序
+    """
+    folds = FoldEnsemblePredictor._load_folds(model_dir)
+    X_hash = hashlib.sha1(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    X_hash.update(repr(list(X.columns)).encode("utf-8"))
+
+    per_fold = {}
+    for fold_id, preprocessor, model in folds:
+        # 数据键 = 原始特征表 + 该折预处理器；命中缓存时连变换都不需要
+        hasher = X_hash.copy()
+        # pickle 字节受引用共享影响，同一内容可能不同；joblib.hash 只取决于内容
+        hasher.update(joblib.hash(preprocessor).encode("utf-8"))
+        key = f"{model_hash(model)}_{hasher.hexdigest()[:16]}"
+
+        cached = runner.load(key)
+        if cached is not None:
+            meta = cached[1]
+            print(f"[fold_shap_importance] Fold{fold_id}: 缓存命中")
+        else:
+            X_t = _transform_to_memmap(preprocessor, X, runner, key)
+            try:
+                _, meta = runner.compute(model, X_t, key=key)
+            finally:
+                path = X_t.filename
+                del X_t
+                os.remove(path)
+
+        names = [str(n) for n in preprocessor.get_feature_names_out()]
+        per_fold[f"fold{fold_id}"] = pd.Series(meta["mean_abs_shap"], index=names)
+
+    importance = pd.DataFrame(per_fold).fillna(0.0)
+    importance["mean_abs_shap"] = importance[list(per_fold)].mean(axis=1)
+    importance["std_abs_shap"] = importance[list(per_fold)].std(axis=1, ddof=0)
+    importance = importance.sort_values("mean_abs_shap", ascending=False)
+    importance.index.name = "feature"
+
+    if output_path is not None:
+        out_dir = os.path.dirname(output_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        importance.to_csv(output_path)
+        print(f"✅ Fold SHAP importance saved: {output_path}")
+    return importance
+
+
+def _transform_to_memmap(preprocessor, X: pd.DataFrame, runner: ShapRunner, key: str) -> np.memmap:
+    """按行块变换并写入 .npy memmap（与训练时一致的 float32 融合变换）"""
+    transform = FoldEnsemblePredictor._compile(preprocessor)
+    first = transform(X.iloc[:1])
+    if sparse.issparse(first):
+        first = first.toarray()
+
+    os.makedirs(runner.cache_dir, exist_ok=True)
+    path = os.path.join(runner.cache_dir, f"_input_{key}.{os.getpid()}.npy")
+    X_t = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(X), first.shape[1]))
+    for start in range(0, len(X), runner.chunk_size):
+        block = transform(X.iloc[start:start + runner.chunk_size])
+        X_t[start:start + len(block)] = block.toarray() if sparse.issparse(block) else block
+    X_t.flush()
+    return X_t
@@ -0,0 +1,241 @@
+"""
+tree_export.py
+--------------
+将训练好的 LightGBM 二分类模型导出为扁平 NumPy 数组，并用向量化方式批量求值
+
+背景：
+    小批量打分时，LGBMClassifier.predict_proba 的单次调用开销（参数校验、
+    C API 往返）远大于真正的树遍历；打分服务启动时还要 import LightGBM。
+
+做法：
+    1. export_lgbm_model：从 booster_.dump_model() 读取每棵树，展平为
+       feature / threshold / left / right / default_left / missing_type / value 数组
+       （叶子节点的左右子节点指向自身）
+    2. FlatTreeEnsemble.predict_raw：一批样本同时遍历所有树，
+       每一步对所有尚未到达叶子的 (样本, 树) 对做一次向量化更新，
+       到达叶子的立即累加并移出活动集
+    3. 缺失值规则与 LightGBM 一致：
+       - missing_type=NaN：NaN 走 default 方向
+       - missing_type=Zero：0（以及转成 0 的 NaN）走 default 方向
+       - missing_type=None：NaN 视为 0 后正常比较
+    4. save / load 只依赖 NumPy（.npz），加载时不需要 LightGBM
+    5. check_parity：与原模型 predict_proba 对比，超出容差时报错
+
+限制：
+    只支持 binary 目标与数值型分裂（本项目特征经 OneHot 编码后均为数值型）。
+
+示例：
+    >>> artifact = joblib.load("BNHL_CRS_CV_results/fold1_model.pkl")
+    >>> trees = export_lgbm_model(artifact["model"])
+    >>> check_parity(artifact["model"], trees, X_val_t)
+    >>> trees.save("fold1_trees.npz")
+    >>> probs = FlatTreeEnsemble.load("fold1_trees.npz").predict_proba(X_val_t)[:, 1]
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+# LightGBM dump_model 中 missing_type 的编码
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": _MISSING_NONE, "Zero": _MISSING_ZERO, "NaN": _MISSING_NAN}
+
+# LightGBM 判断“零值”的阈值（kZeroThreshold）
+_ZERO_THRESHOLD = 1e-35
+
+
+class FlatTreeEnsemble:
+    """
+    扁平数组表示的树集成（只依赖 NumPy）
+
+    所有树的节点拼接在同一组数组中，roots[t] 是第 t 棵树根节点的下标。
+
+    参数:
+        feature, threshold, left, right, default_left, missing_type, value (np.ndarray):
+            每个节点的属性（长度 = 总节点数）；叶子节点 left = right = 自身
+        roots (np.ndarray): 每棵树的根节点下标
+        max_depth (int): 最深叶子的深度（遍历步数）
+        n_features (int): 模型输入特征数
+        sigmoid (float): binary 目标的 sigmoid 系数
+    """
+
+    _ARRAYS = ("feature", "threshold", "left", "right", "default_left", "missing_type", "value", "roots")
+
+    def __init__(self, feature, threshold, left, right, default_left, missing_type, value,
+                 roots, max_depth, n_features, sigmoid=1.0):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.sigmoid = float(sigmoid)
+
+        # 派生数组：一次 gather 取子节点；NaN 的走向在导出时即可确定
+        self._children = np.column_stack([right, left]).ravel()
+        self._is_leaf = left == np.arange(len(left))
+        self._nan_left = np.where(missing_type == _MISSING_NONE, 0.0 <= threshold, default_left)
+        self._zero_default = missing_type == _MISSING_ZERO
+        self._has_zero_default = bool(self._zero_default.any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """返回原始得分（所有树叶子值之和）"""
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X must have shape (n_samples, {self.n_features}), got {X.shape}")
+
+        n = len(X)
+        X_flat = X.ravel()
+        raw = np.zeros(n)
+
+        # 活动集：尚未到达叶子的 (样本, 树) 对；到达叶子后立即累加并移出
+        sample = np.repeat(np.arange(n), self.n_trees)
+        node = np.tile(self.roots, n)
+        for _ in range(self.max_depth + 1):
+            at_leaf = self._is_leaf[node]
+            if at_leaf.any():
+                raw += np.bincount(sample[at_leaf], weights=self.value[node[at_leaf]], minlength=n)
+                sample, node = sample[~at_leaf], node[~at_leaf]
+            if len(node) == 0:
+                break
+
+            x = X_flat[sample * self.n_features + self.feature[node]]
+            is_nan = np.isnan(x)
+            go_left = np.where(is_nan, self._nan_left[node], x <= self.threshold[node])
+            if self._has_zero_default:
+                # missing_type=Zero：0 与 NaN 都走 default 方向
+                use_default = self._zero_default[node] & (is_nan | (np.abs(x) <= _ZERO_THRESHOLD))
+                go_left = np.where(use_default, self.default_left[node], go_left)
+            node = self._children[2 * node + go_left]
+
+        return raw
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """返回 (n_samples, 2) 的类别概率，与 LGBMClassifier.predict_proba 一致"""
+        pos = 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_raw(X)))
+        return np.column_stack([1.0 - pos, pos])
+
+    def save(self, path: str):
+        """保存为 .npz（加载时不需要 LightGBM）"""
+        np.savez(
+            path,
+            **{name: getattr(self, name) for name in self._ARRAYS},
+            meta=np.array([self.max_depth, self.n_features, self.sigmoid])
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "FlatTreeEnsemble":
+        with np.load(path) as data:
+            max_depth, n_features, sigmoid = data["meta"]
+            return cls(*(data[name] for name in cls._ARRAYS),
+                       max_depth=max_depth, n_features=n_features, sigmoid=sigmoid)
+
+
+def export_lgbm_model(model, num_iteration: Optional[int] = None) -> FlatTreeEnsemble:
+    """
+    将 LGBMClassifier（或 lightgbm.Booster）导出为 FlatTreeEnsemble
+
+    参数:
+        model: 已训练的 LGBMClassifier 或 Booster
+        num_iteration (int, optional): 导出的迭代数；默认与 predict_proba 一致
+                                      （有早停时为 best_iteration，否则全部）
+
+    返回:
+        FlatTreeEnsemble
+    """
+    booster = getattr(model, "booster_", model)
+    dump = booster.dump_model(num_iteration=num_iteration)
+
+    objective = dump.get("objective", "")
+    if not objective.startswith("binary"):
+        raise ValueError(f"[export_lgbm_model] 只支持 binary 目标，当前为 {objective!r}")
+    sigmoid = 1.0
+    for token in objective.split()[1:]:
+        if token.startswith("sigmoid:"):
+            sigmoid = float(token.split(":", 1)[1])
+
+    feature, threshold, left, right = [], [], [], []
+    default_left, missing_type, value = [], [], []
+    roots, max_depth = [], 0
+
+    for tree in dump["tree_info"]:
+        # 迭代式先序遍历：(节点, 深度, 父节点下标, 是否为左子节点)
+        stack = [(tree["tree_structure"], 0, -1, False)]
+        while stack:
+            node, depth, parent, is_left = stack.pop()
+            idx = len(feature)
+            if parent < 0:
+                roots.append(idx)
+            elif is_left:
+                left[parent] = idx
+            else:
+                right[parent] = idx
+
+            if "split_feature" in node:
+                if node["decision_type"] != "<=":
+                    raise ValueError("[export_lgbm_model] 不支持类别型分裂（decision_type='=='）")
+                feature.append(node["split_feature"])
+                threshold.append(float(node["threshold"]))
+                default_left.append(bool(node["default_left"]))
+                missing_type.append(_MISSING_TYPES[node["missing_type"]])
+                value.append(0.0)
+                left.append(idx)
+                right.append(idx)
+                stack.append((node["right_child"], depth + 1, idx, False))
+                stack.append((node["left_child"], depth + 1, idx, True))
+            else:
+                feature.append(0)
+                threshold.append(0.0)
+                default_left.append(True)
+                missing_type.append(_MISSING_NONE)
+                value.append(float(node["leaf_value"]))
+                left.append(idx)
+                right.append(idx)
+                max_depth = max(max_depth, depth)
+
+    return FlatTreeEnsemble(
+        feature=np.asarray(feature, dtype=np.int32),
+        threshold=np.asarray(threshold, dtype=np.float64),
+        left=np.asarray(left, dtype=np.int32),
+        right=np.asarray(right, dtype=np.int32),
+        default_left=np.asarray(default_left, dtype=bool),
+        missing_type=np.asarray(missing_type, dtype=np.int8),
+        value=np.asarray(value, dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        n_features=dump["max_feature_idx"] + 1,
+        sigmoid=sigmoid
+    )
+
+
+def check_parity(model, trees: FlatTreeEnsemble, X: np.ndarray, atol: float = 1e-9) -> float:
+    """
+    对比 FlatTreeEnsemble 与原模型 predict_proba 的阳性概率
+
+    参数:
+        model: 原 LGBMClassifier
+        trees (FlatTreeEnsemble): export_lgbm_model 的输出
+        X (np.ndarray): 用于对比的输入矩阵（建议包含缺失值）
+        atol (float): 允许的最大绝对误差
+
+    返回:
+        float: 最大绝对误差
+
+    异常:
+        AssertionError: 误差超过 atol
+    """
+    expected = model.predict_proba(X)[:, 1]
+    actual = trees.predict_proba(X)[:, 1]
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    assert max_diff <= atol, f"[check_parity] 与 predict_proba 的最大误差 {max_diff:.3e} 超过 {atol:.1e}"
+    print(f"[check_parity] {trees.n_trees} 棵树, {len(X)} 个样本, 最大误差 {max_diff:.3e} ✓")
+    return max_diff